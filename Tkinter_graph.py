@@ -1,11 +1,9 @@
-from matplotlib.patches import FancyArrowPatch, Circle
-import pandas as pd
 import numpy as np
 import tkinter as tk
 from tkinter import messagebox
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from mdp import run as run_mdp
+from mdp_model import AliasTable, dataframe_rows
+from trajectory import TrajectoryRecorder
 import random
 
 class RandomWalkApp(tk.Tk):
@@ -16,15 +14,23 @@ class RandomWalkApp(tk.Tk):
 
         self.df = printer.transactions_prob  
         self.current_state = printer.first_state
-        self.path = [self.current_state]
+        self.recorder = TrajectoryRecorder(printer.declared_states, printer.declared_actions)
+        self.recorder.start_named(self.current_state)
         self.total_probability = 1.0
         self.transition_count = 0
         self.declared_states = printer.declared_states
+        self.rows, self.actions = dataframe_rows(self.df)
+        self.alias = AliasTable.from_dataframe(self.df[self.declared_states]) # O(1) sampling of the next state
         self.create_widgets()
         self.create_graph()
 
         self.initialize_actions()
 
+    @property
+    def path(self):
+        """States of the walk, as names (rendered from the recorder)."""
+        return self.recorder.trajectories().names(-1)
+
     def create_widgets(self):
         self.current_state_label = tk.Label(self, text=f"First state: {self.current_state}")
         self.current_state_label.pack(pady=10)
@@ -42,6 +48,9 @@ class RandomWalkApp(tk.Tk):
         self.quit_button.pack(pady=10)
 
     def create_graph(self):
+        # matplotlib is imported when the window is built, not with the module
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
         self.figure = Figure(figsize=(5, 4), dpi=100)
         self.plot = self.figure.add_subplot(111)
         self.plot.axis('off') 
@@ -53,6 +62,7 @@ class RandomWalkApp(tk.Tk):
         self.update_graph()
     
     def draw_arrow(self, start_pos, end_pos, radius=0.05):
+        from matplotlib.patches import FancyArrowPatch, Circle
         direction = np.array(end_pos) - np.array(start_pos)
         if np.array_equal(start_pos, end_pos):
             # Draw a circular arrow
@@ -91,9 +101,11 @@ class RandomWalkApp(tk.Tk):
             self.plot.text(pos[0], pos[1], state, horizontalalignment='center', verticalalignment='center')
 
         # Draw the last transition
-        if len(self.path) > 1:
-            start_pos = state_positions[self.path[-2]]
-            end_pos = state_positions[self.path[-1]]
+        walk = self.recorder.trajectories()
+        start, end = walk.bounds(-1)
+        if end - start > 1:
+            start_pos = state_positions[self.declared_states[walk.states[end - 2]]]
+            end_pos = state_positions[self.declared_states[walk.states[end - 1]]]
             
             self.draw_arrow(start_pos, end_pos, circle_radius)
         self.plot.set_xlim(-0.3, 0.3)
@@ -111,7 +123,7 @@ class RandomWalkApp(tk.Tk):
 
     def start_random_walk(self):
         
-        actions_and_NA = self.df["Action"].loc[self.df['Origin'] == self.current_state].values
+        actions_and_NA = self.actions.get(self.current_state, [])
         if not actions_and_NA: #No transactions
             messagebox.showinfo("End of graph", f"There are no valid transitions from the state {self.current_state}.")
             return
@@ -119,7 +131,7 @@ class RandomWalkApp(tk.Tk):
         self.perform_action(action)
 
     def initialize_actions(self): # Refresh actions buttons 
-        available_actions = self.df[self.df['Origin'] == self.current_state]['Action'].unique()
+        available_actions = self.actions.get(self.current_state, [])
         if not available_actions: # The list is empty, not even a NA
             messagebox.showinfo("End of graph", f"There are no valid transitions from the state {self.current_state}.")
             return
@@ -129,25 +141,25 @@ class RandomWalkApp(tk.Tk):
         if self.transition_count == 0 or action is not None:
             self.action = action
 
-        transition = self.df[(self.df['Origin'] == self.current_state) & ((self.df['Action'] == self.action) | (self.df['Action'] == 'NA'))]
-        
+        row = self.rows.get((self.current_state, self.action), self.rows.get((self.current_state, 'NA')))
+        taken = self.action if (self.current_state, self.action) in self.rows else 'NA'
 
-        if transition.empty:
+        if row is None or self.alias.size(row) == 0:
             messagebox.showinfo("End of graph", "There are no valid transitions from this state.")
             return
 
-        probabilities = transition[self.declared_states].values.flatten()
-        next_state = np.random.choice(self.declared_states, p=probabilities)
-        step_probability = float(transition[next_state].iloc[0])
+        entry = self.alias.sample_one(row)
+        next_state = self.declared_states[self.alias.targets[entry]]
+        step_probability = float(self.alias.probs[entry])
 
         self.transition_count += 1
         self.current_state = next_state  
-        self.path.append(self.current_state)  
+        self.recorder.step_named(taken, self.current_state, step_probability)
         self.total_probability *= step_probability
         self.update_graph()
         self.update_state_label(step_probability)  
 
-        available_actions = self.df[self.df['Origin'] == self.current_state]['Action'].unique()
+        available_actions = self.actions.get(self.current_state, [])
         self.update_action_buttons(available_actions)
 
     def update_state_label(self, step_probability=None):
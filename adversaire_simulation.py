@@ -1,10 +1,9 @@
 import pandas as pd
 import numpy as np
 from mdp import run as run_mdp
+from mdp_model import AliasTable, dataframe_rows
 import random
 
-printer = run_mdp(path = "prof_examples//simu-mc.mdp", return_printer=True, print_transactions=True)
-
 def gerar_preferencias_acoes(df, estados, acoes, modo="input"):
     """
     Generates a dictionary mapping each state to a list of preferred actions.
@@ -78,44 +77,72 @@ def simular_random_walk(p):
     preferencias = gerar_preferencias_acoes(df, p.declared_states,p.declared_actions, modo=adversaire_mode)
     print("Here are the prefered actions for each state :", preferencias, "\n")
 
+    random_walk(p, preferencias, num_transitions)
+
+
+def random_walk(p, preferencias, num_transitions, verbose=True, recorder=None):
+    """
+    Walks num_transitions steps from the first state, taking in every state the first preferred action it defines.
+
+    Parameters:
+    - p: An object containing the MDP structure, with transactions_prob.
+    - preferencias (dict): Actions of every state ordered by preference, as given by gerar_preferencias_acoes.
+    - num_transitions (int): Number of steps of the walk.
+    - verbose (bool): Print every step and the complete path.
+    - recorder (trajectory.TrajectoryRecorder): Also records the walk there, with the names of p.
+
+    Returns:
+    - list: The visited states, shorter than num_transitions + 1 if the walk stopped in a state without transitions
+            (or at an action without successors).
+    """
+    df = p.transactions_prob
+    estados_possiveis = df.columns[2:]
+    linhas, acoes = dataframe_rows(df)
+    alias = AliasTable.from_dataframe(df.iloc[:, 2:]) # Built once, every step then costs O(1)
     estado_atual = p.first_state
 
-    caminho = estado_atual  # Iniciar o registro do caminho com o estado inicial
+    estados = [estado_atual]  # Registro do caminho, o texto só é montado para imprimir
     probabilidade_acumulada = 1
+    if recorder is not None:
+        recorder.start_named(estado_atual)
 
-    print(f"Inicial State: {estado_atual}" + "\n")
+    if verbose:
+        print(f"Inicial State: {estado_atual}" + "\n")
 
     for _ in range(num_transitions):
-        df_estado_atual = df[df['Origin'] == estado_atual]
-        if df_estado_atual.empty:
-            print("Stopped at a end of graph state")
-            return
-        acao_selecionada = None
-        probabilidade_escolhida = None
-
-        if df_estado_atual.iloc[0]['Action'] == "NA":
-            probabilidades = df_estado_atual.iloc[0, 2:].astype(float).values
-            acao_selecionada = "NA"
-        else:
-            for acao_preferida in preferencias[estado_atual]:
-                df_acao_preferida = df_estado_atual[df_estado_atual['Action'] == acao_preferida]
-                if not df_acao_preferida.empty:
-                    probabilidades = df_acao_preferida.iloc[0, 2:].astype(float).values
-                    acao_selecionada = acao_preferida
-                    break
-
-        probabilidades = probabilidades / np.sum(probabilidades)
-        estados_possiveis = df_estado_atual.columns[2:]
-        proximo_estado = np.random.choice(estados_possiveis, p=probabilidades)
-        probabilidade_escolhida = probabilidades[np.where(estados_possiveis == proximo_estado)[0][0]]
+        acoes_estado = acoes.get(estado_atual)
+        if not acoes_estado:
+            if verbose:
+                print("Stopped at a end of graph state")
+            return estados
+
+        acao_selecionada = acoes_estado[0]
+        if acao_selecionada != "NA":
+            acao_selecionada = next((a for a in preferencias[estado_atual] if (estado_atual, a) in linhas), acao_selecionada)
+        linha = linhas[(estado_atual, acao_selecionada)]
+
+        entrada = alias.sample_one(linha)
+        if entrada < 0:
+            if verbose:
+                print("Stopped at an action without successors")
+            return estados
+        proximo_estado = estados_possiveis[alias.targets[entrada]]
+        probabilidade_escolhida = alias.probs[entrada]
         
         probabilidade_acumulada *= probabilidade_escolhida
         estado_passado = estado_atual
         estado_atual = proximo_estado
-        caminho += f" -> {estado_atual}"  # Atualizar o caminho
+        estados.append(estado_atual)
+        if recorder is not None:
+            recorder.step_named(acao_selecionada, estado_atual, probabilidade_escolhida)
+        if verbose:
+            print(f"{estado_passado} -> {estado_atual}; action: {acao_selecionada}, probability of step  {probabilidade_escolhida:.3f}; path's total probability {probabilidade_acumulada:.5f}, path: {' -> '.join(estados)}," + "\n")
 
-        print(f"{estado_passado} -> {estado_atual}; action: {acao_selecionada}, probability of step  {probabilidade_escolhida:.3f}; path's total probability {probabilidade_acumulada:.5f}, path: {caminho}," + "\n")
+    if verbose:
+        print(f"Complete Path: {' -> '.join(estados)}")
+    return estados
 
-    print(f"Complete Path: {caminho}")
 
-simular_random_walk(printer)
\ No newline at end of file
+if __name__ == '__main__':
+    printer = run_mdp(path = "prof_examples//simu-mc.mdp", return_printer=True, print_transactions=True)
+    simular_random_walk(printer)
@@ -0,0 +1,221 @@
+import numpy as np
+from mdp_model import AliasTable
+
+'''
+Adversaries (schedulers) of a CompiledMDP, stored as integer and float arrays over its states and choices:
+- MemorylessDeterministic -> one choice index per state
+- MemorylessRandomized -> one probability per choice, summing to 1 over the choices of every state
+- FiniteMemory -> memory modes: the choice depends on (mode, state) and the mode is updated on every state entered
+
+They all pick the choices of a batch of trajectories at once (choose / next_memory, used by
+simulation.simulate_batch), and give the Markov chain they induce (induced_chain), built from the CSR
+arrays of the model with one gather, for the exact solvers.
+
+The adversaries of adversaire_simulation.gerar_preferencias_acoes convert with from_preferences, and
+random_choices draws thousands of memoryless deterministic ones as the rows of one array.
+'''
+
+
+class InducedChain:
+    """
+    Markov chain induced by an adversary, in CSR form:
+    - state_ptr -> successors of state s are targets[state_ptr[s]:state_ptr[s+1]]
+    - targets, probs -> target and probability of every successor
+    - model_state -> state of the model every chain state stands for (with memory modes, the chain
+                     has one state per (mode, state) pair)
+    - first_state -> initial state of the chain
+
+    A state without successors is one where the adversary has no choice (a deadlock of the model).
+    """
+
+    def __init__(self, state_ptr, targets, probs, model_state, first_state):
+        self.state_ptr = state_ptr
+        self.targets = targets
+        self.probs = probs
+        self.model_state = model_state
+        self.first_state = int(first_state)
+
+    @property
+    def n_states(self):
+        return len(self.state_ptr) - 1
+
+    def target_mask(self, target):
+        """Chain states standing for the target state(s) of the model."""
+        return np.isin(self.model_state, np.atleast_1d(target))
+
+    def matrix(self):
+        """Transition matrix, as a scipy.sparse CSR matrix."""
+        from scipy.sparse import csr_matrix
+        return csr_matrix((self.probs, self.targets, self.state_ptr), shape=(self.n_states, self.n_states))
+
+    def __repr__(self):
+        return f"InducedChain(states={self.n_states}, transitions={len(self.targets)})"
+
+
+def gather_rows(ptr, rows):
+    """Entries of the given rows of a CSR pointer array, one row after the other: (row pointers, entry indices)."""
+    rows = np.asarray(rows, dtype=np.int64)
+    valid = rows >= 0
+    start = np.where(valid, ptr[np.maximum(rows, 0)], 0)
+    degree = np.where(valid, ptr[np.maximum(rows, 0) + 1] - start, 0)
+    row_ptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(degree, out=row_ptr[1:])
+    entries = np.repeat(start - row_ptr[:-1], degree) + np.arange(row_ptr[-1])
+    return row_ptr, entries
+
+
+class MemorylessDeterministic:
+    """
+    Parameters:
+    - choice: Choice index of every state, -1 where the state has no choice.
+    """
+
+    def __init__(self, choice):
+        self.choice = np.asarray(choice, dtype=np.int64)
+
+    def initial_memory(self, n):
+        return None
+
+    def choose(self, model, states, memory, rng):
+        return self.choice[states]
+
+    def next_memory(self, memory, states):
+        return memory
+
+    def induced_chain(self, model):
+        state_ptr, entries = gather_rows(model.choice_ptr, self.choice)
+        return InducedChain(state_ptr, model.targets[entries], model.probs[entries],
+                            np.arange(model.n_states), model.first_state)
+
+    def actions(self, model):
+        """{state name: action name} of the states with a choice."""
+        return {model.state_names[s]: model.action_name(c) for s, c in enumerate(self.choice) if c >= 0}
+
+    @classmethod
+    def from_preferences(cls, model, preferencias):
+        """
+        The adversary of a gerar_preferencias_acoes dictionary: in every state, the first preferred action
+        it defines (or its first choice), as adversaire_simulation.random_walk does.
+        """
+        choice = np.where(np.diff(model.state_ptr) > 0, model.state_ptr[:-1], -1)
+        for state, actions in preferencias.items():
+            s = model.state_index.get(state)
+            if s is None:
+                continue
+            for action in actions:
+                c = model.find_choice(s, action)
+                if c is not None:
+                    choice[s] = c
+                    break
+        return cls(choice)
+
+
+class MemorylessRandomized:
+    """
+    Parameters:
+    - choice_probs: Probability of every choice of the model, summing to 1 over the choices of each state.
+    """
+
+    def __init__(self, choice_probs):
+        self.choice_probs = np.asarray(choice_probs, dtype=np.float64)
+        self._table = None
+
+    @classmethod
+    def uniform(cls, model):
+        """Every choice of a state with the same probability."""
+        degree = np.diff(model.state_ptr)
+        return cls(1.0 / np.repeat(degree, degree))
+
+    def initial_memory(self, n):
+        return None
+
+    def choose(self, model, states, memory, rng):
+        if self._table is None: # Alias table of the choices of every state
+            self._table = AliasTable(model.state_ptr, np.arange(model.n_choices), self.choice_probs)
+        choice = np.full(len(states), -1, dtype=np.int64)
+        some = self._table.size(states) > 0
+        choice[some] = self._table.sample(states[some], rng)
+        return choice
+
+    def next_memory(self, memory, states):
+        return memory
+
+    def induced_chain(self, model):
+        entry_choice = model.transition_choice
+        rows = model.choice_state[entry_choice].astype(np.int64)
+        weights = model.probs * self.choice_probs[entry_choice]
+        # Entries are sorted by origin state (choices are), successors shared by several choices are merged
+        keys, inverse = np.unique(rows * model.n_states + model.targets, return_inverse=True)
+        probs = np.bincount(inverse, weights=weights, minlength=len(keys))
+        state_ptr = np.zeros(model.n_states + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // model.n_states, minlength=model.n_states), out=state_ptr[1:])
+        return InducedChain(state_ptr, (keys % model.n_states).astype(np.int32), probs,
+                            np.arange(model.n_states), model.first_state)
+
+
+class FiniteMemory:
+    """
+    Parameters:
+    - choice: (modes, states) array, choice index taken in a state for every memory mode (-1 if none).
+    - update: (modes, states) array, mode after entering a state, for every current mode.
+    - initial (int): Mode at the first state.
+    """
+
+    def __init__(self, choice, update, initial=0):
+        self.choice = np.asarray(choice, dtype=np.int64)
+        self.update = np.asarray(update, dtype=np.int64)
+        self.initial = int(initial)
+
+    @property
+    def modes(self):
+        return len(self.choice)
+
+    def initial_memory(self, n):
+        return np.full(n, self.initial, dtype=np.int64)
+
+    def choose(self, model, states, memory, rng):
+        return self.choice[memory, states]
+
+    def next_memory(self, memory, states):
+        return self.update[memory, states]
+
+    def induced_chain(self, model):
+        """Chain over the (mode, state) pairs, pair (m, s) being the state m * n_states + s."""
+        n = model.n_states
+        state_ptr, entries = gather_rows(model.choice_ptr, self.choice.ravel())
+        mode = np.repeat(np.arange(self.modes), n)
+        entry_mode = np.repeat(mode, np.diff(state_ptr))
+        targets = model.targets[entries]
+        product_targets = self.update[entry_mode, targets] * n + targets
+        return InducedChain(state_ptr, product_targets, model.probs[entries], np.tile(np.arange(n), self.modes),
+                            self.initial * n + model.first_state)
+
+    @classmethod
+    def from_memoryless(cls, adversaries):
+        """
+        Adversary switching between memoryless deterministic ones: it follows adversaries[m] in mode m and
+        moves to the next mode every step (cyclically).
+        """
+        choice = np.array([a.choice for a in adversaries])
+        modes, n = choice.shape
+        update = np.repeat(((np.arange(modes) + 1) % modes)[:, None], n, axis=1)
+        return cls(choice, update)
+
+
+def random_choices(model, n, rng=None):
+    """
+    n memoryless deterministic adversaries drawn uniformly, as an (n, states) array of choice indices
+    (-1 for the states without choices). MemorylessDeterministic(rows[i]) is the i-th one.
+    """
+    rng = np.random.default_rng(rng)
+    degree = np.diff(model.state_ptr)
+    choice = model.state_ptr[:-1] + (rng.random((n, model.n_states)) * degree).astype(np.int64)
+    choice[:, degree == 0] = -1
+    return choice
+
+
+def as_adversary(scheduler):
+    """An adversary object, from an adversary or an array of choice indices per state."""
+    if hasattr(scheduler, 'next_memory'):
+        return scheduler
+    return MemorylessDeterministic(scheduler)
@@ -0,0 +1,254 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import mdp_generator
+import simulation
+from adversaire_simulation import gerar_preferencias_acoes, random_walk
+from mdp import parse
+from mdp_model import CompiledMDP
+from model_checking import segment_suremaynever_states, solve_system
+
+'''
+Times every stage of the pipeline on fixed workloads and compares the results with benchmark_baseline.json.
+
+Stages, for every workload:
+- parse -> lexing and parsing with ANTLR and building the weights table, as done by run()
+- update_transactions_prob -> building the probabilities dataframe
+- random_walk -> steps per second of the simular_random_walk logic (adversaire_simulation.random_walk)
+- batch_walk -> steps per second of BATCH_RUNS trajectories simulated together (simulation.simulate_batch)
+- partition -> S_sure / S_may / S_never partition (model_checking.segment_suremaynever_states)
+- solve_system -> the linprog reachability system (model_checking.solve_system)
+
+The "startup" workload times whole processes instead: importing mdp and running the command line checker
+(mdp_cli.py) on a small file, with the peak resident memory of the process.
+
+Every stage is timed `repeat` times (the best time is kept), then run once more under tracemalloc to record
+its peak memory. A stage regresses when its time (or its memory) grows by more than the tolerance.
+
+Usage:
+    python benchmark.py                      # compares with the baseline, exits with 1 on a regression
+    python benchmark.py --update             # stores the new baseline (to commit with the change)
+    python benchmark.py --tolerance 0.5 --only grid_12x12 --report results.json
+'''
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+STAGES = ['parse', 'update_transactions_prob', 'random_walk', 'batch_walk', 'partition', 'solve_system']
+WALK_STEPS = 500
+BATCH_RUNS = 100000
+SEED = 0
+
+# name -> (file or generator, target state)
+WORKLOADS = {
+    'simu-mc': ('prof_examples/simu-mc.mdp', 'S1'),
+    'simu-mdp': ('prof_examples/simu-mdp.mdp', 'W'),
+    'grid_12x12': (lambda: mdp_generator.grid_world(12, 12, n_traps=10, seed=SEED), None),
+    'random_200': (lambda: mdp_generator.random_mdp(200, n_actions=3, branching=3, seed=SEED), None),
+    'chain_100': (lambda: mdp_generator.chain(100, fail=1), None),
+    'startup': (None, None),
+}
+STARTUP_COMMANDS = {
+    'import_mdp': [sys.executable, '-c', 'import mdp'],
+    'cli_check': [sys.executable, '-m', 'mdp_cli', 'check', '--quiet', '--no-cache', 'prof_examples/simu-mc.mdp'],
+}
+
+
+def workload_file(name, folder):
+    """Returns the .mdp file and the target state of a workload, writing generated models in folder."""
+    source, target = WORKLOADS[name]
+    if isinstance(source, str):
+        return source, target
+    model = source()
+    path = model.write(os.path.join(folder, f"{name}.mdp"))
+    return path, model.state_names[model.goal]
+
+
+def _stages(path, target):
+    """Yields (stage, function) in order, each function using the results of the previous ones."""
+    state = {}
+
+    def parse_stage():
+        printer = state['printer'] = parse(path)
+        printer.update_rewards()
+        printer.createTransactions()
+
+    def prob_stage():
+        state['printer'].update_transactions_prob()
+
+    def walk_stage():
+        printer = state['printer']
+        random.seed(SEED)
+        np.random.seed(SEED)
+        preferencias = gerar_preferencias_acoes(printer.transactions_prob, printer.declared_states, printer.declared_actions, modo="random")
+        steps = 0
+        while steps < WALK_STEPS: # The walk starts again from the first state when it reaches a state without transitions
+            steps += max(1, len(random_walk(printer, preferencias, WALK_STEPS - steps, verbose=False)) - 1)
+        return steps
+
+    def batch_stage():
+        printer = state['printer']
+        model = CompiledMDP.from_printer(printer)
+        result = simulation.simulate_batch(model, BATCH_RUNS, 20, model.state_index[target], rng=SEED)
+        return result.steps
+
+    def partition_stage():
+        state['partition'] = segment_suremaynever_states(state['printer'], target)
+
+    def solve_stage():
+        S_sure, S_may, _ = state['partition']
+        if S_may:
+            solve_system(state['printer'], S_may, S_sure, verbose=False)
+
+    return [('parse', parse_stage), ('update_transactions_prob', prob_stage), ('random_walk', walk_stage),
+            ('batch_walk', batch_stage), ('partition', partition_stage), ('solve_system', solve_stage)]
+
+
+# Runs a command and prints its wall time and peak resident memory. It is started from a fresh interpreter,
+# as the peak memory of a forked process includes the memory of its parent (this process).
+_LAUNCHER = """
+import os, subprocess, sys, time
+start = time.perf_counter()
+process = subprocess.Popen(sys.argv[1:], stdout=subprocess.DEVNULL)
+_, _, usage = os.wait4(process.pid, 0)
+print(time.perf_counter() - start, usage.ru_maxrss * 1024)
+"""
+
+
+def run_startup(repeat=3):
+    """Times every STARTUP_COMMANDS in a new process (best of repeat), with the peak resident memory of the process."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for stage, command in STARTUP_COMMANDS.items():
+        times, peak = [], 0
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, '-c', _LAUNCHER] + command, cwd=here, capture_output=True, text=True, check=True).stdout
+            seconds, rss = out.split()
+            times.append(float(seconds))
+            peak = max(peak, int(rss)) # ru_maxrss is in kilobytes on Linux
+        results[stage] = {'seconds': min(times), 'peak_bytes': peak}
+    return results
+
+
+def run_workload(name, folder, repeat=3):
+    """
+    Runs every stage of a workload.
+
+    Returns:
+    - dict: stage -> {'seconds', 'peak_bytes'} (and 'steps_per_second' for the walks).
+    """
+    if name == 'startup':
+        return run_startup(repeat)
+    path, target = workload_file(name, folder)
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        timings = {stage: [] for stage in STAGES}
+        for _ in range(repeat):
+            for stage, function in _stages(path, target):
+                start = time.perf_counter()
+                function()
+                timings[stage].append(time.perf_counter() - start)
+
+        for stage, function in _stages(path, target):
+            tracemalloc.start()
+            value = function()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[stage] = {'seconds': min(timings[stage]), 'peak_bytes': peak}
+            if stage in ('random_walk', 'batch_walk'):
+                results[stage]['steps_per_second'] = value / min(timings[stage])
+    return results
+
+
+def run_benchmarks(names=None, repeat=3):
+    names = names or list(WORKLOADS)
+    with tempfile.TemporaryDirectory() as folder:
+        return {name: run_workload(name, folder, repeat) for name in names}
+
+
+def environment():
+    import pandas, scipy
+    return {'python': platform.python_version(), 'machine': platform.machine(), 'system': platform.system(),
+            'numpy': np.__version__, 'pandas': pandas.__version__, 'scipy': scipy.__version__}
+
+
+def compare(results, baseline, tolerance=0.25, memory_tolerance=0.25, min_delta=0.05):
+    """
+    Slowdowns of less than min_delta seconds are ignored, the shortest stages being mostly timer noise.
+
+    Returns:
+    - list: (workload, stage, metric, baseline value, new value) for every regression beyond the tolerances.
+    """
+    regressions = []
+    for name, stages in results.items():
+        for stage, new in stages.items():
+            old = baseline.get(name, {}).get(stage)
+            if old is None:
+                continue
+            if new['seconds'] > max(old['seconds'] * (1 + tolerance), old['seconds'] + min_delta):
+                regressions.append((name, stage, 'seconds', old['seconds'], new['seconds']))
+            if new['peak_bytes'] > old['peak_bytes'] * (1 + memory_tolerance):
+                regressions.append((name, stage, 'peak_bytes', old['peak_bytes'], new['peak_bytes']))
+    return regressions
+
+
+def print_table(results, baseline):
+    print(f"{'workload':<12} {'stage':<25} {'seconds':>10} {'baseline':>10} {'ratio':>6} {'peak MB':>8}")
+    for name, stages in results.items():
+        for stage, new in stages.items():
+            old = baseline.get(name, {}).get(stage)
+            ratio = f"{new['seconds'] / old['seconds']:.2f}" if old and old['seconds'] else '-'
+            base = f"{old['seconds']:.4f}" if old else '-'
+            print(f"{name:<12} {stage:<25} {new['seconds']:>10.4f} {base:>10} {ratio:>6} {new['peak_bytes'] / 2**20:>8.2f}")
+            if 'steps_per_second' in new:
+                print(f"{'':<12} {'  steps per second':<25} {new['steps_per_second']:>10.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Times every stage of the pipeline and compares it with the stored baseline.")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update', action='store_true', help="write the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative slowdown (0.25 = 25%%)")
+    parser.add_argument('--memory-tolerance', type=float, default=0.25, help="allowed relative growth of the peak memory")
+    parser.add_argument('--min-delta', type=float, default=0.05, help="slowdowns below this many seconds are ignored")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='+', choices=list(WORKLOADS), help="workloads to run")
+    parser.add_argument('--report', default=None, help="JSON file to write the results to")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print_table(results, baseline)
+
+    document = {'environment': environment(), 'results': results}
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=1)
+    if args.update:
+        if args.only: # Keeps the other workloads of the baseline
+            document['results'] = dict(baseline, **results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=1)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.memory_tolerance, args.min_delta)
+    for name, stage, metric, old, new in regressions:
+        print(f"REGRESSION: {name} {stage} {metric} {old:.6g} -> {new:.6g} ({new / old:.2f}x)", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
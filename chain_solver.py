@@ -0,0 +1,184 @@
+import time
+import numpy as np
+from precomputation import prob0, prob1, target_mask
+
+'''
+Reachability probabilities of a Markov chain (a CompiledMDP with at most one choice per state), from a
+sparse linear system instead of the dense solve_system of the notebooks.
+
+The S_sure and S_never states come from the graph (precomputation.py). The probabilities x of the S_may
+states are then the unique solution of (I - A) x = b, A being the transitions between S_may states and b
+the probability of going to S_sure in one step, both built from the CSR arrays of the model. Methods:
+- direct -> sparse LU factorization (scipy splu), exact up to rounding, the default for small or banded
+            systems (staged models, chains), where the factors stay small
+- jacobi -> x = (b + N x) / d, d being the diagonal of I - A and N the rest of A
+- gauss-seidel -> the same with the new values used as soon as they are known (one sparse triangular solve
+                  per sweep)
+- bicgstab -> Krylov method with a Jacobi preconditioner, the default for the other systems (on a random
+              sparse graph the LU factors fill up quickly)
+The iterative methods stop when the residual max |b - (I - A) x| is below tol.
+
+    solution = solve_reachability(model, model.state_index['S1'])
+    print(solution.values[model.first_state], solution.residual)
+'''
+
+METHODS = ('direct', 'jacobi', 'gauss-seidel', 'bicgstab')
+DIRECT_FILL = 1 << 22 # Largest S_may states * bandwidth for which 'auto' factorizes rather than use bicgstab
+TOLERANCE = 1e-10
+MAX_ITERATIONS = 100000
+
+
+class ChainSolution:
+    """
+    Result of solve_reachability:
+    - values -> probability of reaching the target from every state
+    - method -> method used on the S_may states
+    - iterations -> iterations (sweeps) of the iterative methods, 0 for direct
+    - residual -> max |b - (I - A) x| over the S_may states
+    - converged -> False if an iterative method stopped at max_iterations
+    - seconds -> time spent (graph precomputation, building and solving)
+    """
+
+    def __init__(self, values, method, iterations, residual, converged, seconds):
+        self.values = values
+        self.method = method
+        self.iterations = iterations
+        self.residual = residual
+        self.converged = converged
+        self.seconds = seconds
+
+    def __repr__(self):
+        return (f"ChainSolution(method={self.method!r}, iterations={self.iterations}, residual={self.residual:.3g}, "
+                f"converged={self.converged}, seconds={self.seconds:.3g})")
+
+
+def reachability_system(model, target):
+    """
+    Linear system of the S_may states.
+
+    Returns:
+    - tuple: (sure, may, A, b), the masks of the S_sure and S_may states, A the scipy.sparse CSR matrix of the
+             transitions between S_may states and b the probability of reaching S_sure in one step.
+    """
+    from scipy.sparse import csr_matrix
+    if not model.is_markov_chain():
+        raise ValueError("the model has states with several actions, solve it as an MDP")
+    is_target = target_mask(model, target)
+    sure = prob1(model, is_target, minimize=True) # Same as the max one on a Markov chain, with a single search
+    may = ~(sure | prob0(model, is_target))
+    index = np.full(model.n_states, -1, dtype=np.int64)
+    n = np.count_nonzero(may)
+    index[may] = np.arange(n)
+    # Every state has at most one choice, so the entries of a state are the ones of its choice
+    entry_state = model.choice_state[model.transition_choice]
+    rows = index[entry_state]
+    columns = index[model.targets]
+    inside = (rows >= 0) & (columns >= 0)
+    A = csr_matrix((model.probs[inside], (rows[inside], columns[inside])), shape=(n, n))
+    to_sure = (rows >= 0) & sure[model.targets]
+    b = np.bincount(rows[to_sure], weights=model.probs[to_sure], minlength=n)
+    return sure, may, A, b
+
+
+def _jacobi(M, b, tol, max_iterations):
+    d = M.diagonal()
+    N = M.copy() # Off-diagonal part
+    N.setdiag(0)
+    N.eliminate_zeros()
+    x = np.zeros_like(b)
+    for k in range(1, max_iterations + 1):
+        x = (b - N @ x) / d
+        if np.max(np.abs(b - M @ x), initial=0.0) <= tol:
+            return x, k, True
+    return x, max_iterations, False
+
+
+def _gauss_seidel(M, b, tol, max_iterations):
+    from scipy.sparse import tril, triu
+    from scipy.sparse.linalg import spsolve_triangular
+    lower = tril(M, format='csr')
+    upper = triu(M, 1, format='csr')
+    x = np.zeros_like(b)
+    for k in range(1, max_iterations + 1):
+        x = spsolve_triangular(lower, b - upper @ x, lower=True)
+        if np.max(np.abs(b - M @ x), initial=0.0) <= tol:
+            return x, k, True
+    return x, max_iterations, False
+
+
+def _bicgstab(M, b, tol, max_iterations):
+    from scipy.sparse import diags
+    from scipy.sparse.linalg import bicgstab
+    preconditioner = diags(1 / M.diagonal())
+    iterations = [0]
+
+    def count(xk):
+        iterations[0] += 1
+
+    # Started from b (the probability of reaching S_sure in one step). On a breakdown (info < 0) the method
+    # is restarted from where it stopped, which gives it a new shadow residual, as long as that helps.
+    x = b.copy()
+    residual = np.inf
+    while iterations[0] < max_iterations:
+        x, info = bicgstab(M, b, x0=x, rtol=0.0, atol=tol, maxiter=max_iterations - iterations[0],
+                           M=preconditioner, callback=count)
+        if info >= 0:
+            return x, iterations[0], info == 0
+        previous, residual = residual, np.max(np.abs(b - M @ x))
+        if residual >= previous:
+            break
+    return x, iterations[0], False
+
+
+def _bandwidth(M):
+    """Largest distance of a nonzero from the diagonal: a band LU factorization fills about n * bandwidth entries."""
+    coo = M.tocoo()
+    return int(np.max(np.abs(coo.row - coo.col), initial=0)) + 1
+
+
+def solve_linear(M, b, method='auto', tol=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """
+    Solves M x = b, M being I - A for a substochastic A with a unique solution, by one of METHODS ('auto' as
+    in solve_reachability).
+
+    Returns:
+    - tuple: (x, method used, iterations, converged)
+    """
+    from scipy.sparse.linalg import splu
+    if method != 'auto' and method not in METHODS:
+        raise ValueError(f"unknown method {method!r}, expected 'auto' or one of {METHODS}")
+    if method == 'auto':
+        method = 'direct' if len(b) * _bandwidth(M) <= DIRECT_FILL else 'bicgstab'
+    if len(b) == 0:
+        return b, method, 0, True
+    if method == 'direct':
+        return splu(M.tocsc()).solve(b), method, 0, True
+    solver = {'jacobi': _jacobi, 'gauss-seidel': _gauss_seidel, 'bicgstab': _bicgstab}[method]
+    x, iterations, converged = solver(M.tocsr(), b, tol, max_iterations)
+    return x, method, iterations, converged
+
+
+def solve_reachability(model, target, method='auto', tol=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """
+    Probability of eventually reaching the target from every state of a Markov chain.
+
+    Parameters:
+    - model (CompiledMDP): A Markov chain.
+    - target: State index, sequence of state indices or boolean mask.
+    - method (str): One of METHODS, or 'auto' for direct when S_may states * bandwidth is at most DIRECT_FILL
+                    and bicgstab otherwise.
+    - tol (float): Largest residual of the iterative methods.
+    - max_iterations (int): Iterations after which the iterative methods give up.
+
+    Returns:
+    - ChainSolution
+    """
+    from scipy.sparse import identity
+    start = time.perf_counter()
+    sure, may, A, b = reachability_system(model, target)
+    M = (identity(len(b), format='csr') - A).tocsr()
+    x, method, iterations, converged = solve_linear(M, b, method, tol, max_iterations)
+    residual = float(np.max(np.abs(b - M @ x), initial=0.0))
+    values = sure.astype(np.float64)
+    values[may] = np.clip(x, 0.0, 1.0)
+    return ChainSolution(values, method, iterations, residual, converged, time.perf_counter() - start)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import mdp
+import mdp_generator
+
+'''
+Shared fixtures of the pytest tests (test_*.py next to this file). Run them with: python -m pytest -q
+'''
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Every test gets its own, empty, cache of parsed files (mdp_cache.py) instead of the user's one."""
+    path = tmp_path / "cache"
+    monkeypatch.setenv('MDP_CACHE_DIR', str(path))
+    monkeypatch.delenv('MDP_CACHE', raising=False)
+    return path
+
+
+@pytest.fixture
+def compile_mdp(tmp_path):
+    """Compiles the text of a .mdp file (native reader, no cache) and returns the CompiledMDP."""
+    def compile_text(text):
+        path = tmp_path / "model.mdp"
+        path.write_text(text)
+        _, model, _, _ = mdp.load(str(path), "native", cache=False, need_printer=False, verbose=False)
+        return model
+    return compile_text
+
+
+@pytest.fixture
+def random_model():
+    """
+    Builds a compiled mdp_generator.random_mdp whose last sinks states are made absorbing, so that the target
+    (the last state) isn't reached from everywhere and S_may isn't empty.
+    """
+    def build(n_states, n_actions=2, branching=2, seed=0, markov_chain=False, sinks=2):
+        generated = mdp_generator.random_mdp(n_states, n_actions, branching, seed, markov_chain)
+        targets = generated.targets.copy()
+        for s in range(n_states - sinks, n_states):
+            for c in np.flatnonzero(generated.choice_state == s):
+                targets[generated.choice_ptr[c]:generated.choice_ptr[c + 1]] = s
+        return mdp_generator.GeneratedMDP(generated.state_names, generated.action_names, generated.choice_state,
+                                          generated.choice_action, generated.choice_ptr, targets,
+                                          generated.weights).to_compiled()
+    return build
+
+
+# S0 and S1 form an end component with action a; S0[b] and S2 reach G with probability 1/3 and 3/4.
+# Pmax(G) = 3/4 from S0, S1 and S2 (go to S2). Pmin(G) = 0 from S0 and S1 (stay in the end component).
+END_COMPONENT = """
+States S0, S1, S2, G, F;
+Actions a, b;
+S0[a] -> 1:S1;
+S0[b] -> 1:G + 2:F;
+S1[a] -> 1:S0;
+S1[b] -> 1:S2;
+S2 -> 3:G + 1:F;
+G -> 1:G;
+F -> 1:F;
+"""
+
+
+@pytest.fixture
+def end_component(compile_mdp):
+    """The CompiledMDP of END_COMPONENT, the hand-built MDP shared by the solver tests."""
+    return compile_mdp(END_COMPONENT)
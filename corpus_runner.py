@@ -0,0 +1,134 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from mdp import load
+
+'''
+Parses a whole tree of .mdp files across a process pool and writes a single report with, for every file:
+its syntax errors, warnings and errors, the number of states, actions, choices and transitions, and the
+parse time. The process exits with 1 if any file has a syntax error, a parsing error or crashed
+(or a warning, with --strict).
+
+Usage:
+    python corpus_runner.py prof_examples mdp_examples --jobs 8 --report report.json
+    python corpus_runner.py generated/ --backend native --report report.csv
+'''
+
+SYNTAX_ERROR = re.compile(r'^line \d+:\d+ .*$', re.MULTILINE) # Messages of the ANTLR ConsoleErrorListener
+CSV_FIELDS = ['path', 'status', 'states', 'actions', 'choices', 'transitions', 'parse_time',
+              'n_syntax_errors', 'n_warnings', 'n_errors', 'syntax_errors', 'warnings', 'errors', 'exception']
+
+
+def find_mdp_files(roots):
+    """Returns the sorted .mdp files of the given files and directory trees."""
+    paths = []
+    for root in roots:
+        if os.path.isfile(root):
+            paths.append(root)
+            continue
+        for folder, _, files in os.walk(root):
+            paths.extend(os.path.join(folder, f) for f in files if f.endswith('.mdp'))
+    return sorted(paths)
+
+
+def check_file(path, backend="antlr", cache=False):
+    """
+    Parses one file quietly, capturing the ANTLR syntax errors.
+
+    Returns:
+    - dict: One line of the report.
+    """
+    result = {'path': path, 'status': 'ok', 'states': None, 'actions': None, 'choices': None, 'transitions': None,
+              'parse_time': None, 'syntax_errors': [], 'warnings': [], 'errors': [], 'diagnostics': [], 'exception': None}
+    stderr = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stderr(stderr):
+            _, model, warnings, errors = load(path, backend, cache, need_printer=False, verbose=False)
+    except Exception as e:
+        result.update(status='exception', exception=f"{type(e).__name__}: {e}")
+    else:
+        result.update(states=model.n_states, actions=len(model.action_names), choices=model.n_choices,
+                      transitions=model.n_transitions, warnings=[str(w) for w in warnings], errors=[str(e) for e in errors],
+                      diagnostics=[d.to_dict() for d in warnings + errors])
+    result['parse_time'] = time.perf_counter() - start
+    result['syntax_errors'] = SYNTAX_ERROR.findall(stderr.getvalue())
+    if result['status'] == 'ok' and (result['syntax_errors'] or result['errors']):
+        result['status'] = 'error'
+    return result
+
+
+def _check(args):
+    return check_file(*args)
+
+
+def run_corpus(paths, jobs=None, backend="antlr", cache=False):
+    """
+    Checks every file on a pool of jobs processes (os.cpu_count() by default, 1 runs in this process).
+
+    Returns:
+    - list: The report lines, in the order of paths.
+    """
+    tasks = [(path, backend, cache) for path in paths]
+    if jobs == 1 or len(tasks) <= 1:
+        return [_check(t) for t in tasks]
+    jobs = jobs or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(_check, tasks, chunksize=max(1, len(tasks) // (jobs * 8))))
+
+
+def write_report(results, path):
+    """Writes the report as CSV if path ends with .csv, as JSON otherwise ('-' is stdout)."""
+    out = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+    try:
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for r in results:
+                row = dict(r, n_syntax_errors=len(r['syntax_errors']), n_warnings=len(r['warnings']), n_errors=len(r['errors']))
+                for field in ('syntax_errors', 'warnings', 'errors'):
+                    row[field] = ' | '.join(r[field])
+                writer.writerow(row)
+        else:
+            json.dump(results, out, indent=1)
+            out.write('\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parses every .mdp file of the given directories and reports the problems.")
+    parser.add_argument('roots', nargs='*', default=['prof_examples'], help=".mdp files or directories to search")
+    parser.add_argument('--jobs', '-j', type=int, default=None, help="worker processes (default: number of CPUs)")
+    parser.add_argument('--backend', default='antlr', choices=['antlr', 'native', 'stream'])
+    parser.add_argument('--report', default=None, help="report file, .json or .csv ('-' for stdout)")
+    parser.add_argument('--cache', action='store_true', help="use the parsed models cache (off by default, to really test the parser)")
+    parser.add_argument('--strict', action='store_true', help="also fail on warnings")
+    args = parser.parse_args(argv)
+
+    paths = find_mdp_files(args.roots)
+    start = time.perf_counter()
+    results = run_corpus(paths, args.jobs, args.backend, args.cache)
+    elapsed = time.perf_counter() - start
+    if args.report:
+        write_report(results, args.report)
+
+    failed = [r for r in results if r['status'] != 'ok' or (args.strict and r['warnings'])]
+    for r in failed:
+        reason = r['exception'] or f"{len(r['syntax_errors'])} syntax errors, {len(r['errors'])} errors, {len(r['warnings'])} warnings"
+        status = 'warning' if r['status'] == 'ok' else r['status']
+        print(f"{status.upper()}: {r['path']} - {reason}", file=sys.stderr)
+    print(f"{len(paths)} files checked in {elapsed:.2f}s, {len(failed)} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+import logging
+
+'''
+Warnings and errors found while reading a .mdp file.
+
+A Diagnostic is the message string itself (so printer.warnings and printer.errors print and compare
+as before), carrying a code, a severity and the line and column of the statement it comes from
+(line from 1, column from 0, like ANTLR; None when it isn't tied to a statement).
+
+To receive them as they are found, pass a callback to run() / load() (on_diagnostic=...),
+for instance log_diagnostic, which sends them to the "mdp" logger.
+'''
+
+WARNING = 'warning'
+ERROR = 'error'
+
+# Codes
+DUPLICATE_CHOICE = 'duplicate-choice'               # Same (state, action) defined twice
+ACTION_AFTER_NO_ACTION = 'action-after-no-action'   # Action distribution of a state with a no-action one
+NO_ACTION_AFTER_ACTION = 'no-action-after-action'   # No-action distribution of a state with actions
+MULTIPLE_NO_ACTION = 'multiple-no-action'           # Two no-action distributions for a state
+UNDECLARED_STATE = 'undeclared-state'
+UNDECLARED_ACTION = 'undeclared-action'
+DUPLICATE_REWARD = 'duplicate-reward'
+MISSING_REWARD = 'missing-reward'
+
+logger = logging.getLogger('mdp')
+
+
+class Diagnostic(str):
+
+    def __new__(cls, code, message, severity=WARNING, line=None, column=None):
+        self = super().__new__(cls, message)
+        self.code = code
+        self.severity = severity
+        self.line = line
+        self.column = column
+        return self
+
+    def __getnewargs__(self):
+        return self.code, str(self), self.severity, self.line, self.column
+
+    @property
+    def message(self):
+        return str(self)
+
+    def location(self):
+        """'line L:C' like the ANTLR messages, or '' without a position."""
+        return '' if self.line is None else f"line {self.line}:{self.column}"
+
+    def to_dict(self):
+        return {'code': self.code, 'severity': self.severity, 'message': str(self), 'line': self.line, 'column': self.column}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['code'], d['message'], d['severity'], d['line'], d['column'])
+
+
+def log_diagnostic(diagnostic):
+    """on_diagnostic callback sending the diagnostics to the "mdp" logger."""
+    level = logging.ERROR if diagnostic.severity == ERROR else logging.WARNING
+    if logger.isEnabledFor(level):
+        where = diagnostic.location()
+        logger.log(level, "%s%s [%s]", f"{where} " if where else '', diagnostic, diagnostic.code)
@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+import numpy as np
+import adversary as adv
+
+'''
+Exact evaluation of many adversaries of a CompiledMDP at once, on the Markov chains they induce.
+
+The induced chains of a chunk of adversaries are put side by side in one block diagonal sparse system,
+built with one gather of the choice rows of the model for memoryless deterministic adversaries (the
+rows of a random_choices array), then solved with one sparse LU factorization:
+- reachability -> probability of eventually reaching the target (states that can't reach it are fixed to 0
+                  by a backward search of the graph first, so the system has a unique solution)
+- reward -> expected reward collected before reaching the target (the reward of every state left, as in
+            the reward analysis of raport_final.ipynb), infinite when the target is reached with probability < 1
+
+Chunks are spread over a pool of processes, the model being given to the workers once.
+
+    choices = adversary.random_choices(model, 10**4, rng=0)
+    values = evaluate(model, choices, target)       # values[i]: adversary i, from the first state
+    best = choices[values.argmax()]
+'''
+
+CHUNK_STATES = 1 << 18 # Unknowns of the block diagonal system solved at once
+OBJECTIVES = ('reachability', 'reward')
+
+_model = None # Model of the worker processes
+
+
+def _init_worker(model):
+    global _model
+    _model = model
+
+
+def _backward(matrix, sources, allowed):
+    """States reaching a sources state in the graph of matrix, through allowed states only (sources included)."""
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import breadth_first_order
+    n = matrix.shape[0]
+    # Reverse edges t -> s of the allowed states s, plus an extra node n pointing to every source
+    coo = matrix.tocoo()
+    keep = allowed[coo.row] & (coo.data > 0)
+    extra = np.flatnonzero(sources)
+    rows = np.concatenate([coo.col[keep], np.full(len(extra), n)])
+    cols = np.concatenate([coo.row[keep], extra])
+    reverse = csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n + 1, n + 1))
+    found = np.zeros(n + 1, dtype=bool)
+    found[breadth_first_order(reverse, n, directed=True, return_predecessors=False)] = True
+    return found[:n]
+
+
+def solve_chain(matrix, is_target, objective='reachability', rewards=None, method='direct'):
+    """
+    Reachability probability or expected reward (see the module) of every state of a Markov chain.
+
+    Parameters:
+    - matrix: scipy.sparse transition matrix (rows of the states without successors are empty).
+    - is_target: Boolean mask of the target states.
+    - objective (str): 'reachability' or 'reward'.
+    - rewards: Reward of every state, for 'reward'.
+    - method (str): Solver of the linear system, as in chain_solver.solve_linear.
+
+    Returns:
+    - numpy array: The value of every state.
+    """
+    from scipy.sparse import diags, identity
+    from scipy.sparse.linalg import splu
+    n = matrix.shape[0]
+    is_target = np.asarray(is_target, dtype=bool)
+    never = ~_backward(matrix, is_target, ~is_target)
+    if objective == 'reachability':
+        fixed = is_target | never
+        b = is_target.astype(float)
+    elif objective == 'reward':
+        fixed = is_target | _backward(matrix, never, ~is_target) # Target missed with a positive probability
+        b = np.where(fixed, 0.0, rewards)
+    else:
+        raise ValueError(f"unknown objective {objective!r}, expected one of {OBJECTIVES}")
+    system = (identity(n, format='csc') - diags((~fixed).astype(float)) @ matrix).tocsc()
+    if method == 'direct':
+        x = splu(system).solve(b) if n else b
+    else:
+        from chain_solver import solve_linear
+        x = solve_linear(system, b, method)[0]
+    if objective == 'reward':
+        x[fixed & ~is_target] = np.inf
+    return x
+
+
+def _deterministic_chunk(model, choices, target, objective):
+    """Values at the first state of the adversaries of a (k, states) array of choice indices."""
+    from scipy.sparse import csr_matrix
+    k, n = choices.shape
+    state_ptr, entries = adv.gather_rows(model.choice_ptr, choices.ravel())
+    block = np.repeat(np.arange(k, dtype=np.int64) * n, n)
+    targets = model.targets[entries] + np.repeat(block, np.diff(state_ptr))
+    matrix = csr_matrix((model.probs[entries], targets, state_ptr), shape=(k * n, k * n))
+    is_target = np.tile(np.isin(np.arange(n), np.atleast_1d(target)), k)
+    x = solve_chain(matrix, is_target, objective, np.tile(model.rewards, k))
+    return x[np.arange(k) * n + model.first_state]
+
+
+def _chains_chunk(model, adversaries, target, objective):
+    """Values at the first state of adversary objects, from their induced chains."""
+    from scipy.sparse import block_diag
+    chains = [a.induced_chain(model) for a in adversaries]
+    offsets = np.concatenate([[0], np.cumsum([c.n_states for c in chains])])
+    matrix = block_diag([c.matrix() for c in chains], format='csr')
+    is_target = np.concatenate([c.target_mask(target) for c in chains])
+    rewards = np.concatenate([model.rewards[c.model_state] for c in chains])
+    x = solve_chain(matrix, is_target, objective, rewards)
+    return x[offsets[:-1] + [c.first_state for c in chains]]
+
+
+def _run_chunk(task):
+    return _evaluate_chunk(_model, *task)
+
+
+def _evaluate_chunk(model, adversaries, target, objective):
+    if isinstance(adversaries, np.ndarray):
+        return _deterministic_chunk(model, adversaries, target, objective)
+    return _chains_chunk(model, adversaries, target, objective)
+
+
+def evaluate(model, adversaries, target, objective='reachability', workers=None, chunk_states=CHUNK_STATES):
+    """
+    Exact value of every adversary, from the first state of the model.
+
+    Parameters:
+    - model (CompiledMDP): The model.
+    - adversaries: (k, states) array of choice indices (memoryless deterministic adversaries), or a list of
+                   adversary objects (adversary.py).
+    - target: State index, or sequence of state indices.
+    - objective (str): 'reachability' or 'reward'.
+    - workers (int): Processes solving the chunks, None for all the CPUs.
+    - chunk_states (int): Chain states of the system solved at once.
+
+    Returns:
+    - numpy array: The value of every adversary, in order.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"unknown objective {objective!r}, expected one of {OBJECTIVES}")
+    if not isinstance(adversaries, np.ndarray) and all(isinstance(a, adv.MemorylessDeterministic) for a in adversaries):
+        adversaries = np.array([a.choice for a in adversaries], dtype=np.int64).reshape(-1, model.n_states)
+    per_chunk = max(1, chunk_states // max(1, model.n_states))
+    chunks = [adversaries[i:i + per_chunk] for i in range(0, len(adversaries), per_chunk)]
+    workers = max(1, os.cpu_count() if workers is None else workers)
+    if workers == 1 or len(chunks) == 1:
+        values = [_evaluate_chunk(model, chunk, target, objective) for chunk in chunks]
+    else:
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        with multiprocessing.get_context(method).Pool(min(workers, len(chunks)), _init_worker, (model,)) as pool:
+            values = pool.map(_run_chunk, [(chunk, target, objective) for chunk in chunks])
+    return np.concatenate(values) if values else np.zeros(0)
+
+
+def rank(model, adversaries, target, objective='reachability', workers=None, maximize=True):
+    """
+    Evaluates the adversaries and sorts them, best first.
+
+    Returns:
+    - tuple: (order, values), order being the adversary indices best first and values their values in that order.
+    """
+    values = evaluate(model, adversaries, target, objective, workers)
+    order = np.argsort(-values if maximize else values, kind='stable')
+    return order, values[order]
@@ -1,19 +1,20 @@
-import pandas as pd
-import numpy as np
-import tkinter as tk
-from tkinter import messagebox
 from mdp import run as run_mdp
+from mdp_model import AliasTable, dataframe_rows
+from trajectory import TrajectoryRecorder
 
 
-def random_walk_interactive_with_prob(df, start_state="S0", action=None):
-    current_state = start_state
+def random_walk_interactive_with_prob(df, start_state=None, action=None):
+    state_columns = list(df.columns[2:]) # Declared states, after Origin and Action; the first one is the first state
+    current_state = state_columns[0] if start_state is None else start_state
     path = [current_state]
     total_probability = 1.0  # Initializes the total probability as 1 (100%)
     transition_count = 0  # Initializes the count of transitions
+    rows, actions = dataframe_rows(df)
+    alias = AliasTable.from_dataframe(df[state_columns]) # Built once, every step then costs O(1)
 
     while True:
         print(f"Current state: {current_state}")
-        available_actions = df[df['Origin'] == current_state]['Action'].unique()
+        available_actions = actions.get(current_state, [])
         
         # Automatically choose "NA" if it's the only action available
         if len(available_actions) == 1 and "NA" in available_actions:
@@ -22,19 +23,15 @@ def random_walk_interactive_with_prob(df, start_state="S0", action=None):
             action_query = f"If the next state asks for an action, which one will you choose? ({', '.join(available_actions)})"
             action = input(action_query + ": ")
 
-        transitions = df[(df['Origin'] == current_state) & ((df['Action'] == action) | (df['Action'] == "NA"))]
+        row = rows.get((current_state, action), rows.get((current_state, "NA")))
 
-        if transitions.empty:
+        if row is None or alias.size(row) == 0:
             print("There are no valid transitions from this state.")
             break
 
-        state_columns = [col for col in df.columns if col.startswith('S')]
-        probabilities = transitions[state_columns].values.flatten()
-        probabilities = probabilities / probabilities.sum()  # Normalizes the probabilities
-        
-        next_state_index = np.random.choice(len(state_columns), p=probabilities)
-        next_state = state_columns[next_state_index]
-        step_probability = probabilities[next_state_index]
+        entry = alias.sample_one(row)
+        next_state = state_columns[alias.targets[entry]]
+        step_probability = alias.probs[entry]
 
         transition_count += 1  # Increment the transition count
         print(f"Transitioning from state {current_state} to {next_state} with a probability of {step_probability:.2f}.")
@@ -58,40 +55,61 @@ def random_walk_interactive_with_prob(df, start_state="S0", action=None):
     return path, total_probability
 
 # Example of running the function without a predefined action
-# random_walk_interactive_with_prob(df, "S0")
-
-class RandomWalkApp(tk.Tk):
-    def __init__(self, df):
-        super().__init__()
-        self.title("Random Walk Visualization")
-        self.geometry("800x600")  # Increasing the size to accommodate new elements
+# random_walk_interactive_with_prob(df)
+
+class RandomWalkApp:
+    # tkinter is only imported by the methods, so that the functions above work headless. The window is
+    # self.root, mainloop and destroy are forwarded to it.
+    def __init__(self, df, start_state=None):
+        import tkinter as tk
+        self.root = tk.Tk()
+        self.root.title("Random Walk Visualization")
+        self.root.geometry("800x600")  # Increasing the size to accommodate new elements
         
         self.df = df
-        self.current_state = "S0"
-        self.path = [self.current_state]
+        self.state_columns = list(df.columns[2:]) # Declared states, after Origin and Action
+        self.rows, self.actions = dataframe_rows(df)
+        self.alias = AliasTable.from_dataframe(df[self.state_columns])
+        self.start_state = self.state_columns[0] if start_state is None else start_state # First declared state
+        self.current_state = self.start_state
+        self.recorder = TrajectoryRecorder(self.state_columns, sorted({a for a in df['Action'] if a != "NA"}))
+        self.recorder.start_named(self.current_state)
         self.total_probability = 1.0
         self.transition_count = 0
         self.create_widgets()
-    
+
+    def mainloop(self):
+        self.root.mainloop()
+
+    def destroy(self):
+        self.root.destroy()
+
+    @property
+    def path(self):
+        """States of the walk, as names (rendered from the recorder)."""
+        return self.recorder.trajectories().names(-1)
+
     def create_widgets(self):
-        self.current_state_label = tk.Label(self, text=f"Current State: {self.current_state}")
+        import tkinter as tk
+        self.current_state_label = tk.Label(self.root, text=f"Current State: {self.current_state}")
         self.current_state_label.pack(pady=10)
         
-        self.path_label = tk.Label(self, text="Path: S0")
+        self.path_label = tk.Label(self.root, text=f"Path: {self.start_state}")
         self.path_label.pack(pady=10)
 
-        self.action_buttons_frame = tk.Frame(self)
+        self.action_buttons_frame = tk.Frame(self.root)
         self.action_buttons_frame.pack(pady=20)
         
         # Button to start the random walk
-        self.start_button = tk.Button(self, text="Start Random Walk", command=self.start_random_walk)
+        self.start_button = tk.Button(self.root, text="Start Random Walk", command=self.start_random_walk)
         self.start_button.pack(pady=10)
         
         # Button to quit the application
-        self.quit_button = tk.Button(self, text="Quit", command=self.destroy)
+        self.quit_button = tk.Button(self.root, text="Quit", command=self.destroy)
         self.quit_button.pack(pady=10)
 
     def update_action_buttons(self, actions):
+        import tkinter as tk
         # Clear the previous action buttons
         for widget in self.action_buttons_frame.winfo_children():
             widget.destroy()
@@ -103,8 +121,10 @@ class RandomWalkApp(tk.Tk):
 
     def start_random_walk(self):
         # Reset the state if it has already started
-        if len(self.path) > 1:
-            self.path = [self.current_state]
+        if len(self.recorder) > 1:
+            self.current_state = self.start_state
+            self.recorder.clear()
+            self.recorder.start_named(self.current_state)
             self.total_probability = 1.0
             self.transition_count = 0
             self.update_state_label()
@@ -113,37 +133,33 @@ class RandomWalkApp(tk.Tk):
         self.perform_action()
 
     def perform_action(self, action=None):
+        from tkinter import messagebox
         if self.transition_count == 0 or action is not None:
             self.action = action
 
-        # Find valid transitions for the current state and selected action
-        transitions = self.df[(self.df['Origin'] == self.current_state) & ((self.df
+        # Find the row of the current state and selected action
+        row = self.rows.get((self.current_state, self.action), self.rows.get((self.current_state, 'NA')))
+        taken = self.action if (self.current_state, self.action) in self.rows else 'NA'
 
-['Action'] == self.action) | (self.df['Action'] == 'NA'))]
-
-        if transitions.empty:
+        if row is None or self.alias.size(row) == 0:
             messagebox.showinfo("Random Walk", "There are no valid transitions from this state.")
             return
 
-        state_columns = [col for col in self.df.columns if col.startswith('S')]
-        probabilities = transitions[state_columns].values.flatten()
-        probabilities = probabilities / probabilities.sum()  # Normalizing probabilities
-
-        next_state_index = np.random.choice(len(state_columns), p=probabilities)
-        next_state = state_columns[next_state_index]  # Keep state identifiers as they are in the DataFrame
+        entry = self.alias.sample_one(row)
+        next_state = self.state_columns[self.alias.targets[entry]]  # Keep state identifiers as they are in the DataFrame
 
-        step_probability = probabilities[next_state_index]
+        step_probability = self.alias.probs[entry]
 
         self.transition_count += 1
         self.current_state = next_state  # Update directly without removing 'S'
-        self.path.append(self.current_state)
+        self.recorder.step_named(taken, self.current_state, step_probability)
         self.total_probability *= step_probability
 
         # Update the GUI
         self.update_state_label(step_probability)
 
         # Determine available actions in the new state
-        available_actions = self.df[self.df['Origin'] == self.current_state]['Action'].unique()
+        available_actions = self.actions.get(self.current_state, [])
         self.update_action_buttons(available_actions)
 
     def update_state_label(self, step_probability=None):
@@ -156,7 +172,7 @@ class RandomWalkApp(tk.Tk):
 def main():
     printer = run_mdp(path="correct_ex.mdp", return_printer=True)
     df = printer.transactions_prob
-    app = RandomWalkApp(df)
+    app = RandomWalkApp(df, printer.first_state)
     app.mainloop()
 
 if __name__ == "__main__":
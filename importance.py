@@ -0,0 +1,113 @@
+import numpy as np
+import simulation
+from adversary import MemorylessRandomized, MemorylessDeterministic, as_adversary
+
+'''
+Importance sampling for rare reachability events.
+
+When the target is reached with a probability around 1e-6, the Chernoff-Hoeffding run counts of
+prob_n_lancers (remi.ipynb) are out of reach: almost no trajectory hits. Here the successors are drawn
+from a proposal q tilted towards the target instead of the model probabilities p, and every trajectory
+carries its likelihood ratio L = prod p/q. The mean of hit * L is an unbiased estimate of the probability,
+and its standard error gives the confidence interval.
+
+The proposal is either given (one probability per transition entry of the model), or built from a cheap
+approximation v of the probability of reaching the target from every state: q(s -> t) is proportional to
+p(s -> t) v(t), mixed with p so that every transition keeps a positive probability. With the exact v of a
+Markov chain the estimator has (almost) no variance.
+
+    result = importance.estimate(model, target, 10**5, num_transitions=200)
+    print(result.estimate, result.interval())
+'''
+
+MIX = 0.1 # Share of the model probabilities in the automatic proposal
+Z_95 = 1.959963984540054
+
+
+def approximate_values(model, target, num_transitions, scheduler=None):
+    """
+    Probability of reaching the target within num_transitions steps, from every state, on the Markov chain
+    induced by a memoryless scheduler (all choices equally likely by default).
+    """
+    adversary = None if scheduler is None else as_adversary(scheduler)
+    if not isinstance(adversary, (MemorylessDeterministic, MemorylessRandomized)):
+        adversary = MemorylessRandomized.uniform(model)
+    chain = adversary.induced_chain(model)
+    matrix = chain.matrix()
+    is_target = chain.target_mask(target)
+    values = is_target.astype(float)
+    for _ in range(num_transitions):
+        values = np.where(is_target, 1.0, matrix @ values)
+    return values
+
+
+def tilted_proposal(model, values, mix=MIX):
+    """
+    Proposal q(s -> t) = (1 - mix) p v(t) / sum p v + mix p for every transition entry of the model, the
+    model probabilities p being kept in the choices where v is 0 everywhere.
+    """
+    choice = model.transition_choice
+    weights = model.probs * values[model.targets]
+    totals = np.bincount(choice, weights=weights, minlength=model.n_choices)[choice]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tilted = np.where(totals > 0, weights / totals, model.probs)
+    return (1 - mix) * tilted + mix * model.probs
+
+
+class ISResult:
+    """
+    Importance sampling estimate from n trajectories:
+    - estimate -> mean of hit * likelihood ratio
+    - std_error -> its standard error
+    - hits -> trajectories reaching the target (under the proposal)
+    """
+
+    def __init__(self, n, estimate, std_error, hits):
+        self.n = n
+        self.estimate = estimate
+        self.std_error = std_error
+        self.hits = hits
+
+    @property
+    def relative_error(self):
+        return self.std_error / self.estimate if self.estimate else float('inf')
+
+    def interval(self, z=Z_95):
+        """Normal confidence interval, z = 1.96 for 95%."""
+        return max(0.0, self.estimate - z * self.std_error), min(1.0, self.estimate + z * self.std_error)
+
+    @classmethod
+    def from_batch(cls, result):
+        values = result.hit * (result.likelihood if result.likelihood is not None else 1.0)
+        n = len(values)
+        std_error = float(values.std(ddof=1) / np.sqrt(n)) if n > 1 else float('inf')
+        return cls(n, float(values.mean()), std_error, int(result.hit.sum()))
+
+    def __repr__(self):
+        low, high = self.interval()
+        return f"ISResult(n={self.n}, estimate={self.estimate:.4g}, 95% interval=[{low:.4g}, {high:.4g}], hits={self.hits})"
+
+
+def estimate(model, target, n, num_transitions=20, proposal='auto', rng=None, scheduler=None, mix=MIX):
+    """
+    Importance sampling estimate of the probability of reaching the target within num_transitions steps.
+
+    Parameters:
+    - model (CompiledMDP): The model.
+    - target: State index, or sequence of state indices.
+    - n (int): Number of trajectories.
+    - num_transitions (int): Maximum number of transitions of every trajectory.
+    - proposal: Probability of every transition entry, 'auto' for tilted_proposal(approximate_values(...)),
+                or None for plain Monte Carlo.
+    - rng: numpy Generator or seed.
+    - scheduler: As in simulation.simulate_batch (the random adversary by default). The choices are drawn as
+                 without importance sampling, only the successors are tilted.
+    - mix (float): Share of the model probabilities in the automatic proposal.
+
+    Returns:
+    - ISResult
+    """
+    if isinstance(proposal, str) and proposal == 'auto':
+        proposal = tilted_proposal(model, approximate_values(model, target, num_transitions, scheduler), mix)
+    result = simulation.simulate_batch(model, n, num_transitions, target, rng, scheduler, proposal=proposal)
+    return ISResult.from_batch(result)
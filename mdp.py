@@ -1,9 +1,11 @@
-from antlr4 import *
-from gramLexer import gramLexer
-from gramListener import gramListener
-from gramParser import gramParser
-import pandas as pd
+from mdp_model import CompiledMDP
+import native_parser
+import mdp_cache
+import diagnostics
+from native_parser import MdpSyntaxError
+from diagnostics import Diagnostic
 import random
+from array import array
 import numpy as np
 
 '''
@@ -17,19 +19,36 @@ We modified the gramPrintListener class, adding the attributes:
                   to this state.
 - transactions_prob -> Same dataframe as before converting weights to probabilities, sum being 1. 
                        NAs are set to zero, since it's what they mean .
+- model -> CompiledMDP (mdp_model.py) with the same probabilities as integer indexed sparse arrays.
 
 We divided the main into "run" and "main". So that we can specify when running:
 - The path where the file .mdp is
 - If we should return the printer instance or not (Then being able to collect the data instead of just reading it)
+- If we should return the compiled model (alone, or as (printer, model) together with the printer)
+- The parser backend: "antlr" (reference) or "native" (native_parser.py, same results, much faster)
+  or "stream" (reads the file in chunks, for generated files too big to load, without error recovery)
+- If the on-disk cache of parsed files (mdp_cache.py) should be used (off by default, the command line
+  turns it on). Only the tables asked for are built, so loading just the compiled model of a cached file
+  skips parsing entirely.
+- If anything should be printed (verbose=False prints nothing, for batch tools) and a callback receiving
+  the warnings and errors as they are found (on_diagnostic, see diagnostics.py)
 
 We added verification functions to raise an error if the .mdp:
 - Duplicates in definition the same couple (state, action)
 - Defines a state with both an action and no action 
+The warnings and errors are diagnostics.Diagnostic strings, with a code and the line and column of the statement.
+
+gramPrintListener doesn't derive from the generated gramListener, which imports the ANTLR runtime: the
+native, stream and cached paths never load it. It has the no-op listener methods the ANTLR walker calls instead.
 '''
         
-class gramPrintListener(gramListener):
+class gramPrintListener:
 
-    def __init__(self):
+    def __init__(self, verbose = True, on_diagnostic = None):
+        self.verbose = verbose             # Print every statement as it is read
+        self.on_diagnostic = on_diagnostic # Called with every Diagnostic as soon as it is found
+        self.location = None               # Statement being read: ANTLR context or native_parser location
+        self.syntax_errors = []            # Syntax errors ANTLR recovered from, as it prints them ("line 1:9 ...")
         self.declared_states = []
         self.declared_actions = []
         self.rewards = {}
@@ -39,155 +58,320 @@ class gramPrintListener(gramListener):
         self.transactions = None
         self.transactions_prob = False
         self.first_state = None
-        self.warnings = []
+        self.warnings = [] # Diagnostic objects (diagnostics.py), which are the message strings
         self.errors = []
+        # Transitions are collected here while walking and only turned into a dataframe once, in createTransactions
+        self.known_states = set()       # Same content as declared_states and declared_actions, for fast lookups
+        self.known_actions = set()
+        self.no_action_states = set()
+        self.transaction_columns = None # State columns, in the order they were first seen
+        self.column_index = {}          # State -> position in transaction_columns
+        self.trans_action_names = ["NA"] # Distinct actions of the rows, "NA" being the no-action distribution
+        self.trans_action_index = {"NA": 0}
+        # Typed arrays, so memory grows with the model size only
+        self.trans_origins = array('q') # One entry per transition row: column of the origin, index in trans_action_names
+        self.trans_actions = array('q')
+        self.trans_rows = array('q')    # One entry per (row, target) weight
+        self.trans_cols = array('q')
+        self.trans_weights = array('d')
+
+    def position(self):
+        """Line and column of the statement being read, or (None, None)."""
+        location = self.location
+        if location is None:
+            return None, None
+        if isinstance(location, tuple):
+            return native_parser.position(location)
+        return location.start.line, location.start.column
+
+    def warn(self, code, message):
+        self.warnings.append(self.diagnostic(code, message, diagnostics.WARNING))
+
+    def error(self, code, message):
+        self.errors.append(self.diagnostic(code, message, diagnostics.ERROR))
+
+    def diagnostic(self, code, message, severity):
+        d = Diagnostic(code, message, severity, *self.position())
+        if self.on_diagnostic is not None:
+            self.on_diagnostic(d)
+        return d
+
+    def declareState(self, state):
+        self.declared_states.append(state)
+        self.known_states.add(state)
+
+    def initColumns(self):
+        self.transaction_columns = list(self.declared_states)
+        self.column_index = {s:i for i, s in enumerate(self.transaction_columns)}
+
+    def addColumn(self, state):
+        if state not in self.column_index:
+            self.column_index[state] = len(self.transaction_columns)
+            self.transaction_columns.append(state)
+
+    def addTransaction(self, dep, act, ids, weights):
+        row = len(self.trans_origins)
+        if act not in self.trans_action_index:
+            self.trans_action_index[act] = len(self.trans_action_names)
+            self.trans_action_names.append(act)
+        self.trans_origins.append(self.column_index[dep])
+        self.trans_actions.append(self.trans_action_index[act])
+        new_trans_data = dict(zip(ids, weights)) # Repeated targets keep the last weight
+        self.trans_rows.extend([row] * len(new_trans_data))
+        self.trans_cols.extend(map(self.column_index.__getitem__, new_trans_data))
+        self.trans_weights.extend(map(float, new_trans_data.values()))
 
     def createTransactions(self):
-        columns_names = ['Origin', 'Action'] + self.declared_states
-        self.transactions = pd.DataFrame(columns=columns_names)
+        import pandas as pd # pandas is only imported when the tables are built, it's most of the import time
+        if self.transaction_columns is None: # No transition was parsed
+            self.initColumns()
+        weights = np.full((len(self.trans_origins), len(self.transaction_columns)), np.nan)
+        weights[np.frombuffer(self.trans_rows, dtype=np.int64), np.frombuffer(self.trans_cols, dtype=np.int64)] = np.frombuffer(self.trans_weights)
+        origins = np.array(self.transaction_columns, dtype=object)[np.frombuffer(self.trans_origins, dtype=np.int64)]
+        actions = np.array(self.trans_action_names, dtype=object)[np.frombuffer(self.trans_actions, dtype=np.int64)]
+        self.transactions = pd.DataFrame(weights, columns=self.transaction_columns)
+        self.transactions.insert(0, 'Action', pd.Series(actions, dtype=object))
+        self.transactions.insert(0, 'Origin', pd.Series(origins, dtype=object))
 
     def update_transactions_prob(self):
-        df = self.transactions.copy()
-        df.fillna(0, inplace = True) 
-        df.iloc[:, 2:] = df.iloc[:, 2:].div(df.iloc[:, 2:].sum(axis=1), axis='rows') # Transform weights in probabilities
-        self.transactions_prob = df
-        self.transactions_prob = self.transactions_prob[["Origin", "Action"]+self.declared_states]
+        import pandas as pd
+        weights = np.nan_to_num(self.transactions.iloc[:, 2:].to_numpy(dtype=float)) # NAs are set to zero
+        with np.errstate(divide='ignore', invalid='ignore'):
+            probs = weights / weights.sum(axis=1, keepdims=True) # Transform weights in probabilities
+        df = pd.DataFrame(probs, columns=self.transactions.columns[2:])
+        df.insert(0, 'Action', self.transactions['Action'].values)
+        df.insert(0, 'Origin', self.transactions['Origin'].values)
+        self.transactions_prob = df[["Origin", "Action"]+self.declared_states]
         
+    # The rest of the ParseTreeListener interface the ANTLR walker calls on every node. The generated
+    # contexts only call the enter*/exit* methods the listener has, so nothing else is needed.
+    def visitTerminal(self, node):
+        pass
+
+    def visitErrorNode(self, node):
+        pass
+
+    def enterEveryRule(self, ctx):
+        pass
+
+    def exitEveryRule(self, ctx):
+        pass
+
+    # The enter* callbacks only extract the values from the ANTLR context, so that other parsers
+    # (native_parser.py) can feed the same def*/trans* methods directly.
     def enterDefstates(self, ctx):
-        states = [str(x) for x in ctx.ID()]
-        self.declared_states.extend([s for s in states if s not in self.declared_states])
-        print("Initialy declared states: %s" % states)
+        self.location = ctx
+        self.defStates([str(x) for x in ctx.ID()])
+
+    def enterDefrewards(self, ctx):
+        self.location = ctx
+        self.defRewards([str(x) for x in ctx.ID()], [int(str(x)) for x in ctx.INT()])
+
+    def enterDefactions(self, ctx):
+        self.location = ctx
+        self.defActions([str(x) for x in ctx.ID()])
+
+    def enterTransact(self, ctx):
+        self.location = ctx
+        ids = [str(x) for x in ctx.ID()]
+        self.transAct(ids[0], ids[1], ids[2:], [int(str(x)) for x in ctx.INT()])
+
+    def enterTransnoact(self, ctx):
+        self.location = ctx
+        ids = [str(x) for x in ctx.ID()]
+        self.transNoAct(ids[0], ids[1:], [int(str(x)) for x in ctx.INT()])
+
+    def defStates(self, states):
+        self.declared_states.extend([s for s in states if s not in self.known_states])
+        self.known_states.update(states)
+        if self.verbose:
+            print("Initialy declared states: %s" % states)
         if self.first_state is None:
             self.first_state = states[0]
 
-    def enterDefrewards(self, ctx):
-        states = [str(x) for x in ctx.ID()]
-        rewards = [int(str(x)) for x in ctx.INT()]
-        self.declared_states.extend([s for s in states if s not in self.declared_states])
+    def defRewards(self, states, rewards):
+        self.declared_states.extend([s for s in states if s not in self.known_states])
+        self.known_states.update(states)
         for r, s in zip(rewards, states):
             if s in self.rewards.keys():
-                self.errors.append(f"State {s} reward was assigned multiple times, using the first assignment")
+                self.error(diagnostics.DUPLICATE_REWARD, f"State {s} reward was assigned multiple times, using the first assignment")
             else:
                 self.rewards[s] = r
 
     def update_rewards(self):
+        self.location = None # Not tied to a statement
         for s in self.declared_states:
             if s not in self.rewards.keys():
-                self.warnings.append(f"State {s} reward wasn't assigned, using zero as reward")
+                self.warn(diagnostics.MISSING_REWARD, f"State {s} reward wasn't assigned, using zero as reward")
                 self.rewards[s] = 0
 
-    def enterDefactions(self, ctx):
-        actions = [str(x) for x in ctx.ID()]
-        self.declared_actions.extend(a for a in actions if a not in self.declared_actions)
-        print("Initialy declared actions: %s" % actions)
+    def defActions(self, actions):
+        self.declared_actions.extend(a for a in actions if a not in self.known_actions)
+        self.known_actions.update(actions)
+        if self.verbose:
+            print("Initialy declared actions: %s" % actions)
         
 
-    def enterTransact(self, ctx):
-        if self.transactions is None:
-            self.createTransactions()
+    def transAct(self, dep, act, ids, weights):
+        if self.transaction_columns is None:
+            self.initColumns()
 
-        ids = [str(x) for x in ctx.ID()]
-        dep = ids.pop(0)
-        act = ids.pop(0)
-        
         if (dep, act) in self.defined_state_actions:
-            self.warnings.append(f"State {dep} with action {act} has already been defined, using te first one.")
+            self.warn(diagnostics.DUPLICATE_CHOICE, f"State {dep} with action {act} has already been defined, using te first one.")
             return
 
         self.defined_state_actions[(dep, act)] = True
-        if dep in self.states_with_no_action_trans:
-            self.errors.append(f"State {dep} cannot have the action {act} since a no-action distribution has already been assigned, using the no-action only.")
+        if dep in self.no_action_states:
+            self.error(diagnostics.ACTION_AFTER_NO_ACTION, f"State {dep} cannot have the action {act} since a no-action distribution has already been assigned, using the no-action only.")
             return 
                     
-        if dep not in self.declared_states:
-            self.warnings.append(f"Undeclared state {dep} in transition with action {act}, declared automaticaly")
-            self.declared_states.append(dep)
-        if dep not in self.transactions.columns:
-            self.transactions[dep] = np.nan
+        if dep not in self.known_states:
+            self.warn(diagnostics.UNDECLARED_STATE, f"Undeclared state {dep} in transition with action {act}, declared automaticaly")
+            self.declareState(dep)
+        self.addColumn(dep)
         
-        if act not in self.declared_actions:
-            self.warnings.append(f"Undeclared action in transition: {dep} with action {act}, declared automaticaly")
+        if act not in self.known_actions:
+            self.warn(diagnostics.UNDECLARED_ACTION, f"Undeclared action in transition: {dep} with action {act}, declared automaticaly")
             self.declared_actions.append(act)
+            self.known_actions.add(act)
 
         for target in ids:
-            if target not in self.declared_states:
-                self.warnings.append(f"Undeclared state {target} targeted in transition: {dep} with action {act}, declared automaticaly")
-                self.declared_states.append(target)
-            if target not in self.transactions.columns:
-                self.transactions[target] = np.nan
-
-        weights = [int(str(x)) for x in ctx.INT()]
-        print("Transition from " + dep + " with action "+ act + " and targets " + str(ids) + " with weights " + str(weights))
+            if target not in self.known_states:
+                self.warn(diagnostics.UNDECLARED_STATE, f"Undeclared state {target} targeted in transition: {dep} with action {act}, declared automaticaly")
+                self.declareState(target)
+            self.addColumn(target)
+
+        if self.verbose:
+            print("Transition from " + dep + " with action "+ act + " and targets " + str(ids) + " with weights " + str(weights))
         self.states_with_actions.add(dep)
-        
-        new_trans_data = {id:weight for id, weight in zip(ids, weights)}
-        new_trans_data.update({'Origin' : dep, 'Action' : act})
-        
-        new_record = pd.DataFrame([new_trans_data])
-        self.transactions = pd.concat([self.transactions, new_record], ignore_index=True)
-        
-        desired_columns_order = ['Origin', 'Action'] + [col for col in self.transactions.columns if col not in ['Origin', 'Action']]
-        self.transactions = self.transactions[desired_columns_order]
+        self.addTransaction(dep, act, ids, weights)
 
        
-    def enterTransnoact(self, ctx):
-        if self.transactions is None:
-            self.createTransactions()
-            
-        ids = [str(x) for x in ctx.ID()]
-        dep = ids.pop(0)
+    def transNoAct(self, dep, ids, weights):
+        if self.transaction_columns is None:
+            self.initColumns()
 
-        if dep not in self.declared_states:
-            self.warnings.append(f"Undeclared state in transition: {dep}, declared automaticaly")
-            self.declared_states.append(dep)
+        if dep not in self.known_states:
+            self.warn(diagnostics.UNDECLARED_STATE, f"Undeclared state in transition: {dep}, declared automaticaly")
+            self.declareState(dep)
+        self.addColumn(dep)
         
-        if dep not in self.transactions.columns:
-            self.transactions[dep] = np.nan
-        
-        if dep in self.states_with_no_action_trans:
-            self.errors.append(f"State {dep} cannot have multiple no-action distributions, using only the first one.")
+        if dep in self.no_action_states:
+            self.error(diagnostics.MULTIPLE_NO_ACTION, f"State {dep} cannot have multiple no-action distributions, using only the first one.")
             return
         
         if dep in self.states_with_actions:
-            self.errors.append(f"State {dep} cannot have a no-action distribution since an action distribution has already been assigned, using action only.")
+            self.error(diagnostics.NO_ACTION_AFTER_ACTION, f"State {dep} cannot have a no-action distribution since an action distribution has already been assigned, using action only.")
             return 
         
         for target in ids:
-            if target not in self.declared_states:
-                self.warnings.append(f"Undeclared state {target} targeted in transition from {dep} with NA, declared automaticaly")
-                self.declared_states.append(target)
-            if target not in self.transactions.columns:
-                self.transactions[target] = np.nan
+            if target not in self.known_states:
+                self.warn(diagnostics.UNDECLARED_STATE, f"Undeclared state {target} targeted in transition from {dep} with NA, declared automaticaly")
+                self.declareState(target)
+            self.addColumn(target)
         
         self.states_with_no_action_trans.append(dep)
-        weights = [int(str(x)) for x in ctx.INT()]
-        print("Transition from " + dep + " with no action and targets " + str(ids) + " with weights " + str(weights))
+        self.no_action_states.add(dep)
+        if self.verbose:
+            print("Transition from " + dep + " with no action and targets " + str(ids) + " with weights " + str(weights))
+        self.addTransaction(dep, "NA", ids, weights)
 
-        new_trans_data = {id:weight for id, weight in zip(ids, weights)}
-        new_trans_data.update({'Origin' : dep, 'Action' : "NA"})
-        
-        new_record = pd.DataFrame([new_trans_data])
-        self.transactions = pd.concat([self.transactions, new_record], ignore_index=True)       
 
+BACKENDS = ("antlr", "native", "stream")
+PARSER_VERSION = "4" # Part of the cache key (mdp_cache.py), to change whenever the parsing results or the listener attributes change
+
+def _syntax_error_listener(messages):
+    """ANTLR error listener appending every syntax error to messages (the console listener still prints them)."""
+    from antlr4.error.ErrorListener import ErrorListener
 
-def run(path = "mdp_examples//Teste_grande_v1.mdp", return_printer = False, print_transactions = False, print_states = False):
+    class SyntaxErrors(ErrorListener):
+        def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+            messages.append(f"line {line}:{column} {msg}")
+
+    return SyntaxErrors()
+
+def parse(path, backend = "antlr", verbose = True, on_diagnostic = None):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, choose one of {BACKENDS}")
+    if backend == "native":
+        try:
+            return native_parser.parse_file(path, gramPrintListener(verbose, on_diagnostic))
+        except MdpSyntaxError: # ANTLR is the reference to report and recover from syntax errors
+            pass
+    if backend == "stream": # Files too big to hold in memory, syntax errors are raised
+        return native_parser.parse_stream(path, gramPrintListener(verbose, on_diagnostic))
+    from antlr4 import FileStream, CommonTokenStream, ParseTreeWalker
+    from gramLexer import gramLexer
+    from gramParser import gramParser
     #lexer = gramLexer(StdinStream())
+    printer = gramPrintListener(verbose, on_diagnostic)
+    syntax_errors = _syntax_error_listener(printer.syntax_errors)
     lexer = gramLexer(FileStream(path))
+    lexer.addErrorListener(syntax_errors)
     stream = CommonTokenStream(lexer)
     parser = gramParser(stream)
+    parser.addErrorListener(syntax_errors)
     tree = parser.program()
-    printer = gramPrintListener()
     walker = ParseTreeWalker()
     walker.walk(printer, tree)
+    printer.location = None # The context would keep the whole tree alive
+    return printer
+
+def load(path, backend = "antlr", cache = False, need_printer = True, verbose = True, on_diagnostic = None):
+    """
+    Parses a .mdp file (or, with cache=True, loads it from the cache) and compiles it, without printing the results.
+    Nothing at all is printed with verbose=False, the diagnostics are given to on_diagnostic as they are found
+    (all at once for a cached file).
+
+    Returns:
+    - tuple: (printer, model, warnings, errors). printer is None when need_printer is False and the file was cached,
+             its transactions dataframes are not built. warnings and errors are lists of diagnostics.Diagnostic.
+    """
+    cache = cache and mdp_cache.enabled()
+
+    if cache:
+        key = mdp_cache.file_key(path, PARSER_VERSION)
+        cached = mdp_cache.lookup(key)
+        if cached is not None:
+            model, meta = cached
+            found = [Diagnostic.from_dict(d) for d in meta['diagnostics']]
+            warnings = [d for d in found if d.severity == diagnostics.WARNING]
+            errors = [d for d in found if d.severity == diagnostics.ERROR]
+            if on_diagnostic is not None:
+                for d in found:
+                    on_diagnostic(d)
+            printer = None
+            if need_printer:
+                printer = mdp_cache.load_listener(key, gramPrintListener())
+                printer.model = model
+            return printer, model, warnings, errors
+
+    printer = parse(path, backend, verbose, on_diagnostic)
     
     MISSING_ID = "<missing ID>"
-    if printer.first_state == MISSING_ID:
-        print("No states declared, chosing a random state as first state")
+    missing_id = printer.first_state == MISSING_ID
+    if missing_id:
+        if verbose:
+            print("No states declared, chosing a random state as first state")
         printer.declared_states.remove(MISSING_ID)
         printer.first_state = random.choice(printer.declared_states)
     
-    printer.update_transactions_prob() 
     printer.update_rewards() 
+    model = printer.model = CompiledMDP.from_printer(printer)
+    # Not cached if the first state was drawn at random (it must be drawn again next time), nor if ANTLR
+    # recovered from syntax errors, which only the parse reports
+    if cache and not missing_id and not printer.syntax_errors:
+        mdp_cache.store(key, printer, model)
+    return printer, model, printer.warnings, printer.errors
+
+def run(path = "mdp_examples//Teste_grande_v1.mdp", return_printer = False, print_transactions = False, print_states = False, return_model = False, backend = "antlr", cache = False,
+        verbose = True, on_diagnostic = None):
+    need_printer = return_printer or print_transactions or print_states
+    printer, model, warnings, errors = load(path, backend, cache, need_printer, verbose, on_diagnostic)
+
+    if need_printer:
+        printer.createTransactions()
+        printer.update_transactions_prob() 
 
     if print_transactions:
         print("\n","------- transactions df -------")
@@ -195,14 +379,14 @@ def run(path = "mdp_examples//Teste_grande_v1.mdp", return_printer = False, prin
         print("\n","------- transactions_prob df -------")
         print(printer.transactions_prob.head(10), "\n",)
     
-    if printer.warnings: # If there are warnings in the list
+    if warnings and verbose: # If there are warnings in the list
         print("\n", '---------- WARNINGS WHEN PARSING -----------')
-        for i, warning in enumerate(printer.warnings):
+        for i, warning in enumerate(warnings):
             print(f"( {i} ) - {warning}")
 
-    if printer.errors: # If there are errors in the list
+    if errors and verbose: # If there are errors in the list
         print("\n", '---------- ERRORS WHEN PARSING -----------')
-        for i, error in enumerate(printer.errors):
+        for i, error in enumerate(errors):
             print(f"( {i} ) - {error}")
         print("\n", '---------- Continuing the code with suggested corrections -----------', "\n")
 
@@ -212,6 +396,10 @@ def run(path = "mdp_examples//Teste_grande_v1.mdp", return_printer = False, prin
         print(f"Declared states: {printer.declared_states}")
         print(f"Rewards: {printer.rewards}")
 
+    if return_printer and return_model:
+        return printer, model
+    if return_model:
+        return model
     if return_printer:
         return printer
 
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+from mdp_model import CompiledMDP
+
+'''
+On-disk cache of parsed .mdp files, used by run(..., cache=True) and by the command line (mdp_cli.py).
+
+Entries are keyed by the SHA-256 of the file content plus the parser version, so editing a file or
+changing the parser invalidates them. Each entry is a directory holding:
+- the CompiledMDP arrays as .npy files, loaded memory-mapped
+- names.json -> state/action names, first state, warnings and errors (as diagnostics)
+- listener.pickle -> the gramPrintListener attributes, only loaded when the printer is needed
+
+The cache directory is MDP_CACHE_DIR (default ~/.cache/tp_renforcement), and it is kept under
+MDP_CACHE_MAX_BYTES (default 2 GB) by evicting the least recently used entries.
+Setting MDP_CACHE=0 disables it even where it is asked for, like --no-cache.
+'''
+
+MODEL_ARRAYS = ('state_ptr', 'choice_action', 'choice_ptr', 'targets', 'probs', 'rewards', 'choice_row')
+DEFAULT_MAX_BYTES = 2 * 1024**3
+NOT_CACHED = ('transactions', 'transactions_prob', 'model', 'location', 'verbose', 'on_diagnostic') # Listener attributes rebuilt after loading, or set by the caller
+
+
+def enabled():
+    return os.environ.get('MDP_CACHE', '1') != '0'
+
+
+def cache_dir():
+    return os.environ.get('MDP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'tp_renforcement'))
+
+
+def max_bytes():
+    return int(os.environ.get('MDP_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+
+def file_key(path, version):
+    """SHA-256 of the file content and the parser version."""
+    h = hashlib.sha256(f"{version}\0".encode())
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _entry(key):
+    return os.path.join(cache_dir(), key)
+
+
+def lookup(key):
+    """
+    Returns the (model, meta) of a cached entry, or None if it isn't cached.
+
+    The model arrays are memory-mapped, meta holds the warnings and errors of the parse.
+    """
+    entry = _entry(key)
+    try:
+        with open(os.path.join(entry, 'names.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(entry, name + '.npy'), mmap_mode='r') for name in MODEL_ARRAYS}
+    except (OSError, ValueError): # Missing or partially evicted entry
+        return None
+    os.utime(os.path.join(entry, 'names.json')) # Marks the entry as recently used
+    model = CompiledMDP(meta['state_names'], meta['action_names'], arrays['state_ptr'], arrays['choice_action'],
+                        arrays['choice_ptr'], arrays['targets'], arrays['probs'], arrays['rewards'],
+                        meta['first_state'], arrays['choice_row'])
+    return model, meta
+
+
+def load_listener(key, printer):
+    """Restores the attributes of a gramPrintListener saved with store()."""
+    with open(os.path.join(_entry(key), 'listener.pickle'), 'rb') as f:
+        vars(printer).update(pickle.load(f))
+    return printer
+
+
+def store(key, printer, model):
+    """
+    Saves a parsed file. The entry is written in a temporary directory and renamed, so concurrent
+    readers never see a partial entry.
+    """
+    root = cache_dir()
+    os.makedirs(root, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=root, prefix='.tmp-')
+    try:
+        for name in MODEL_ARRAYS:
+            np.save(os.path.join(tmp, name + '.npy'), np.ascontiguousarray(getattr(model, name)))
+        with open(os.path.join(tmp, 'listener.pickle'), 'wb') as f:
+            pickle.dump({k: v for k, v in vars(printer).items() if k not in NOT_CACHED}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        meta = {'state_names': model.state_names, 'action_names': model.action_names, 'first_state': model.first_state,
+                'diagnostics': [d.to_dict() for d in printer.warnings + printer.errors]}
+        with open(os.path.join(tmp, 'names.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        try:
+            os.replace(tmp, _entry(key))
+        except OSError: # Another process stored the same entry meanwhile
+            shutil.rmtree(tmp, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    evict()
+
+
+def _size(entry):
+    return sum(e.stat().st_size for e in os.scandir(entry) if e.is_file())
+
+
+def evict(limit=None):
+    """Removes the least recently used entries until the cache is under the limit (in bytes)."""
+    limit = max_bytes() if limit is None else limit
+    root = cache_dir()
+    if not os.path.isdir(root):
+        return
+    entries = []
+    for e in os.scandir(root):
+        if e.is_dir() and not e.name.startswith('.'):
+            try:
+                entries.append((os.stat(os.path.join(e.path, 'names.json')).st_mtime, _size(e.path), e.path))
+            except OSError:
+                entries.append((0, _size(e.path), e.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def clear():
+    shutil.rmtree(cache_dir(), ignore_errors=True)
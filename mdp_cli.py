@@ -0,0 +1,293 @@
+import time
+_START = time.perf_counter()
+import argparse
+import json
+import sys
+
+'''
+Command line entry point, made to be called many times from shell pipelines.
+
+    python -m mdp_cli check FILE...                  # syntax, warnings and errors (alias: parse)
+    python -m mdp_cli simulate FILE --steps 20        # one random walk
+    python -m mdp_cli estimate FILE --target S1       # Monte Carlo reachability estimate (--workers N: parallel)
+    python -m mdp_cli estimate FILE --target S1 --epsilon 0.01 --bound wilson  # runs until the interval is narrow enough
+    python -m mdp_cli sprt FILE --target S1 --p0 0.1 --p1 0.2  # sequential test (SPRT)
+    python -m mdp_cli solve FILE --target S1          # reachability probabilities (sparse solver, max/min for MDPs)
+    python -m mdp_cli solve FILE --target S1 --method interval-iteration --epsilon 1e-6  # bounds within epsilon
+    python -m mdp_cli solve FILE --target S1 --topological  # component by component (--workers N: parallel)
+
+Every subcommand only imports what it needs: check, simulate, estimate and sprt never import pandas, scipy,
+tkinter or matplotlib (scipy only for estimate --importance and --bound clopper-pearson), and the ANTLR parser is only loaded for a file the native reader rejects.
+--timing prints the time spent importing and running to stderr.
+
+Exit status: 0 if fine, 1 if a file has syntax errors or errors (or warnings with --strict), 2 on bad usage.
+'''
+
+
+def _timing(args, imported, label):
+    if args.timing:
+        now = time.perf_counter()
+        print(f"[timing] {label}: startup {1000 * (imported - _START):.1f} ms, run {1000 * (now - imported):.1f} ms",
+              file=sys.stderr)
+
+
+def _load(path, args):
+    import mdp
+    return mdp.load(path, args.backend, not args.no_cache, need_printer=False, verbose=False)
+
+
+def _state(model, name):
+    if name not in model.state_index:
+        print(f"error: unknown state {name}", file=sys.stderr)
+        sys.exit(2) # Bad usage, like the errors of argparse
+    return model.state_index[name]
+
+
+def check(args):
+    import contextlib
+    import io
+    import mdp
+    imported = time.perf_counter()
+    status = 0
+    reports = []
+    for path in args.files:
+        try:
+            with contextlib.redirect_stderr(io.StringIO()): # ANTLR also prints the syntax errors it recovers from
+                printer, model, warnings, errors = mdp.load(path, args.backend, not args.no_cache, need_printer=False,
+                                                            verbose=False)
+        except mdp.MdpSyntaxError as e: # Only raised by the stream backend
+            reports.append({'path': path, 'status': 'error', 'syntax_errors': [str(e)], 'diagnostics': []})
+            status = 1
+            continue
+        except OSError as e:
+            reports.append({'path': path, 'status': 'error', 'syntax_errors': [], 'diagnostics': [], 'exception': str(e)})
+            status = 1
+            continue
+        syntax_errors = list(printer.syntax_errors) if printer is not None else [] # Files with some are never cached
+        failed = syntax_errors or errors or (args.strict and warnings)
+        status = 1 if failed else status
+        reports.append({'path': path, 'status': 'error' if failed else 'ok', 'states': model.n_states,
+                        'actions': len(model.action_names), 'choices': model.n_choices,
+                        'transitions': model.n_transitions, 'syntax_errors': syntax_errors,
+                        'diagnostics': [d.to_dict() for d in warnings + errors]})
+
+    if args.json:
+        json.dump(reports, sys.stdout, indent=1)
+        print()
+    elif not args.quiet:
+        for r in reports:
+            if 'exception' in r:
+                print(f"{r['path']}: error: {r['exception']}")
+            for e in r['syntax_errors']:
+                print(f"{r['path']}: syntax error: {e}")
+            for d in r['diagnostics']:
+                where = f"{d['line']}:{d['column']}:" if d['line'] is not None else ''
+                print(f"{r['path']}:{where} {d['severity']}: {d['message']} [{d['code']}]")
+            if 'states' in r:
+                print(f"{r['path']}: {r['status']} ({r['states']} states, {r['actions']} actions, "
+                      f"{r['choices']} choices, {r['transitions']} transitions)")
+    _timing(args, imported, 'check')
+    return status
+
+
+def simulate(args):
+    import numpy as np
+    import simulation
+    imported = time.perf_counter()
+    _, model, _, _ = _load(args.file, args)
+    rng = np.random.default_rng(args.seed)
+    if args.record is not None:
+        from trajectory import TrajectoryRecorder
+        recorder = TrajectoryRecorder(model.state_names, model.action_names, folder=args.record)
+        for _ in range(args.runs):
+            simulation.walk(model, args.steps, rng, recorder=recorder)
+        walks = recorder.close()
+        print(f"{int(walks.steps().sum())} steps of {len(walks)} walks recorded in {args.record}")
+        _timing(args, imported, 'simulate')
+        return 0
+    for _ in range(args.runs):
+        states, choices = simulation.walk(model, args.steps, rng)
+        path = [model.state_names[states[0]]]
+        for choice, state in zip(choices, states[1:]):
+            path.append(f"-[{model.action_name(choice)}]-> {model.state_names[state]}")
+        print(' '.join(path))
+    _timing(args, imported, 'simulate')
+    return 0
+
+
+def estimate(args):
+    import numpy as np
+    import simulation
+    imported = time.perf_counter()
+    _, model, _, _ = _load(args.file, args)
+    target = _state(model, args.target)
+    runs = args.runs
+    if args.bound is not None:
+        import smc
+        if args.epsilon is None:
+            print("error: --bound needs --epsilon", file=sys.stderr)
+            return 2
+        result = smc.adaptive_estimate(model, target, args.epsilon, args.delta, args.bound, args.steps, args.seed, args.workers,
+                                       on_checkpoint=lambda n, p, low, high: print(f"{n} runs: {p:.6g} [{low:.6g}, {high:.6g}]"))
+        print(f"Probability of reaching {args.target}: {result.estimate:.6g}, {args.bound} interval "
+              f"[{result.low:.6g}, {result.high:.6g}] at level {1 - args.delta:g} after {result.runs} simulations")
+        _timing(args, imported, 'estimate')
+        return 0
+    if args.epsilon is not None:
+        runs = simulation.chernoff_hoeffding_runs(args.epsilon, args.delta)
+    if args.importance:
+        import importance
+        result = importance.estimate(model, target, runs, args.steps, 'auto', np.random.default_rng(args.seed))
+        low, high = result.interval()
+        print(f"Importance sampling estimate of reaching {args.target}: {result.estimate:.6g} "
+              f"(95% interval [{low:.6g}, {high:.6g}], relative error {result.relative_error:.3g}, {runs} simulations)")
+        _timing(args, imported, 'estimate')
+        return 0
+    if args.workers is None:
+        p, found = simulation.estimate_reachability(model, target, runs, args.steps, np.random.default_rng(args.seed))
+    else:
+        import smc
+        result = smc.estimate_reachability(model, target, runs, args.steps, args.seed, args.workers)
+        p, found = result.estimate, result.hits
+    print(f"Target state {args.target} was found in {found} out of {runs} simulations. Probability of reaching it: {round(p, 4)}")
+    _timing(args, imported, 'estimate')
+    return 0
+
+
+def sprt(args):
+    import smc
+    imported = time.perf_counter()
+    _, model, _, _ = _load(args.file, args)
+    target = _state(model, args.target)
+    try:
+        result = smc.sprt(model, target, args.p0, args.p1, args.alpha, args.beta, args.steps, args.seed, args.workers, args.max_samples)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    print(result.message)
+    print(f"{result.samples} samples used ({result.simulated} simulated in {result.batches} batches), "
+          f"decided in {1000 * result.seconds:.1f} ms, log likelihood ratio {result.log_ratio:.4g}")
+    _timing(args, imported, 'sprt')
+    return 0
+
+
+def solve(args):
+    imported = time.perf_counter()
+    _, model, _, _ = _load(args.file, args)
+    target = _state(model, args.target)
+    if args.topological:
+        import topological
+        epsilon = topological.EPSILON if args.epsilon is None else args.epsilon
+        try:
+            solution = topological.solve_reachability(model, target, args.min, args.method, epsilon, workers=args.workers)
+        except ValueError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 2
+    elif model.is_markov_chain() and args.method not in ('value-iteration', 'policy-iteration', 'interval-iteration'):
+        import chain_solver
+        solution = chain_solver.solve_reachability(model, target, args.method)
+        if not solution.converged:
+            print(f"warning: {solution.method} stopped after {solution.iterations} iterations", file=sys.stderr)
+        if args.timing:
+            print(f"{solution.method}: {solution.iterations} iterations, residual {solution.residual:.3g}", file=sys.stderr)
+        states = range(model.n_states) if args.all else [model.first_state]
+        for s in states:
+            print(f"{model.state_names[s]} {solution.values[s]:.6g}")
+        _timing(args, imported, 'solve')
+        return 0
+    else:
+        import mdp_solver
+        method = 'policy-iteration' if args.method == 'auto' else args.method
+        if method not in mdp_solver.METHODS:
+            print(f"error: {args.method} only solves Markov chains, use one of {', '.join(mdp_solver.METHODS)}", file=sys.stderr)
+            return 2
+        epsilon = mdp_solver.EPSILON if args.epsilon is None else args.epsilon
+        solution = mdp_solver.solve_reachability(model, target, args.min, method, epsilon)
+    if not solution.converged:
+        print(f"warning: {solution.method} stopped after {solution.iterations} iterations", file=sys.stderr)
+    if args.timing:
+        gap = f", gap {solution.gap:.3g}" if solution.method == 'interval-iteration' else ""
+        print(f"{solution.method}: {solution.iterations} iterations{gap}", file=sys.stderr)
+    states = range(model.n_states) if args.all else [model.first_state]
+    for s in states:
+        action = f" {model.action_name(solution.scheduler[s])}" if args.scheduler and solution.scheduler[s] >= 0 else ""
+        print(f"{model.state_names[s]} {solution.values[s]:.6g}{action}")
+    _timing(args, imported, 'solve')
+    return 0
+
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--backend', default='native', choices=['antlr', 'native', 'stream'])
+    common.add_argument('--no-cache', action='store_true', help="don't use the parsed models cache")
+    common.add_argument('--timing', action='store_true', help="print the startup and run times to stderr")
+
+    parser = argparse.ArgumentParser(prog='python -m mdp_cli', description="Checks, simulates and analyses .mdp files.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('check', aliases=['parse'], parents=[common], help="report syntax errors, warnings and errors")
+    p.add_argument('files', nargs='+')
+    p.add_argument('--json', action='store_true', help="JSON report on stdout")
+    p.add_argument('--quiet', '-q', action='store_true', help="only the exit status")
+    p.add_argument('--strict', action='store_true', help="also fail on warnings")
+    p.set_defaults(function=check)
+
+    p = commands.add_parser('simulate', parents=[common], help="random walks from the first state")
+    p.add_argument('file')
+    p.add_argument('--steps', type=int, default=20)
+    p.add_argument('--runs', type=int, default=1)
+    p.add_argument('--seed', type=int, default=None)
+    p.add_argument('--record', metavar='FOLDER', default=None, help="write the walks to .npy columns in FOLDER instead of printing them")
+    p.set_defaults(function=simulate)
+
+    p = commands.add_parser('estimate', parents=[common], help="Monte Carlo estimate of the probability of reaching a state")
+    p.add_argument('file')
+    p.add_argument('--target', required=True)
+    p.add_argument('--steps', type=int, default=20, help="maximum transitions per simulation")
+    p.add_argument('--runs', type=int, default=1000)
+    p.add_argument('--epsilon', type=float, default=None, help="precision, the number of runs is then given by Chernoff-Hoeffding")
+    p.add_argument('--delta', type=float, default=0.05, help="error probability, with --epsilon")
+    p.add_argument('--seed', type=int, default=None)
+    p.add_argument('--workers', type=int, default=None, help="simulate on this many processes (same result for a given seed)")
+    p.add_argument('--importance', action='store_true', help="importance sampling towards the target, for rare events")
+    p.add_argument('--bound', choices=['hoeffding', 'clopper-pearson', 'wilson'], default=None,
+                   help="with --epsilon, simulate until this confidence interval is within epsilon of the estimate")
+    p.set_defaults(function=estimate)
+
+    p = commands.add_parser('sprt', parents=[common], help="sequential test of the probability of reaching a state")
+    p.add_argument('file')
+    p.add_argument('--target', required=True)
+    p.add_argument('--p0', type=float, required=True, help="H0: the probability is at most p0")
+    p.add_argument('--p1', type=float, required=True, help="H1: the probability is at least p1")
+    p.add_argument('--alpha', type=float, default=0.05)
+    p.add_argument('--beta', type=float, default=0.05)
+    p.add_argument('--steps', type=int, default=20, help="maximum transitions per simulation")
+    p.add_argument('--max-samples', type=int, default=None)
+    p.add_argument('--seed', type=int, default=None)
+    p.add_argument('--workers', type=int, default=None)
+    p.set_defaults(function=sprt)
+
+    p = commands.add_parser('solve', parents=[common], help="exact probability of reaching a state")
+    p.add_argument('file')
+    p.add_argument('--target', required=True)
+    p.add_argument('--all', action='store_true', help="print every state, not only the first one")
+    p.add_argument('--method', default='auto',
+                   choices=['auto', 'direct', 'jacobi', 'gauss-seidel', 'bicgstab', 'value-iteration', 'policy-iteration',
+                            'interval-iteration'],
+                   help="solver: direct, jacobi, gauss-seidel or bicgstab for a Markov chain, value-iteration, "
+                        "gauss-seidel, policy-iteration or interval-iteration for an MDP")
+    p.add_argument('--epsilon', type=float, default=None,
+                   help="MDP iterations stop below this change (interval-iteration: gap between the bounds)")
+    p.add_argument('--topological', action='store_true',
+                   help="solve the strongly connected components one level at a time (value-iteration by default for an MDP)")
+    p.add_argument('--workers', type=int, default=1, help="with --topological, processes solving the large levels")
+    p.add_argument('--min', action='store_true', help="minimal probabilities of an MDP (maximal by default)")
+    p.add_argument('--scheduler', action='store_true', help="print the action of an optimal scheduler after every value")
+    p.set_defaults(function=solve)
+
+    args = parser.parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,301 @@
+import argparse
+import numpy as np
+from mdp_model import CompiledMDP, NO_ACTION
+
+'''
+Synthetic MDPs and Markov chains for scale testing, reproducible from a seed.
+
+Every family returns a GeneratedMDP, which can be written as a .mdp file in the gram.g4 format
+(write) or compiled directly (to_compiled) without going through a parser. Families:
+- random_mdp -> random sparse MDP (or MC) with a controlled branching factor
+- grid_world -> slippery grid with a goal and absorbing traps
+- chain -> chain of states drifting towards an absorbing target, with an absorbing failure state
+- craps -> the dice game of mdp_examples/craps.mdp, played with dice of any number of faces
+- coin_die -> a fair die of any number of sides simulated by coin flips, like prof_examples/simu-mc.mdp
+
+Usage:
+    python mdp_generator.py random 1000000 --seed 1 -o random_1M.mdp
+'''
+
+
+class GeneratedMDP:
+    """
+    Weighted transitions in CSR form, like CompiledMDP but keeping the integer weights of the file.
+
+    Choices must be grouped by state (choice_state sorted). Repeated (choice, target) pairs are merged
+    by summing their weights, since a .mdp file keeps only the last weight of a repeated target.
+    """
+
+    def __init__(self, state_names, action_names, choice_state, choice_action, choice_ptr, targets, weights,
+                 rewards=None, goal=None):
+        self.state_names = list(state_names)
+        self.action_names = list(action_names)
+        self.choice_state = np.asarray(choice_state, dtype=np.int64)
+        self.choice_action = np.asarray(choice_action, dtype=np.int32)
+        self.rewards = None if rewards is None else np.asarray(rewards, dtype=np.int64)
+        self.goal = goal # Index of the state to reach, for the analyses
+        self.choice_ptr, self.targets, self.weights = _merge_duplicates(np.asarray(choice_ptr, dtype=np.int64),
+                                                                      np.asarray(targets, dtype=np.int64),
+                                                                      np.asarray(weights, dtype=np.int64))
+
+    @property
+    def n_states(self):
+        return len(self.state_names)
+
+    @property
+    def n_choices(self):
+        return len(self.choice_state)
+
+    @property
+    def n_transitions(self):
+        return len(self.targets)
+
+    def to_compiled(self):
+        """Returns the CompiledMDP run() would give for the written file."""
+        state_ptr = np.zeros(self.n_states + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.choice_state, minlength=self.n_states), out=state_ptr[1:])
+        entry_choice = np.repeat(np.arange(self.n_choices), np.diff(self.choice_ptr))
+        totals = np.add.reduceat(self.weights, self.choice_ptr[:-1]) if self.n_transitions else np.zeros(0)
+        probs = self.weights / totals[entry_choice]
+        rewards = np.zeros(self.n_states) if self.rewards is None else self.rewards
+        return CompiledMDP(self.state_names, self.action_names, state_ptr, self.choice_action, self.choice_ptr,
+                           self.targets, probs, rewards, 0)
+
+    def lines(self, block=100000):
+        """Yields the .mdp file content, block of choices by block of choices."""
+        states = np.array(self.state_names, dtype=object)
+        actions = np.array(self.action_names, dtype=object)
+        yield "States " + ", ".join(self.state_names) + ";\n" # The first declared state is the initial state
+        if self.rewards is not None:
+            yield "Rewards " + ", ".join(f"{s}:{r}" for s, r in zip(self.state_names, self.rewards)) + ";\n"
+        yield "Actions " + ", ".join(self.action_names) + ";\n"
+        for start in range(0, self.n_choices, block):
+            end = min(start + block, self.n_choices)
+            ptr = self.choice_ptr[start:end + 1]
+            pairs = (self.weights[ptr[0]:ptr[-1]].astype(str).astype(object) + ":" + states[self.targets[ptr[0]:ptr[-1]]]).tolist()
+            bounds = (ptr - ptr[0]).tolist()
+            out = []
+            for i, c in enumerate(range(start, end)):
+                head = states[self.choice_state[c]]
+                if self.choice_action[c] != NO_ACTION:
+                    head += f"[{actions[self.choice_action[c]]}]"
+                out.append(f"{head} -> {' + '.join(pairs[bounds[i]:bounds[i + 1]])};\n")
+            yield "".join(out)
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for text in self.lines():
+                f.write(text)
+        return path
+
+    def __repr__(self):
+        return f"GeneratedMDP(states={self.n_states}, choices={self.n_choices}, transitions={self.n_transitions})"
+
+
+def _merge_duplicates(choice_ptr, targets, weights):
+    entry_choice = np.repeat(np.arange(len(choice_ptr) - 1), np.diff(choice_ptr))
+    key = entry_choice * (targets.max(initial=0) + 1) + targets
+    if len(key) < 2 or np.all(np.diff(key) > 0) or len(np.unique(key)) == len(key):
+        return choice_ptr, targets, weights
+    # Keeps the first position of every pair, in file order
+    unique, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    merged = np.zeros(len(unique), dtype=np.int64)
+    np.add.at(merged, rank[inverse], weights)
+    kept = np.sort(first)
+    new_ptr = np.zeros_like(choice_ptr)
+    np.cumsum(np.bincount(entry_choice[kept], minlength=len(choice_ptr) - 1), out=new_ptr[1:])
+    return new_ptr, targets[kept], merged
+
+
+def _single_choices(n_states, entries_per_state):
+    """choice_state and choice_ptr of a model where every state has one choice with the given out-degrees."""
+    choice_ptr = np.zeros(n_states + 1, dtype=np.int64)
+    np.cumsum(entries_per_state, out=choice_ptr[1:])
+    return np.arange(n_states), choice_ptr
+
+
+def random_mdp(n_states, n_actions=2, branching=3, seed=0, markov_chain=False, max_weight=9, rewards=False):
+    """
+    Random sparse MDP: every state enables a random non empty subset of the actions (a single no-action
+    distribution if markov_chain), and every choice leads to `branching` distinct random states.
+
+    Parameters:
+    - n_states (int): Number of states.
+    - n_actions (int): Number of declared actions.
+    - branching (int): Successors of every choice (at most n_states).
+    - seed (int): Seed of the generator, the same seed always gives the same model.
+    - markov_chain (bool): Generate a Markov chain (only no-action distributions).
+    - max_weight (int): Weights are drawn uniformly in 1..max_weight.
+    - rewards (bool): Also draw a reward in 0..9 for every state.
+    """
+    rng = np.random.default_rng(seed)
+    branching = min(branching, n_states)
+    if markov_chain:
+        choice_state = np.arange(n_states)
+        choice_action = np.full(n_states, NO_ACTION)
+    else:
+        enabled = rng.random((n_states, n_actions)) < 0.5
+        enabled[np.arange(n_states), rng.integers(0, n_actions, n_states)] = True
+        choice_state, choice_action = np.nonzero(enabled)
+    n_choices = len(choice_state)
+
+    # Distinct targets: a random start and strictly positive gaps whose sum stays below n_states
+    max_gap = max(1, n_states // branching)
+    gaps = rng.integers(1, max_gap + 1, (n_choices, branching))
+    gaps[:, 0] = 0
+    targets = (rng.integers(0, n_states, (n_choices, 1)) + np.cumsum(gaps, axis=1)) % n_states
+    weights = rng.integers(1, max_weight + 1, (n_choices, branching))
+    choice_ptr = np.arange(n_choices + 1, dtype=np.int64) * branching
+
+    return GeneratedMDP([f"S{i}" for i in range(n_states)], [f"a{i}" for i in range(n_actions)], choice_state,
+                        choice_action, choice_ptr, targets.ravel(), weights.ravel(),
+                        rng.integers(0, 10, n_states) if rewards else None, goal=n_states - 1)
+
+
+def grid_world(width, height, n_traps=0, seed=0, move_weight=8, slip_weight=1):
+    """
+    Slippery grid world. From every cell, the actions N, S, E and W move in their direction with weight
+    move_weight and to each perpendicular direction with weight slip_weight, moves into a wall stay in place.
+    The goal (the corner opposite to the start) and the traps are absorbing. Every move costs a reward of 1.
+    """
+    rng = np.random.default_rng(seed)
+    n_states = width * height
+    goal = n_states - 1 # The start is C0_0, the first state
+    traps = np.zeros(n_states, dtype=bool)
+    if n_traps:
+        candidates = np.arange(1, n_states - 1)
+        traps[rng.choice(candidates, min(n_traps, len(candidates)), replace=False)] = True
+    absorbing = traps.copy()
+    absorbing[goal] = True
+
+    x, y = np.arange(n_states) % width, np.arange(n_states) // width
+    moves = {'N': (0, -1), 'S': (0, 1), 'E': (1, 0), 'W': (-1, 0)}
+    perpendicular = {'N': 'EW', 'S': 'EW', 'E': 'NS', 'W': 'NS'}
+
+    def destination(direction):
+        dx, dy = moves[direction]
+        nx, ny = np.clip(x + dx, 0, width - 1), np.clip(y + dy, 0, height - 1)
+        return ny * width + nx
+
+    active = np.nonzero(~absorbing)[0]
+    blocks = [] # (choice_state, choice_action, targets of 3 successors, weights of 3 successors)
+    for a, direction in enumerate('NSEW'):
+        side1, side2 = perpendicular[direction]
+        t = np.stack([destination(direction)[active], destination(side1)[active], destination(side2)[active]], axis=1)
+        blocks.append((active, np.full(len(active), a), t, np.tile([move_weight, slip_weight, slip_weight], (len(active), 1))))
+    sinks = np.nonzero(absorbing)[0]
+    blocks.append((sinks, np.full(len(sinks), NO_ACTION), np.stack([sinks, sinks, sinks], axis=1), np.tile([1, 0, 0], (len(sinks), 1))))
+
+    choice_state = np.concatenate([b[0] for b in blocks])
+    order = np.argsort(choice_state, kind='stable')
+    targets = np.concatenate([b[2] for b in blocks])[order]
+    weights = np.concatenate([b[3] for b in blocks])[order]
+    keep = weights > 0
+    counts = keep.sum(axis=1)
+    choice_ptr = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(counts, out=choice_ptr[1:])
+    rewards = np.where(absorbing, 0, 1)
+    return GeneratedMDP([f"C{i % width}_{i // width}" for i in range(n_states)], list('NSEW'), choice_state[order],
+                        np.concatenate([b[1] for b in blocks])[order], choice_ptr, targets[keep], weights[keep],
+                        rewards, goal=goal)
+
+
+def chain(n_states, forward=3, backward=1, stay=1, fail=0):
+    """
+    Markov chain S0 -> S1 -> ... drifting towards the absorbing target T (the last state).
+    Every state moves forward, backward and stays with the given weights, and falls into the absorbing
+    state F with weight fail (F is only added when fail > 0).
+    """
+    n = n_states - (2 if fail else 1) # Transient states
+    i = np.arange(n)
+    target, failure = n, n + 1
+    targets = np.stack([np.where(i + 1 < n, i + 1, target), np.maximum(i - 1, 0), i, np.full(n, failure)], axis=1)
+    weights = np.tile([forward, backward, stay, fail], (n, 1))
+    weights[0, 1] = 0 # S0 cannot go back, it stays instead
+    weights[0, 2] += backward
+    sinks = [target] + ([failure] if fail else [])
+    targets = np.concatenate([targets, np.array([[s, s, s, s] for s in sinks])])
+    weights = np.concatenate([weights, np.array([[1, 0, 0, 0] for _ in sinks])])
+    keep = weights > 0
+    choice_state, choice_ptr = _single_choices(len(targets), keep.sum(axis=1))
+    names = [f"S{k}" for k in range(n)] + ['T'] + (['F'] if fail else [])
+    return GeneratedMDP(names, ['a'], choice_state, np.full(len(names), NO_ACTION), choice_ptr,
+                        targets[keep], weights[keep], goal=target)
+
+
+def craps(faces=6):
+    """
+    The craps game of mdp_examples/craps.mdp with two dice of `faces` faces: the first roll wins on f+1 and
+    2f-1 (7 and 11), loses on 2, 3 and 2f (12), and otherwise sets a point. Symmetric points (4 and 10, 5 and 9, ...)
+    share a state, which wins when the point is rolled again and loses on f+1.
+    """
+    if faces < 3:
+        raise ValueError("craps needs dice with at least 3 faces")
+    counts = {s: faces - abs(s - faces - 1) for s in range(2, 2 * faces + 1)} # Ways to roll each sum
+    seven, eleven = faces + 1, 2 * faces - 1
+    losing = {2, 3, 2 * faces}
+    points = [s for s in range(4, faces + 1) if s not in losing and s != eleven] # Smallest point of each pair
+    point_name = {s: f"P{s}_{2 * faces + 2 - s}" for s in points}
+    names = ['I'] + [point_name[s] for s in points] + ['G', 'L']
+    index = {n: k for k, n in enumerate(names)}
+
+    rows = [[(sum(counts[s] for s in losing), 'L')]
+            + [(counts[s] + counts[2 * faces + 2 - s], point_name[s]) for s in points]
+            + [(counts[seven] + counts[eleven], 'G')]]
+    for s in points:
+        rows.append([(counts[seven], 'L'), (faces * faces - counts[seven] - counts[s], point_name[s]), (counts[s], 'G')])
+    rows += [[(1, 'G')], [(1, 'L')]]
+
+    choice_state, choice_ptr = _single_choices(len(rows), [len(r) for r in rows])
+    return GeneratedMDP(names, ['roll'], choice_state, np.full(len(rows), NO_ACTION), choice_ptr,
+                        [index[t] for r in rows for _, t in r], [w for r in rows for w, _ in r], goal=index['G'])
+
+
+def coin_die(sides=6):
+    """
+    Fair die of `sides` sides simulated with a fair coin, as in prof_examples/simu-mc.mdp: the coin flips walk
+    down a binary tree whose leaves are the outcomes S1..S<sides> (absorbing), the extra leaves go back to I.
+    """
+    depth = max(1, int(np.ceil(np.log2(sides))))
+    n_internal = 2 ** depth - 1 # Node k has children 2k+1 and 2k+2, node 0 is I
+    leaves = np.arange(2 ** depth)
+    leaf_state = np.where(leaves < sides, n_internal + leaves, 0) # Outcome state, or back to I
+    children = np.stack([2 * np.arange(n_internal) + 1, 2 * np.arange(n_internal) + 2], axis=1)
+    is_leaf = children >= n_internal
+    targets = np.where(is_leaf, leaf_state[np.clip(children - n_internal, 0, None)], children)
+    targets = np.concatenate([targets, np.stack([n_internal + np.arange(sides)] * 2, axis=1)])
+    weights = np.concatenate([np.ones((n_internal, 2), dtype=np.int64), np.tile([1, 0], (sides, 1))])
+    keep = weights > 0
+    names = ['I'] + [f"T{k}" for k in range(1, n_internal)] + [f"S{k}" for k in range(1, sides + 1)]
+    choice_state, choice_ptr = _single_choices(len(names), keep.sum(axis=1))
+    return GeneratedMDP(names, ['a'], choice_state, np.full(len(names), NO_ACTION), choice_ptr,
+                        targets[keep], weights[keep], goal=n_internal)
+
+
+FAMILIES = {
+    'random': lambda size, seed: random_mdp(size, seed=seed),
+    'random_mc': lambda size, seed: random_mdp(size, seed=seed, markov_chain=True),
+    'grid': lambda size, seed: grid_world(int(np.ceil(np.sqrt(size))), int(np.ceil(np.sqrt(size))), n_traps=size // 20, seed=seed),
+    'chain': lambda size, seed: chain(size, fail=1),
+    'craps': lambda size, seed: craps(size),
+    'coin_die': lambda size, seed: coin_die(size),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Writes a synthetic .mdp file.")
+    parser.add_argument('family', choices=sorted(FAMILIES))
+    parser.add_argument('size', type=int, help="number of states (faces for craps, sides for coin_die)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', required=True)
+    args = parser.parse_args(argv)
+    model = FAMILIES[args.family](args.size, args.seed)
+    model.write(args.output)
+    print(f"{args.output}: {model}")
+
+
+if __name__ == '__main__':
+    main()
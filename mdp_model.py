@@ -0,0 +1,251 @@
+import numpy as np
+
+'''
+Compiled representation of a parsed .mdp file.
+
+States and actions are interned to integers (their position in declared_states / declared_actions),
+and the transitions are stored in CSR form:
+- state_ptr -> choices of state s are the indices state_ptr[s] to state_ptr[s+1]
+- choice_action -> action of each choice, NO_ACTION for a no-action distribution
+- choice_ptr -> successors of choice c are targets[choice_ptr[c]:choice_ptr[c+1]]
+- targets, probs -> target state index and probability of every successor
+
+So every lookup costs O(out-degree) and never goes through pandas.
+'''
+
+NO_ACTION = -1
+
+
+class AliasTable:
+    """
+    Walker/Vose alias tables of every row of a sparse distribution (choices of a CompiledMDP, or rows of
+    transactions_prob), stored in flat arrays aligned with the entries:
+    - row_ptr -> entries of row r are row_ptr[r] to row_ptr[r+1]
+    - targets -> target of every entry
+    - probs -> probability of every entry, normalized inside its row
+    - cutoff, alias -> entry e is kept if a uniform draw is below cutoff[e], otherwise entry alias[e] is taken
+
+    Sampling a row costs O(1) whatever its number of successors: one uniform picks an entry of the row,
+    a second one decides between the entry and its alias.
+    """
+
+    def __init__(self, row_ptr, targets, probs):
+        self.row_ptr = np.asarray(row_ptr, dtype=np.int64)
+        self.targets = np.asarray(targets)
+        entry_row = np.repeat(np.arange(len(self.row_ptr) - 1), np.diff(self.row_ptr))
+        probs = np.asarray(probs, dtype=np.float64)
+        totals = np.bincount(entry_row, weights=probs, minlength=len(self.row_ptr) - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.probs = np.nan_to_num(probs / totals[entry_row])
+        self.cutoff, self.alias = self._build(self.row_ptr, entry_row, self.probs)
+
+    @staticmethod
+    def _build(row_ptr, entry_row, probs):
+        # Vose's method run on all the rows at once: every round pairs one small entry (scaled probability
+        # below 1) with one large entry of each row, so there are at most as many rounds as entries in a row.
+        n_entries = len(probs)
+        scaled = probs * np.diff(row_ptr)[entry_row]
+        cutoff = np.ones(n_entries)
+        alias = np.arange(n_entries)
+        pending = np.arange(n_entries)
+        while len(pending):
+            small = scaled[pending] < 1
+            small_entries, large_entries = pending[small], pending[~small]
+            small_rows, first_small = np.unique(entry_row[small_entries], return_index=True)
+            large_rows, first_large = np.unique(entry_row[large_entries], return_index=True)
+            _, in_small, in_large = np.intersect1d(small_rows, large_rows, assume_unique=True, return_indices=True)
+            s = small_entries[first_small[in_small]]
+            l = large_entries[first_large[in_large]]
+            cutoff[s] = scaled[s]
+            alias[s] = l
+            scaled[l] -= 1 - scaled[s]
+            # Rows left with only small or only large entries are done: their entries keep cutoff 1
+            paired_rows = np.zeros(len(row_ptr) - 1, dtype=bool)
+            paired_rows[small_rows[in_small]] = True
+            done = np.zeros(n_entries, dtype=bool)
+            done[s] = True
+            pending = pending[~done[pending] & paired_rows[entry_row[pending]]]
+        return cutoff, alias
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Table of every row of a probabilities dataframe (only the target columns), targets being column positions."""
+        probs = np.nan_to_num(df.to_numpy(dtype=float))
+        rows, cols = np.nonzero(probs > 0)
+        row_ptr = np.zeros(len(probs) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(probs)), out=row_ptr[1:])
+        return cls(row_ptr, cols, probs[rows, cols])
+
+    def size(self, row):
+        return self.row_ptr[row + 1] - self.row_ptr[row]
+
+    def sample(self, rows, rng):
+        """Draws one entry of every row. Returns the entry indices, -1 for the rows without entries."""
+        start = self.row_ptr[rows]
+        degree = self.row_ptr[rows + 1] - start
+        entry = start + (rng.random(len(start)) * degree).astype(np.int64)
+        keep = rng.random(len(start))
+        empty = degree == 0
+        if empty.all():
+            return np.full(len(start), -1, dtype=np.int64)
+        entry[empty] = 0 # Any entry of the table, the draw is replaced by -1
+        return np.where(empty, -1, np.where(keep < self.cutoff[entry], entry, self.alias[entry]))
+
+    def sample_one(self, row, rng=np.random):
+        """
+        Draws one entry of a row, rng being a numpy Generator or the np.random module. Returns the entry index,
+        -1 if the row has no entries.
+        """
+        start, end = self.row_ptr[row], self.row_ptr[row + 1]
+        if start == end:
+            return -1
+        entry = start + int(rng.random() * (end - start))
+        return entry if rng.random() < self.cutoff[entry] else int(self.alias[entry])
+
+
+def dataframe_rows(df):
+    """
+    Index of a transactions_prob dataframe: {(origin, action): row position} (first row of each pair) and
+    {origin: [actions]} in row order.
+    """
+    rows, actions = {}, {}
+    for i, (origin, action) in enumerate(zip(df['Origin'], df['Action'])):
+        if (origin, action) not in rows:
+            rows[(origin, action)] = i
+            actions.setdefault(origin, []).append(action)
+    return rows, actions
+
+
+class CompiledMDP:
+
+    def __init__(self, state_names, action_names, state_ptr, choice_action, choice_ptr, targets, probs,
+                 rewards=None, first_state=0, choice_row=None):
+        self.state_names = list(state_names)
+        self.action_names = list(action_names)
+        self.state_index = {s:i for i, s in enumerate(self.state_names)}
+        self.action_index = {a:i for i, a in enumerate(self.action_names)}
+        self.state_ptr = np.asarray(state_ptr, dtype=np.int64)
+        self.choice_action = np.asarray(choice_action, dtype=np.int32)
+        self.choice_ptr = np.asarray(choice_ptr, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int32)
+        self.probs = np.asarray(probs, dtype=np.float64)
+        self.rewards = np.zeros(self.n_states) if rewards is None else np.asarray(rewards, dtype=np.float64)
+        self.first_state = int(first_state)
+        # Row of transactions_prob each choice comes from
+        self.choice_row = np.arange(self.n_choices) if choice_row is None else np.asarray(choice_row, dtype=np.int64)
+
+    @property
+    def n_states(self):
+        return len(self.state_ptr) - 1
+
+    @property
+    def n_choices(self):
+        return len(self.choice_ptr) - 1
+
+    @property
+    def n_transitions(self):
+        return len(self.targets)
+
+    @property
+    def choice_state(self):
+        """Origin state of every choice."""
+        return np.repeat(np.arange(self.n_states, dtype=np.int32), np.diff(self.state_ptr))
+
+    @property
+    def transition_choice(self):
+        """Choice every (target, prob) entry belongs to."""
+        return np.repeat(np.arange(self.n_choices, dtype=np.int64), np.diff(self.choice_ptr))
+
+    def is_markov_chain(self):
+        """True if no state has more than one choice."""
+        return bool(np.all(np.diff(self.state_ptr) <= 1))
+
+    def choices(self, state):
+        return range(self.state_ptr[state], self.state_ptr[state + 1])
+
+    def successors(self, choice):
+        """Returns the target indices and probabilities of a choice."""
+        start, end = self.choice_ptr[choice], self.choice_ptr[choice + 1]
+        return self.targets[start:end], self.probs[start:end]
+
+    def alias_table(self):
+        """AliasTable of the choices, built on first use and kept with the model."""
+        if getattr(self, '_alias_table', None) is None:
+            self._alias_table = AliasTable(self.choice_ptr, self.targets, self.probs)
+        return self._alias_table
+
+    def reverse_index(self):
+        """
+        Predecessors of every state, built on first use and kept with the model: (ptr, choices), the choices
+        with a positive probability of reaching state t being choices[ptr[t]:ptr[t+1]] (one per entry).
+        """
+        if getattr(self, '_reverse_index', None) is None:
+            entries = np.flatnonzero(self.probs > 0)
+            targets = self.targets[entries]
+            order = np.argsort(targets, kind='stable')
+            ptr = np.zeros(self.n_states + 1, dtype=np.int64)
+            np.cumsum(np.bincount(targets, minlength=self.n_states), out=ptr[1:])
+            self._reverse_index = ptr, self.transition_choice[entries[order]]
+        return self._reverse_index
+
+    def action_name(self, choice):
+        action = self.choice_action[choice]
+        return "NA" if action == NO_ACTION else self.action_names[action]
+
+    def find_choice(self, state, action):
+        """
+        Returns the choice of a state for an action name ("NA" for no action), or None if it isn't defined.
+        """
+        action = NO_ACTION if action == "NA" else self.action_index.get(action)
+        for c in self.choices(state):
+            if self.choice_action[c] == action:
+                return c
+        return None
+
+    @classmethod
+    def from_printer(cls, printer):
+        """
+        Compiles the transitions collected by a gramPrintListener after run().
+
+        The probabilities are the same as printer.transactions_prob, zero weights are dropped.
+        """
+        state_names = list(printer.declared_states)
+        action_names = list(printer.declared_actions)
+        state_index = {s:i for i, s in enumerate(state_names)}
+        action_index = {a:i for i, a in enumerate(action_names)}
+        n_states, n_rows = len(state_names), len(printer.trans_origins)
+
+        columns = printer.transaction_columns or []
+        column_state = np.array([state_index.get(c, -1) for c in columns], dtype=np.int64)
+        row_action_id = np.array([NO_ACTION if a == "NA" else action_index[a] for a in printer.trans_action_names], dtype=np.int32)
+        row_origin = column_state[np.asarray(printer.trans_origins, dtype=np.int64)]
+        row_action = row_action_id[np.asarray(printer.trans_actions, dtype=np.int64)]
+        rows = np.asarray(printer.trans_rows, dtype=np.int64)
+        weights = np.asarray(printer.trans_weights, dtype=np.float64)
+        targets = column_state[np.asarray(printer.trans_cols, dtype=np.int64)]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            probs = weights / np.bincount(rows, weights=weights, minlength=n_rows)[rows]
+
+        # Choices are grouped by origin state, keeping the file order inside each state
+        choice_row = np.argsort(row_origin, kind='stable')
+        row_choice = np.empty(n_rows, dtype=np.int64)
+        row_choice[choice_row] = np.arange(n_rows)
+
+        keep = (weights > 0) & (targets >= 0)
+        entry_choice = row_choice[rows[keep]]
+        order = np.argsort(entry_choice, kind='stable')
+
+        state_ptr = np.zeros(n_states + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_origin, minlength=n_states), out=state_ptr[1:])
+        choice_ptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(entry_choice, minlength=n_rows), out=choice_ptr[1:])
+
+        rewards = np.array([printer.rewards.get(s, 0) for s in state_names], dtype=np.float64)
+        first_state = state_index.get(printer.first_state, 0)
+
+        return cls(state_names, action_names, state_ptr, row_action[choice_row], choice_ptr,
+                   targets[keep][order], probs[keep][order], rewards, first_state, choice_row)
+
+    def __repr__(self):
+        return f"CompiledMDP(states={self.n_states}, choices={self.n_choices}, transitions={self.n_transitions})"
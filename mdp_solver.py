@@ -0,0 +1,261 @@
+import time
+import numpy as np
+from adversary import MemorylessDeterministic, gather_rows
+from precomputation import backward_distances, end_components, partition, target_mask
+
+'''
+Maximal and minimal reachability probabilities of a CompiledMDP, with an optimal scheduler, instead of the
+dense linprog of solve_system (model_checking.py, raport_final.ipynb).
+
+The S_sure and S_never states come from the graph (precomputation.py), the other values from Bellman
+backups x(s) = max (or min) over the choices c of s of sum p(c -> t) x(t), computed for all the choices at
+once over the CSR arrays of the model. Methods:
+- value-iteration -> every state backed up from the previous values, until no value moves by more than epsilon
+- gauss-seidel -> the states backed up block after block, the blocks ordered by distance to the target so
+                  that a sweep carries the new values back from the target (GS_BLOCKS blocks at most)
+- policy-iteration -> the Markov chain of the current scheduler solved (evaluation.solve_chain, with the
+                      solver chain_solver picks for its size), then every state switches to a choice that is
+                      strictly better, until none is
+- interval-iteration -> value iteration from below (0) and from above (1) at once, until the two bounds are
+                        within epsilon everywhere: the values are then certified, unlike the stopping rule of
+                        value iteration, which can stop far from them on models with cycles. For the maximum
+                        the upper bound can't go down inside an end component of S_may (a scheduler may stay
+                        there), so after each backup it is capped, in every maximal end component, by the
+                        best choice leaving it. Every end component of S_may leaves it for the minimum (a
+                        scheduler staying in one forever has Pmin = 0, so its states are in S_never).
+
+The scheduler is one choice index per state (-1 for the states without choices), as in adversary.py. For
+the maximum, ties between optimal choices are broken towards the target (a choice with a successor closer
+to it through optimal choices), otherwise a scheduler could stay forever among states of value 1.
+
+    solution = solve_reachability(model, target, minimize=False)
+    solution.values[model.first_state], solution.actions(model)
+'''
+
+METHODS = ('value-iteration', 'gauss-seidel', 'policy-iteration', 'interval-iteration')
+EPSILON = 1e-8
+MAX_ITERATIONS = 100000
+GS_BLOCKS = 64 # Blocks of a Gauss-Seidel sweep
+TIE = 1e-12 # Choices within TIE of the best value are optimal
+
+
+class MDPSolution:
+    """
+    Result of solve_reachability:
+    - values -> maximal (or minimal) probability of reaching the target from every state
+    - scheduler -> choice index taken in every state (-1 where there is none)
+    - method, iterations, converged -> how it was computed (converged is False if max_iterations stopped it)
+    - seconds -> time spent
+    """
+
+    def __init__(self, values, scheduler, method, iterations, converged, seconds):
+        self.values = values
+        self.scheduler = scheduler
+        self.method = method
+        self.iterations = iterations
+        self.converged = converged
+        self.seconds = seconds
+
+    def adversary(self):
+        """The scheduler, as an adversary.MemorylessDeterministic."""
+        return MemorylessDeterministic(self.scheduler)
+
+    def actions(self, model):
+        """{state name: action name} of the scheduler."""
+        return self.adversary().actions(model)
+
+    def __repr__(self):
+        return (f"MDPSolution(method={self.method!r}, iterations={self.iterations}, converged={self.converged}, "
+                f"seconds={self.seconds:.3g})")
+
+
+class IntervalSolution(MDPSolution):
+    """
+    MDPSolution of interval iteration, with:
+    - lower, upper -> bounds on the probability of every state (values is their midpoint)
+    - gap -> largest upper - lower, at most epsilon when converged
+    """
+
+    def __init__(self, lower, upper, scheduler, iterations, converged, seconds):
+        super().__init__((lower + upper) / 2, scheduler, 'interval-iteration', iterations, converged, seconds)
+        self.lower = lower
+        self.upper = upper
+        self.gap = float(np.max(upper - lower, initial=0.0))
+
+    def __repr__(self):
+        return (f"IntervalSolution(iterations={self.iterations}, gap={self.gap:.3g}, converged={self.converged}, "
+                f"seconds={self.seconds:.3g})")
+
+
+def choice_values(model, x):
+    """sum p(c -> t) x(t) for every choice c."""
+    return np.bincount(model.transition_choice, weights=model.probs * x[model.targets], minlength=model.n_choices)
+
+
+def best_choices(model, q, minimize=False):
+    """
+    Best choice value of every state (0 without choices) and the first choice reaching it (-1 without choices).
+    """
+    n = model.n_states
+    degree = np.diff(model.state_ptr)
+    values = np.zeros(n)
+    choice = np.full(n, -1, dtype=np.int64)
+    some = degree > 0
+    if not some.any():
+        return values, choice
+    starts = model.state_ptr[:-1][some]
+    values[some] = (np.minimum if minimize else np.maximum).reduceat(q, starts)
+    first = np.where(q == values[model.choice_state], np.arange(model.n_choices), model.n_choices)
+    choice[some] = np.minimum.reduceat(first, starts)
+    return values, choice
+
+
+def _value_iteration(model, x, update, minimize, epsilon, max_iterations):
+    for k in range(1, max_iterations + 1):
+        values, _ = best_choices(model, choice_values(model, x), minimize)
+        new = np.where(update, values, x)
+        delta = np.max(np.abs(new - x), initial=0.0)
+        x = new
+        if delta <= epsilon:
+            return x, k, True
+    return x, max_iterations, False
+
+
+def _blocks(model, update, is_target):
+    """States to update split in blocks by distance to the target, with the entries of their choices."""
+    distance = backward_distances(model, is_target)
+    states = np.flatnonzero(update)
+    states = states[np.argsort(distance[states], kind='stable')]
+    blocks = []
+    for block in np.array_split(states, min(GS_BLOCKS, len(states))) if len(states) else []:
+        choice_ptr, choices = gather_rows(model.state_ptr, block)
+        entry_ptr, entries = gather_rows(model.choice_ptr, choices)
+        blocks.append((block, choice_ptr, entries, np.repeat(np.arange(len(choices)), np.diff(entry_ptr))))
+    return blocks
+
+
+def _gauss_seidel(model, x, update, is_target, minimize, epsilon, max_iterations):
+    blocks = _blocks(model, update, is_target)
+    reduce = np.minimum if minimize else np.maximum
+    x = x.copy()
+    for k in range(1, max_iterations + 1):
+        delta = 0.0
+        for states, choice_ptr, entries, entry_choice in blocks:
+            q = np.bincount(entry_choice, weights=model.probs[entries] * x[model.targets[entries]],
+                            minlength=choice_ptr[-1])
+            values = reduce.reduceat(q, choice_ptr[:-1]) # Every state to update has a choice
+            delta = max(delta, np.max(np.abs(values - x[states])))
+            x[states] = values
+        if delta <= epsilon:
+            return x, k, True
+    return x, max_iterations, False
+
+
+def _policy_iteration(model, x, update, minimize, max_iterations):
+    from scipy.sparse import diags
+    from evaluation import solve_chain
+    _, policy = best_choices(model, choice_values(model, x), minimize)
+    fixed = ~update
+    for k in range(1, max_iterations + 1):
+        # Chain of the policy on the states to update, the others keeping their values (1 or 0)
+        chain = MemorylessDeterministic(policy).induced_chain(model)
+        matrix = diags(update.astype(np.float64)) @ chain.matrix()
+        x = np.where(update, solve_chain(matrix, fixed & (x == 1), method='auto'), x)
+        q = choice_values(model, x)
+        values, best = best_choices(model, q, minimize)
+        current = q[np.maximum(policy, 0)]
+        better = update & (policy >= 0) & (values < current - TIE if minimize else values > current + TIE)
+        if not better.any():
+            return x, policy, k, True
+        policy = np.where(better, best, policy)
+    return x, policy, max_iterations, False
+
+
+def _deflate(model, update):
+    """Maximal end components of the states to update, and the choices of their states leaving them."""
+    component, inside = end_components(model, update)
+    leaving = (component[model.choice_state] >= 0) & ~inside
+    return component, np.flatnonzero(leaving)
+
+
+def _interval_iteration(model, lower, upper, update, minimize, epsilon, max_iterations):
+    if not minimize:
+        component, leaving = _deflate(model, update)
+        in_component = component >= 0
+        exits = component[model.choice_state[leaving]]
+        n_components = component.max(initial=-1) + 1
+    for k in range(1, max_iterations + 1):
+        values, _ = best_choices(model, choice_values(model, lower), minimize)
+        lower = np.where(update, values, lower)
+        q = choice_values(model, upper)
+        values, _ = best_choices(model, q, minimize)
+        upper = np.where(update, np.minimum(values, upper), upper)
+        if not minimize and n_components:
+            best_exit = np.zeros(n_components)
+            np.maximum.at(best_exit, exits, q[leaving])
+            upper[in_component] = np.minimum(upper[in_component], best_exit[component[in_component]])
+        if np.max(upper - lower, initial=0.0) <= epsilon:
+            return lower, upper, k, True
+    return lower, upper, max_iterations, False
+
+
+def scheduler(model, x, is_target, minimize=False):
+    """
+    Optimal scheduler of values x: a best choice in every state, the ties of the maximum being broken towards
+    the target.
+    """
+    q = choice_values(model, x)
+    values, choice = best_choices(model, q, minimize)
+    if minimize:
+        return choice
+    optimal = q >= values[model.choice_state] - TIE
+    distance = backward_distances(model, is_target, choice_ok=optimal)
+    # Optimal choices with a successor closer to the target than their state
+    entry_choice = model.transition_choice
+    closer = optimal[entry_choice] & (distance[model.targets] < distance[model.choice_state[entry_choice]])
+    progress = np.zeros(model.n_choices, dtype=bool)
+    progress[entry_choice[closer & (model.probs > 0)]] = True
+    _, toward = best_choices(model, progress.astype(np.float64))
+    use = np.isfinite(distance) & ~is_target & (toward >= 0) & progress[np.maximum(toward, 0)]
+    return np.where(use, toward, choice)
+
+
+def solve_reachability(model, target, minimize=False, method='value-iteration', epsilon=EPSILON,
+                       max_iterations=MAX_ITERATIONS):
+    """
+    Maximal (or minimal) probability of eventually reaching the target from every state, with a scheduler
+    achieving it.
+
+    Parameters:
+    - model (CompiledMDP): The model.
+    - target: State index, sequence of state indices or boolean mask.
+    - minimize (bool): Minimal probabilities instead of maximal ones.
+    - method (str): One of METHODS.
+    - epsilon (float): Value iteration stops when no value moves by more than epsilon (it isn't a bound on
+                       the error), interval iteration when the bounds are within epsilon of each other.
+    - max_iterations (int): Iterations (sweeps, or scheduler improvements) after which it gives up.
+
+    Returns:
+    - MDPSolution (IntervalSolution for interval-iteration)
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method!r}, expected one of {METHODS}")
+    start = time.perf_counter()
+    is_target = target_mask(model, target)
+    sure, may, _ = partition(model, is_target, minimize)
+    x = sure.astype(np.float64)
+    if method == 'value-iteration':
+        x, iterations, converged = _value_iteration(model, x, may, minimize, epsilon, max_iterations)
+    elif method == 'gauss-seidel':
+        x, iterations, converged = _gauss_seidel(model, x, may, is_target, minimize, epsilon, max_iterations)
+    elif method == 'policy-iteration':
+        x, policy, iterations, converged = _policy_iteration(model, x, may, minimize, max_iterations)
+    else:
+        lower, upper, iterations, converged = _interval_iteration(model, x, np.where(may, 1.0, x), may, minimize,
+                                                                  epsilon, max_iterations)
+        choice = scheduler(model, (lower + upper) / 2, is_target, minimize)
+        return IntervalSolution(lower, upper, choice, iterations, converged, time.perf_counter() - start)
+    choice = scheduler(model, x, is_target, minimize)
+    if method == 'policy-iteration' and minimize:
+        choice = np.where(may, policy, choice)
+    return MDPSolution(x, choice, method, iterations, converged, time.perf_counter() - start)
@@ -0,0 +1,91 @@
+import numpy as np
+from scipy.optimize import linprog
+from mdp_model import CompiledMDP
+from precomputation import prob0, prob1
+
+'''
+Reachability analysis of the notebooks (raport_final.ipynb), usable from scripts:
+- segment_suremaynever_states -> S_sure, S_may and S_never partition of the states for a target state
+  (precomputation.py, on the compiled model)
+- solve_system -> probabilities of reaching S_sure from the S_may states, as a linear program
+
+Both work on printer.transactions_prob, so the printer must come from run(..., return_printer=True).
+'''
+
+
+def segment_suremaynever_states(printer, target_state):
+    """
+    Splits the states in S_sure (reach the target with probability 1 whatever the actions), S_may
+    (reach it with a positive probability for some actions) and S_never (never reach it).
+
+    The sets come from the graph of the compiled model (precomputation.prob1 for the minimal probability,
+    prob0 for the maximal one), so states on cycles that reach the target almost surely are in S_sure too.
+
+    Returns:
+    - tuple: (S_sure, S_may, S_never) lists, in the order of printer.declared_states.
+    """
+    model = CompiledMDP.from_printer(printer)
+    target = model.state_index[target_state]
+    sure = prob1(model, target, minimize=True)
+    never = prob0(model, target)
+    names = np.array(model.state_names, dtype=object)
+    return list(names[sure]), list(names[~(sure | never)]), list(names[never])
+
+
+def solve_system(printer, S_may, S_sure, verbose=True):
+    '''
+    Solves the linear program giving the probability of reaching S_sure from every state of S_may.
+
+    States with a single transition give equality constraints x = A x + b, states with several actions
+    give one inequality constraint per action, and the sum of the x is minimized.
+
+    Parameters:
+    - printer: gramPrintListener with transactions_prob.
+    - S_may (list): States whose probability is unknown.
+    - S_sure (list): States reaching the target with probability 1.
+    - verbose (bool): Print the constraints of the system.
+
+    Returns:
+    - OptimizeResult: The result of scipy.optimize.linprog, res.x being the probabilities of S_may in order.
+    '''
+    df = printer.transactions_prob
+    # Initialize lists for inequality and equality constraints
+    A_ub, b_ub, A_eq, b_eq = [], [], [], []
+    Ubfollower = []
+    # Iterate over source states in S_may
+    for source_state in S_may:
+        # Check if there is only one transition from the source state
+        if len(df.loc[df['Origin'] == source_state]) == 1:
+            # If only one transition, add it as an equality constraint
+            t = df.loc[df['Origin'] == source_state, S_may].copy()
+            t.loc[:, t.columns == source_state] -= 1  # Identity matrix substracted (A-I), but we invert later
+            A_eq.append(-t.values)                    # (A-I) becomes (I-A)
+            b_eq.append(np.sum(df.loc[df['Origin'] == source_state, S_sure].values, axis=1))
+        else:
+            # If multiple transitions, add them as inequality constraints
+            mask_state = df['Origin'] == source_state
+            Ubfollower.append(source_state)
+            ts = df.loc[mask_state, S_may].copy()
+            ts.loc[:, ts.columns == source_state] -=1
+            Ubfollower.append(df.loc[mask_state, 'Action'].tolist())
+            for i in range(len(df.loc[mask_state])):
+                A_ub.append(ts.values[i])
+                b_ub.append(-np.sum(df.loc[df['Origin'] == source_state, S_sure].values, axis=1)[i])
+
+    c = np.ones(len(S_may)) # Objective: minimize the sum of the x of every state
+
+    A_ub, b_ub, A_eq, b_eq = [None if not v else v for v in [A_ub, b_ub, A_eq, b_eq]]
+    A_eq, A_ub = [np.vstack(m) if m is not None else None for m in [A_eq, A_ub]]
+
+    if verbose:
+        print('--------- System constraints:')
+        print(f"{Ubfollower=}")
+        print(f"{A_ub=}")
+        print(f"{b_ub=}")
+        print(f"{A_eq=}")
+        print(f"{b_eq=}")
+        print(f"{c=}")
+
+    res = linprog(c=c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq, bounds=(0,1)) # Probabilities are between 0 and 1
+
+    return res
@@ -0,0 +1,227 @@
+import re
+import sys
+
+'''
+Native Python reader for the gram.g4 grammar, used by run(..., backend="native") and run(..., backend="stream").
+
+The ANTLR runtime builds a token stream and a full parse tree before the listener sees anything,
+which costs far more than the listener itself for such a small grammar. Here the text is split on
+';' (which only appears as a statement terminator in the grammar), every statement is matched with a
+single regular expression, and its (state, action, targets, weights) values are handed to the same
+gramPrintListener methods the ANTLR callbacks use (defStates, defRewards, defActions, transAct,
+transNoAct), so the warnings, errors and tables are the same.
+
+The reader only accepts files that are syntactically correct and raises MdpSyntaxError otherwise.
+ANTLR recovers from syntax errors in its own way (deleting or inventing tokens), so with the "native"
+backend nothing is fed to the listener before the whole file is checked, and run() parses the file
+again with ANTLR on a syntax error.
+
+The "stream" backend (parse_stream) reads the file in chunks and feeds each statement as soon as it
+is read, so memory is bounded by the model the listener builds and not by the file size. Files too
+big for ANTLR have no fallback: a syntax error is raised with its line and column.
+'''
+
+KEYWORDS = {'States', 'Actions', 'Rewards', 'transition'} # Tokens of gram.g4 that are not an ID
+CHUNK_SIZE = 1 << 22
+
+_WS = r'[ \t\n\r\f]*'
+_ID = r'[a-zA-Z_][a-zA-Z_0-9]*'
+_INT = r'[0-9]+'
+_KEY_END = r'(?![a-zA-Z_0-9])'
+
+# Statements, without their ';'
+_DEFSTATES = re.compile(_WS + r'States' + _KEY_END + _WS + rf'({_ID}(?:{_WS},{_WS}{_ID})*){_WS}')
+_DEFREWARDS = re.compile(_WS + r'Rewards' + _KEY_END + _WS + rf'({_ID}{_WS}:{_WS}{_INT}(?:{_WS},{_WS}{_ID}{_WS}:{_WS}{_INT})*){_WS}')
+_DEFACTIONS = re.compile(_WS + r'Actions' + _KEY_END + _WS + rf'({_ID}(?:{_WS},{_WS}{_ID})*){_WS}')
+_TRANS = re.compile(_WS + rf'({_ID}){_WS}(?:\[{_WS}({_ID}){_WS}\]{_WS})?->{_WS}({_INT}{_WS}:{_WS}{_ID}(?:{_WS}\+{_WS}{_INT}{_WS}:{_WS}{_ID})*){_WS}')
+_BLANK = re.compile(_WS)
+
+_ID_LIST = re.compile(_ID)
+_PAIR = re.compile(rf'({_INT}){_WS}:{_WS}({_ID})')
+_REWARD = re.compile(rf'({_ID}){_WS}:{_WS}({_INT})')
+
+
+class MdpSyntaxError(Exception):
+    """Raised when the text doesn't follow gram.g4. The position is given as line and column, like ANTLR."""
+
+    def __init__(self, message, line, column):
+        super().__init__(f"line {line}:{column} {message}")
+        self.line = line
+        self.column = column
+
+
+def _split(chunks):
+    """
+    Yields (statement, line, column) for every ';' terminated statement of the chunks, with the
+    position where the statement starts, and finally the text left after the last ';' (column None).
+    """
+    line, column = 1, 0
+    rest = ''
+    for chunk in chunks:
+        rest += chunk
+        pieces = rest.split(';')
+        rest = pieces.pop()
+        for piece in pieces:
+            yield piece, line, column
+            newlines = piece.count('\n')
+            if newlines:
+                line += newlines
+                column = len(piece) - piece.rfind('\n')
+            else:
+                column += len(piece) + 1
+    yield rest, line, None
+
+
+def position(location):
+    """Line and column of a statement from its location (line, column, leading whitespace)."""
+    line, column, blank = location
+    newlines = blank.count('\n')
+    if newlines:
+        return line + newlines, len(blank) - blank.rfind('\n') - 1
+    return line, column + len(blank)
+
+
+def _location(piece, line, column, start=None):
+    if start is None:
+        start = len(piece) - len(piece.lstrip(' \t\n\r\f'))
+    return line, column, piece[:start]
+
+
+def _error(message, piece, line, column):
+    start = len(piece) - len(piece.lstrip(' \t\n\r\f'))
+    newlines = piece.count('\n', 0, start)
+    if newlines:
+        line, column = line + newlines, start - piece.rfind('\n', 0, start) - 1
+    else:
+        column = (column or 0) + start
+    return MdpSyntaxError(message, line, column)
+
+
+def _names(names, piece, line, column):
+    if not KEYWORDS.isdisjoint(names):
+        name = next(n for n in names if n in KEYWORDS)
+        raise _error(f"keyword '{name}' used as a name", piece, line, column)
+    return names
+
+
+def iter_statements(chunks):
+    """
+    Parses the content of a .mdp file, given as an iterable of text chunks, one statement at a time.
+
+    Yields:
+    - Tuples ('states', states), ('rewards', states, rewards), ('actions', actions),
+      ('transact', dep, act, targets, weights) and ('transnoact', dep, targets, weights), in file order,
+      each ending with the location of the statement (see position).
+
+    Raises:
+    - MdpSyntaxError: As soon as a statement doesn't follow the grammar.
+    """
+    expected = 'states'
+    n_transitions = 0
+    for piece, line, column in _split(chunks):
+        if column is None: # Text after the last ';'
+            if n_transitions == 0 or _BLANK.fullmatch(piece) is None:
+                raise _error("expecting a statement ended by ';'" if piece.strip() else "expecting a transition", piece, line, column)
+            return
+
+        if expected == 'transitions':
+            m = _TRANS.fullmatch(piece)
+            if m is None:
+                raise _error("expecting a transition", piece, line, column)
+            dep, act, body = m.groups()
+            pairs = _PAIR.findall(body)
+            targets = _names([t for _, t in pairs], piece, line, column)
+            weights = [int(w) for w, _ in pairs]
+            n_transitions += 1
+            location = (line, column, piece[:m.start(1)])
+            # The origin and action are kept by the listener, only one copy of each name is stored
+            if act is None:
+                _names([dep], piece, line, column)
+                yield ('transnoact', sys.intern(dep), targets, weights, location)
+            else:
+                _names([dep, act], piece, line, column)
+                yield ('transact', sys.intern(dep), sys.intern(act), targets, weights, location)
+
+        elif expected == 'states':
+            m = _DEFSTATES.fullmatch(piece)
+            if m is None:
+                raise _error("expecting the States declaration", piece, line, column)
+            yield ('states', _names(_ID_LIST.findall(m.group(1)), piece, line, column), _location(piece, line, column))
+            expected = 'rewards'
+
+        else:
+            if expected == 'rewards':
+                expected = 'actions'
+                m = _DEFREWARDS.fullmatch(piece)
+                if m is not None:
+                    pairs = _REWARD.findall(m.group(1))
+                    yield ('rewards', _names([s for s, _ in pairs], piece, line, column), [int(r) for _, r in pairs],
+                           _location(piece, line, column))
+                    continue
+            m = _DEFACTIONS.fullmatch(piece)
+            if m is None:
+                raise _error("expecting the Actions declaration", piece, line, column)
+            yield ('actions', _names(_ID_LIST.findall(m.group(1)), piece, line, column), _location(piece, line, column))
+            expected = 'transitions'
+
+
+def parse_statements(text):
+    """
+    Splits the content of a .mdp file into its statements.
+
+    Parameters:
+    - text (str): Content of the .mdp file.
+
+    Returns:
+    - list: The statements, as yielded by iter_statements.
+
+    Raises:
+    - MdpSyntaxError: If the text doesn't follow the grammar.
+    """
+    return list(iter_statements([text]))
+
+
+def feed(listener, statements):
+    """Calls the gramPrintListener method of every statement, in order."""
+    for statement in statements:
+        kind = statement[0]
+        listener.location = statement[-1] # Only turned into a position if a diagnostic is raised
+        if kind == 'transact':
+            listener.transAct(*statement[1:-1])
+        elif kind == 'transnoact':
+            listener.transNoAct(*statement[1:-1])
+        elif kind == 'states':
+            listener.defStates(statement[1])
+        elif kind == 'rewards':
+            listener.defRewards(statement[1], statement[2])
+        elif kind == 'actions':
+            listener.defActions(statement[1])
+
+
+def parse_file(path, listener):
+    """
+    Reads a .mdp file and feeds it to the listener. Nothing is fed if the file has a syntax error.
+
+    Raises:
+    - MdpSyntaxError: If the file doesn't follow the grammar.
+    """
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    feed(listener, parse_statements(text))
+    return listener
+
+
+def read_chunks(f, chunk_size=CHUNK_SIZE):
+    return iter(lambda: f.read(chunk_size), '')
+
+
+def parse_stream(path, listener, chunk_size=CHUNK_SIZE):
+    """
+    Reads a .mdp file chunk by chunk and feeds every statement to the listener as soon as it is read.
+
+    Raises:
+    - MdpSyntaxError: On the first syntax error, the statements before it have already been fed.
+    """
+    with open(path, encoding='utf-8') as f:
+        feed(listener, iter_statements(read_chunks(f, chunk_size)))
+    return listener
@@ -0,0 +1,210 @@
+import numpy as np
+from adversary import gather_rows
+
+'''
+Graph precomputation of reachability (Prob0 / Prob1), on the reverse index of a CompiledMDP.
+
+The states whose probability of reaching the target is exactly 0 or 1 only depend on the graph of the
+model, not on the probabilities. Each set comes from backward searches from the target over the reverse
+index of the model, every search visiting each transition entry at most once: a breadth-first search of
+scipy.sparse.csgraph when one choice reaching the set is enough, otherwise a frontier of states at a time
+counting the choices of every state that reach it (with numpy, or state by state when the frontier is small):
+- prob0(minimize=False) -> Pmax = 0: no choice sequence reaches the target
+- prob0(minimize=True) -> Pmin = 0: some adversary avoids the target for sure
+- prob1(minimize=True) -> Pmin = 1: every adversary reaches the target almost surely
+- prob1(minimize=False) -> Pmax = 1: some adversary reaches the target almost surely (two backward
+                           searches per round of a nested fixed point, usually a few rounds)
+On a Markov chain the min and max sets are the same. partition gives the S_sure / S_may / S_never split
+of the notebooks (model_checking.segment_suremaynever_states, find_states of prob_comp_tree_logic.ipynb)
+for the maximal or minimal probabilities, S_may being the states left to the numerical solvers.
+
+    sure, may, never = partition(model, model.state_index['S1'])
+'''
+
+SMALL_FRONTIER = 64 # Frontiers of backward_forall expanded state by state rather than with numpy
+
+
+def target_mask(model, target):
+    """Boolean mask of the target state(s): an index, a sequence of indices or already a mask."""
+    target = np.asarray(target)
+    if target.dtype == bool and target.shape == (model.n_states,):
+        return target.copy()
+    return np.isin(np.arange(model.n_states), np.atleast_1d(target))
+
+
+def _predecessors(model, states):
+    """Choices with a successor in states (an index array), one per transition entry."""
+    ptr, choices = model.reverse_index()
+    _, entries = gather_rows(ptr, states)
+    return choices[entries]
+
+
+def _reverse_graph(model, start, allowed=None, choice_ok=None):
+    """
+    scipy.sparse CSR graph of the states with an edge t -> s for every choice of s (where choice_ok) reaching t,
+    s being allowed, plus an extra node (the last one) pointing to every start state.
+    """
+    from scipy.sparse import csr_matrix
+    n = model.n_states
+    ptr, predecessors = model.reverse_index()
+    sources = model.choice_state[predecessors]
+    keep = np.ones(len(predecessors), dtype=bool)
+    if choice_ok is not None:
+        keep &= choice_ok[predecessors]
+    if allowed is not None:
+        keep &= allowed[sources]
+    # Row t holds the predecessors of t, kept in reverse_index order
+    counts = np.bincount(np.repeat(np.arange(n), np.diff(ptr))[keep], minlength=n)
+    extra = np.flatnonzero(start)
+    row_ptr = np.zeros(n + 2, dtype=np.int64)
+    np.cumsum(counts, out=row_ptr[1:n + 1])
+    row_ptr[n + 1] = row_ptr[n] + len(extra)
+    columns = np.concatenate([sources[keep], extra]).astype(np.int32)
+    return csr_matrix((np.ones(len(columns), dtype=np.int8), columns, row_ptr), shape=(n + 1, n + 1))
+
+
+def backward_exists(model, start, allowed=None, choice_ok=None):
+    """
+    States reaching a start state (mask) with a positive probability for some adversary, through allowed
+    states only (the start states are always kept), using only the choices where choice_ok is True.
+
+    One breadth-first search of scipy.sparse.csgraph, on the reverse graph of the states plus an extra node
+    pointing to every start state.
+    """
+    from scipy.sparse.csgraph import breadth_first_order
+    n = model.n_states
+    graph = _reverse_graph(model, start, allowed, choice_ok)
+    found = np.zeros(n + 1, dtype=bool)
+    found[breadth_first_order(graph, n, directed=True, return_predecessors=False)] = True
+    return found[:n] | start
+
+
+def backward_distances(model, start, allowed=None, choice_ok=None):
+    """
+    Smallest number of transitions from every state to a start state (mask), with the same restrictions as
+    backward_exists: 0 for the start states, inf for the states that can't reach them.
+    """
+    from scipy.sparse.csgraph import dijkstra
+    n = model.n_states
+    graph = _reverse_graph(model, start, allowed, choice_ok)
+    distances = dijkstra(graph, directed=True, indices=n, unweighted=True)[:n] - 1
+    distances[start] = 0
+    return distances
+
+
+def backward_forall(model, start, allowed=None):
+    """
+    States reaching a start state (mask) with a positive probability whatever the adversary: the start
+    states, and the allowed states with choices all of which have a successor found before.
+    """
+    if model.is_markov_chain(): # A single choice: all of them is one of them
+        return backward_exists(model, start, allowed)
+    found = start.copy()
+    allowed = np.ones(model.n_states, dtype=bool) if allowed is None else allowed
+    ptr, predecessors = model.reverse_index()
+    choice_state = model.choice_state
+    left = np.diff(model.state_ptr) # Choices of every state without a successor found yet
+    hit = np.zeros(model.n_choices, dtype=bool)
+    frontier = np.flatnonzero(found)
+    while len(frontier):
+        if len(frontier) < SMALL_FRONTIER:
+            reached = []
+            for t in frontier:
+                for c in predecessors[ptr[t]:ptr[t + 1]]:
+                    if hit[c]:
+                        continue
+                    hit[c] = True
+                    s = choice_state[c]
+                    left[s] -= 1
+                    if left[s] == 0 and allowed[s] and not found[s]:
+                        found[s] = True
+                        reached.append(s)
+            frontier = np.array(reached, dtype=np.int64)
+            continue
+        choices = np.unique(_predecessors(model, frontier))
+        choices = choices[~hit[choices]]
+        hit[choices] = True
+        states, counts = np.unique(choice_state[choices], return_counts=True)
+        left[states] -= counts
+        frontier = states[(left[states] == 0) & allowed[states] & ~found[states]]
+        found[frontier] = True
+    return found
+
+
+def prob0(model, target, minimize=False):
+    """Mask of the states reaching the target with probability 0, for the maximal (or minimal) probability."""
+    is_target = target_mask(model, target)
+    if minimize:
+        return ~backward_forall(model, is_target)
+    return ~backward_exists(model, is_target)
+
+
+def prob1(model, target, minimize=False):
+    """Mask of the states reaching the target with probability 1, for the maximal (or minimal) probability."""
+    is_target = target_mask(model, target)
+    if minimize:
+        # Pmin < 1 exactly where some adversary can reach, before the target, a state where Pmin = 0
+        return ~backward_exists(model, prob0(model, is_target, minimize=True), allowed=~is_target)
+    choice = model.transition_choice
+    sure = ~prob0(model, is_target)
+    while True:
+        # States all of whose choices may leave sure go, then the ones that can't reach the target with
+        # the choices staying in sure for certain
+        sure &= ~backward_forall(model, ~sure, allowed=~is_target)
+        leaving = np.bincount(choice[~sure[model.targets] & (model.probs > 0)], minlength=model.n_choices)
+        reached = backward_exists(model, is_target, allowed=sure, choice_ok=leaving == 0)
+        if np.array_equal(reached, sure):
+            return sure
+        sure = reached
+
+
+def partition(model, target, minimize=False):
+    """
+    Splits the states for the maximal (or minimal) probability of reaching the target.
+
+    Returns:
+    - tuple: (sure, may, never) boolean masks, probability 1, strictly between 0 and 1 (or unknown from the
+             graph), and 0.
+    """
+    never = prob0(model, target, minimize)
+    sure = prob1(model, target, minimize)
+    return sure, ~(sure | never), never
+
+
+def end_components(model, states=None):
+    """
+    Maximal end components inside the given states (all by default): the largest sets from which some
+    adversary can stay forever while visiting every state of the set, with the choices doing so. Computed by
+    the usual refinement: strongly connected components (scipy.sparse.csgraph) of the choices staying among
+    the remaining states, then the choices leaving their component are dropped, and the states left without
+    a choice, until nothing changes.
+
+    Returns:
+    - tuple: (component, inside), the end component of every state (-1 outside them, numbered from 0) and
+             the mask of the choices staying in their end component.
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import connected_components
+    n = model.n_states
+    remaining = np.ones(n, dtype=bool) if states is None else np.asarray(states, dtype=bool).copy()
+    choice = model.transition_choice
+    entry_state = model.choice_state[choice]
+    positive = model.probs > 0
+    component = np.where(remaining, 0, -1) # The remaining states as one component at first
+    while True:
+        # Choices all of whose successors are in the same component as their state
+        outside = positive & (component[model.targets] != component[entry_state])
+        inside = np.bincount(choice[outside], minlength=model.n_choices) == 0
+        inside &= remaining[model.choice_state]
+        kept = remaining & (np.bincount(model.choice_state[inside], minlength=n) > 0)
+        use = inside[choice] & positive & kept[model.targets]
+        graph = csr_matrix((np.ones(np.count_nonzero(use), dtype=np.int8), (entry_state[use], model.targets[use])),
+                           shape=(n, n))
+        _, labels = connected_components(graph, directed=True, connection='strong')
+        new = np.where(kept, labels, -1)
+        if np.array_equal(kept, remaining) and np.array_equal(new, component):
+            break
+        remaining, component = kept, new
+    _, component[remaining] = np.unique(component[remaining], return_inverse=True)
+    return component, inside
+
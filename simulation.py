@@ -0,0 +1,216 @@
+import numpy as np
+from adversary import as_adversary
+from mdp_model import AliasTable
+
+'''
+Simulation of a CompiledMDP (mdp_model.py), without pandas.
+
+The default adversary is the "random" one of adversaire_simulation.gerar_preferencias_acoes: every walk
+fixes a random choice for each state (drawn when the state is first visited) and keeps it for the whole walk.
+simulate_batch can follow an adversary of adversary.py instead (or an array with the choice index of every state).
+
+- walk -> one path, step by step
+- simulate_batch -> N paths advanced together with NumPy (lockstep), for statistical model checking
+
+Successors are drawn from the alias tables of the model (CompiledMDP.alias_table), so a step costs the
+same whatever the number of states and successors.
+'''
+
+CHUNK_SIZE = 1 << 20 # Trajectories simulated together, bounds the memory used by simulate_batch
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def walk(model, num_transitions, rng=None, recorder=None):
+    """
+    Random walk of num_transitions steps from the first state.
+
+    With a recorder (trajectory.TrajectoryRecorder), the steps are only recorded there, for walks too
+    long to be kept as lists.
+
+    Returns:
+    - tuple: (states, choices) index lists, states having one more element than choices (both empty with
+             a recorder). The walk is shorter if it reaches a state without transitions, or takes a choice
+             without successors.
+    """
+    rng = np.random.default_rng(rng)
+    alias = model.alias_table()
+    state = model.first_state
+    states, choices = [state], []
+    if recorder is not None:
+        recorder.start(state)
+        states = []
+    chosen = {}
+    for _ in range(num_transitions):
+        choice = chosen.get(state)
+        if choice is None:
+            start, end = model.state_ptr[state], model.state_ptr[state + 1]
+            if start == end:
+                break
+            choice = chosen[state] = int(rng.integers(start, end))
+        entry = alias.sample_one(choice, rng)
+        if entry < 0:
+            break # Choice without successors
+        state = int(model.targets[entry])
+        if recorder is not None:
+            recorder.step(model.choice_action[choice], state, alias.probs[entry])
+            continue
+        states.append(state)
+        choices.append(choice)
+    return states, choices
+
+
+class BatchResult:
+    """
+    Outcome of simulate_batch, one entry per trajectory:
+    - hit -> True if the trajectory reached a target state
+    - hitting_time -> step at which it first did (0 for the first state), -1 if it didn't
+    - final_state -> state where it stopped (target, state without transitions, or after num_transitions steps)
+    - length -> number of transitions taken
+    - likelihood -> likelihood ratio of the trajectory (model / proposal) with importance sampling, else None
+    """
+
+    def __init__(self, hit, hitting_time, final_state, length, likelihood=None):
+        self.hit = hit
+        self.hitting_time = hitting_time
+        self.final_state = final_state
+        self.length = length
+        self.likelihood = likelihood
+
+    @property
+    def n(self):
+        return len(self.hit)
+
+    @property
+    def estimate(self):
+        """Fraction of the trajectories reaching the target (weighted by the likelihood ratios with importance sampling)."""
+        if not self.n:
+            return float('nan')
+        if self.likelihood is not None:
+            return float(np.mean(self.hit * self.likelihood))
+        return float(self.hit.mean())
+
+    @property
+    def steps(self):
+        """Total number of simulated transitions."""
+        return int(self.length.sum())
+
+    def __repr__(self):
+        return f"BatchResult(n={self.n}, hits={int(self.hit.sum())}, estimate={self.estimate:.4g})"
+
+
+def _uniform(keys, states):
+    """Uniform floats in [0, 1) that only depend on (key, state), so a trajectory always draws the same choice in a state."""
+    z = keys + states.astype(np.uint64) * _GOLDEN
+    z ^= z >> np.uint64(30)
+    z *= _MIX1
+    z ^= z >> np.uint64(27)
+    z *= _MIX2
+    z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+
+def simulate_batch(model, n, num_transitions=20, target=None, rng=None, scheduler=None, chunk_size=CHUNK_SIZE,
+                   proposal=None):
+    """
+    Simulates n trajectories of at most num_transitions steps from the first state, all advanced together.
+
+    Parameters:
+    - model (CompiledMDP): The model.
+    - n (int): Number of trajectories.
+    - num_transitions (int): Maximum number of transitions of every trajectory.
+    - target: State index, or sequence of state indices, where the trajectories stop. None to never stop early.
+    - rng: numpy Generator or seed.
+    - scheduler: Adversary (adversary.py), choice index of every state (-1 where there is none), or None for
+                 the random adversary.
+    - chunk_size (int): Trajectories held in memory at once.
+    - proposal: Importance sampling: probability of every transition entry (aligned with model.targets) to
+                draw the successors from, or an AliasTable of them. The likelihood ratio of every
+                trajectory is then returned in result.likelihood (see importance.py).
+
+    Returns:
+    - BatchResult
+    """
+    rng = np.random.default_rng(rng)
+    is_target = np.zeros(model.n_states, dtype=bool)
+    if target is not None:
+        is_target[np.atleast_1d(target)] = True
+    alias = model.alias_table()
+    entry_log_ratio = None
+    if proposal is not None:
+        alias = proposal if isinstance(proposal, AliasTable) else AliasTable(model.choice_ptr, model.targets, proposal)
+        with np.errstate(divide='ignore'):
+            entry_log_ratio = np.log(model.probs) - np.log(alias.probs) # Only drawn where the proposal is positive
+    n_choices = np.diff(model.state_ptr)
+    # Entries of every choice, with a 0 at the end for the choice -1 (no choice)
+    choice_degree = np.append(np.diff(model.choice_ptr), 0)
+    adversary = None if scheduler is None else as_adversary(scheduler)
+
+    hit = np.zeros(n, dtype=bool)
+    hitting_time = np.full(n, -1, dtype=np.int64)
+    final_state = np.full(n, model.first_state, dtype=np.int64)
+    length = np.zeros(n, dtype=np.int64)
+    likelihood = None if proposal is None else np.ones(n)
+
+    for begin in range(0, n, chunk_size):
+        end = min(n, begin + chunk_size)
+        active = np.arange(begin, end)
+        state = np.full(end - begin, model.first_state, dtype=np.int64)
+        trajectory_keys = rng.integers(0, 2**63, end - begin, dtype=np.uint64) if adversary is None else None
+        memory = None if adversary is None else adversary.initial_memory(end - begin)
+        log_weight = None if proposal is None else np.zeros(end - begin)
+
+        for step in range(num_transitions + 1):
+            reached = is_target[state]
+            if reached.any():
+                hit[active[reached]] = True
+                hitting_time[active[reached]] = step
+            if adversary is None:
+                choice = np.where(n_choices[state] > 0, model.state_ptr[state] +
+                                  (_uniform(trajectory_keys, state) * n_choices[state]).astype(np.int64), -1)
+            else:
+                choice = adversary.choose(model, state, memory, rng)
+            stuck = choice_degree[choice] == 0 # No choice, or a choice without successors
+            stop = reached | stuck if step < num_transitions else np.ones(len(state), dtype=bool)
+            if stop.any():
+                final_state[active[stop]] = state[stop]
+                length[active[stop]] = step
+                keep = ~stop
+                if log_weight is not None:
+                    likelihood[active[stop]] = np.exp(log_weight[stop])
+                    log_weight = log_weight[keep]
+                active, state, choice = active[keep], state[keep], choice[keep]
+                if adversary is None:
+                    trajectory_keys = trajectory_keys[keep]
+                else:
+                    memory = None if memory is None else memory[keep]
+            if len(state) == 0:
+                break
+
+            entry = alias.sample(choice, rng)
+            state = model.targets[entry].astype(np.int64)
+            if log_weight is not None:
+                log_weight += entry_log_ratio[entry]
+            if memory is not None:
+                memory = adversary.next_memory(memory, state)
+
+    return BatchResult(hit, hitting_time, final_state, length, likelihood)
+
+
+def chernoff_hoeffding_runs(epsilon, delta):
+    """Number of runs so that the estimate is within epsilon of the probability with confidence 1 - delta."""
+    return int(np.ceil(np.log(2 / delta) / (2 * epsilon ** 2)))
+
+
+def estimate_reachability(model, target, num_simulations=1000, num_transitions=20, rng=None):
+    """
+    Monte Carlo estimate of the probability of reaching the target state index within num_transitions steps,
+    like MonteCarloSimulator in raport_final.ipynb.
+
+    Returns:
+    - tuple: (estimate, number of runs reaching the target).
+    """
+    result = simulate_batch(model, num_simulations, num_transitions, target, rng)
+    return result.estimate, int(result.hit.sum())
@@ -0,0 +1,577 @@
+import collections
+import multiprocessing
+import os
+import statistics
+import time
+import numpy as np
+import simulation
+
+'''
+Statistical model checking (the MonteCarloSimulator of raport_final.ipynb) on several processes.
+
+The runs are split in batches of batch_size trajectories. Batch i is simulated with its own generator,
+seeded by the i-th child of the SeedSequence of the seed, so the batches are independent streams and the
+merged counts only depend on the seed and the number of runs: they are the same whatever the number of
+workers and the order in which the batches finish.
+
+The model is handed to every worker once, when the pool starts (inherited without a copy when processes
+are forked), and the tasks only carry the seed and the size of a batch.
+
+- Runner.estimate -> Monte Carlo estimate of the probability of reaching the target
+- Runner.sprt -> Wald's sequential test (SPRT of the notebook), drawing the samples in batches
+- Runner.sweep -> the tests of estima_probabilites for many thresholds, all on one shared sample stream
+- Runner.adaptive -> estimate with as many runs as a confidence interval of the requested width needs
+
+    with Runner(model, target, num_transitions=20, seed=1) as runner:
+        result = runner.estimate(10**7)
+        test = runner.sprt(p0=0.1, p1=0.15, alpha=0.01, beta=0.01)
+'''
+
+BATCH_SIZE = 1 << 16
+SPRT_FIRST_BATCH = 1 << 10 # The SPRT batches start small and double up to the batch size, easy tests stop early
+SWEEP_FIRST_BLOCK = 64 # Samples added to every undecided test of a sweep, doubling up to SWEEP_MAX_BLOCK
+SWEEP_MAX_BLOCK = 1 << 14
+LOOKAHEAD = 2 # Batches queued per worker
+
+_setup = None # (model, target, num_transitions, scheduler) of the worker processes
+_stop = None # Event set when the batches still queued are not needed any more
+
+
+def _init_worker(stop, *setup):
+    global _setup, _stop
+    _stop = stop
+    _setup = setup
+
+
+def _simulate(setup, seed, n, outcomes=False):
+    """(runs, hits, steps) of a batch, or with outcomes the packed hit bits of its trajectories."""
+    model, target, num_transitions, scheduler = setup
+    result = simulation.simulate_batch(model, n, num_transitions, target, np.random.default_rng(seed), scheduler)
+    if outcomes:
+        return np.packbits(result.hit)
+    return n, int(result.hit.sum()), result.steps
+
+
+def _run_batch(task):
+    if _stop.is_set():
+        return None
+    return _simulate(_setup, *task)
+
+
+def _check_sprt(p0, p1, alpha, beta):
+    """Raises ValueError unless 0 <= p0 < p1 <= 1 and alpha, beta are in (0, 1) with alpha + beta < 1."""
+    if not 0 <= p0 < p1 <= 1:
+        raise ValueError(f"the SPRT needs 0 <= p0 < p1 <= 1, got p0={p0} and p1={p1}")
+    if not (0 < alpha < 1 and 0 < beta < 1 and alpha + beta < 1):
+        raise ValueError(f"the SPRT needs alpha and beta in (0, 1) with alpha + beta < 1, got alpha={alpha} and beta={beta}")
+
+
+def _log_ratios(p0, p1):
+    """
+    Log likelihood ratios log(p1/p0) of a hit and log((1-p1)/(1-p0)) of a miss: +inf for a hit when p0 = 0,
+    -inf for a miss when p1 = 1 (the sample alone decides).
+    """
+    p0, p1 = np.asarray(p0, dtype=float), np.asarray(p1, dtype=float)
+    with np.errstate(divide='ignore'):
+        return np.log(p1) - np.log(p0), np.log1p(-p1) - np.log1p(-p0)
+
+
+def hoeffding_interval(hits, runs, delta):
+    """Chernoff-Hoeffding interval (the bound of prob_n_lancers in remi.ipynb), at level 1 - delta."""
+    p = hits / runs
+    epsilon = np.sqrt(np.log(2 / delta) / (2 * runs))
+    return max(0.0, float(p - epsilon)), min(1.0, float(p + epsilon))
+
+
+def clopper_pearson_interval(hits, runs, delta):
+    """Exact binomial interval, at level 1 - delta."""
+    from scipy.stats import beta
+    low = beta.ppf(delta / 2, hits, runs - hits + 1) if hits > 0 else 0.0
+    high = beta.ppf(1 - delta / 2, hits + 1, runs - hits) if hits < runs else 1.0
+    return float(low), float(high)
+
+
+def wilson_interval(hits, runs, delta):
+    """Wilson score interval, at level 1 - delta."""
+    z = statistics.NormalDist().inv_cdf(1 - delta / 2)
+    p = hits / runs
+    center = (p + z * z / (2 * runs)) / (1 + z * z / runs)
+    half = z / (1 + z * z / runs) * np.sqrt(p * (1 - p) / runs + z * z / (4 * runs * runs))
+    return max(0.0, float(center - half)), min(1.0, float(center + half))
+
+
+BOUNDS = {'hoeffding': hoeffding_interval, 'clopper-pearson': clopper_pearson_interval, 'wilson': wilson_interval}
+
+
+class SMCResult:
+    """
+    Merged counts of simulated batches:
+    - runs, hits -> number of trajectories, and of those reaching the target
+    - steps -> total number of simulated transitions
+    - batches -> number of batches
+    - seconds -> wall time
+    """
+
+    def __init__(self, runs=0, hits=0, steps=0, batches=0, seconds=0.0):
+        self.runs = runs
+        self.hits = hits
+        self.steps = steps
+        self.batches = batches
+        self.seconds = seconds
+
+    def add(self, counts):
+        n, hits, steps = counts
+        self.runs += n
+        self.hits += hits
+        self.steps += steps
+        self.batches += 1
+
+    @property
+    def estimate(self):
+        return self.hits / self.runs if self.runs else float('nan')
+
+    def __repr__(self):
+        return f"SMCResult(runs={self.runs}, hits={self.hits}, estimate={self.estimate:.4g}, seconds={self.seconds:.3g})"
+
+
+class AdaptiveResult(SMCResult):
+    """
+    SMCResult of Runner.adaptive, with:
+    - bound, delta, epsilon -> the requested interval
+    - low, high -> the interval at the last checkpoint
+    - converged -> True if it is within epsilon of the estimate (False if max_runs stopped the estimation)
+    - checkpoints -> (runs, estimate, low, high) after every batch
+    """
+
+    def __init__(self, bound, delta, epsilon):
+        super().__init__()
+        self.bound = bound
+        self.delta = delta
+        self.epsilon = epsilon
+        self.low, self.high = 0.0, 1.0
+        self.converged = False
+        self.checkpoints = []
+
+    def __repr__(self):
+        return (f"AdaptiveResult(runs={self.runs}, estimate={self.estimate:.4g}, {self.bound} interval="
+                f"[{self.low:.4g}, {self.high:.4g}], converged={self.converged})")
+
+
+class SPRTResult:
+    """
+    Outcome of a sequential probability ratio test:
+    - decision -> 'H0', 'H1', or None if max_samples were drawn without reaching a boundary
+    - samples -> samples used, up to the one crossing a boundary (what the serial test would have drawn)
+    - simulated -> trajectories of the batches read, the samples after the decision included
+    - batches -> batches read
+    - log_ratio -> log likelihood ratio after the last sample used
+    - seconds -> decision latency (wall time)
+    """
+
+    def __init__(self, decision, samples, simulated, batches, log_ratio, seconds):
+        self.decision = decision
+        self.samples = samples
+        self.simulated = simulated
+        self.batches = batches
+        self.log_ratio = log_ratio
+        self.seconds = seconds
+
+    @property
+    def message(self):
+        """The string the SPRT function of the notebook returns."""
+        if self.decision == 'H1':
+            return "Accept H1: The probability of reaching the target state is significantly high."
+        if self.decision == 'H0':
+            return "Accept H0: The probability of reaching the target state is not significantly high."
+        return "Undecided: more samples are needed."
+
+    def __repr__(self):
+        return (f"SPRTResult(decision={self.decision}, samples={self.samples}, batches={self.batches}, "
+                f"seconds={self.seconds:.3g})")
+
+
+class SweepResult:
+    """
+    Outcome of Runner.sweep, for num_simulations repetitions of the SPRT of every threshold:
+    - thresholds -> the p0 of the tests, p1 being shared
+    - accepted -> fraction of the repetitions accepting H1, for every threshold
+    - samples -> mean number of samples used by a test, for every threshold
+    - runs, hits -> all the trajectories simulated (shared by the thresholds), and those reaching the target
+    - seconds -> wall time
+    """
+
+    def __init__(self, thresholds, p1, accepted, samples, runs, hits, seconds):
+        self.thresholds = thresholds
+        self.p1 = p1
+        self.accepted = accepted
+        self.samples = samples
+        self.runs = runs
+        self.hits = hits
+        self.seconds = seconds
+
+    @property
+    def estimate(self):
+        return self.hits / self.runs if self.runs else float('nan')
+
+    def probabilities(self):
+        """{threshold: fraction accepting H1}, what estima_probabilites returns."""
+        return dict(zip(self.thresholds, self.accepted))
+
+    def interval(self, delta=0.05):
+        """Chernoff-Hoeffding confidence interval of the probability, at level 1 - delta, from all the runs."""
+        return hoeffding_interval(self.hits, self.runs, delta)
+
+    def verdicts(self, delta=0.05):
+        """{threshold: 'above', 'below' or 'inside'}, where the probability is compared with the confidence interval."""
+        low, high = self.interval(delta)
+        return {t: 'above' if low > t else 'below' if high < t else 'inside' for t in self.thresholds}
+
+    def __repr__(self):
+        return f"SweepResult({self.probabilities()}, runs={self.runs}, seconds={self.seconds:.3g})"
+
+
+class Runner:
+    """
+    Simulates batches of trajectories of one setup (model, target, num_transitions, scheduler) on a pool of
+    processes, the batches being numbered and seeded from one SeedSequence.
+
+    Parameters:
+    - model (CompiledMDP): The model.
+    - target: State index, or sequence of state indices, where the trajectories stop.
+    - num_transitions (int): Maximum number of transitions of every trajectory.
+    - scheduler: Adversary, choice index of every state, or None for the random adversary (see simulation.simulate_batch).
+    - seed: int, SeedSequence or None (the entropy is then kept in runner.seed.entropy to reproduce the run).
+    - workers (int): Number of processes, all the CPUs by default. With 1, batches run in this process.
+    - batch_size (int): Trajectories per batch.
+    """
+
+    def __init__(self, model, target, num_transitions=20, scheduler=None, seed=None, workers=None, batch_size=BATCH_SIZE):
+        self.seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.workers = max(1, os.cpu_count() if workers is None else workers)
+        self.batch_size = batch_size
+        self.next_batch = 0 # Index of the next batch, every batch used gets a new stream
+        model.alias_table() # Built before the workers start, so that they share it
+        self._setup = (model, target, num_transitions, scheduler)
+        self._pool = None
+        if self.workers > 1:
+            method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+            context = multiprocessing.get_context(method)
+            self._stop = context.Event()
+            self._pool = context.Pool(self.workers, _init_worker, (self._stop,) + self._setup)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def batch_seed(self, index):
+        """SeedSequence of a batch, the same as self.seed.spawn would give for its index."""
+        return np.random.SeedSequence(self.seed.entropy, spawn_key=self.seed.spawn_key + (index,),
+                                      pool_size=self.seed.pool_size)
+
+    def batches(self, sizes, outcomes=False):
+        """
+        Simulates batches of the given sizes (an iterable, which may be endless) and yields their
+        (runs, hits, steps) in order, or with outcomes the boolean array of the trajectories reaching the target.
+
+        At most LOOKAHEAD batches per worker are started ahead of the one being yielded. When the caller
+        closes the generator, the workers skip the queued batches, and the streams of the batches it didn't
+        receive are used again by the next call.
+        """
+        index = self.next_batch
+        if self._pool is None:
+            for n in sizes:
+                result = _simulate(self._setup, self.batch_seed(index), n, outcomes)
+                index += 1
+                self.next_batch = index
+                yield np.unpackbits(result, count=n).astype(bool) if outcomes else result
+            return
+
+        sizes = iter(sizes)
+        pending = collections.deque()
+        submitted = index
+        try:
+            while True:
+                while len(pending) < LOOKAHEAD * self.workers:
+                    n = next(sizes, None)
+                    if n is None:
+                        break
+                    pending.append((n, self._pool.apply_async(_run_batch, ((self.batch_seed(submitted), n, outcomes),))))
+                    submitted += 1
+                if not pending:
+                    return
+                n, result = pending.popleft()
+                result = result.get()
+                index += 1
+                self.next_batch = index
+                yield np.unpackbits(result, count=n).astype(bool) if outcomes else result
+        finally:
+            if pending: # Stopped early: the workers drop what is queued, and only finish the batches they are on
+                self._stop.set()
+                for _, result in pending:
+                    result.wait()
+                self._stop.clear()
+
+    def sizes(self, runs):
+        """Batch sizes for a number of runs."""
+        full, rest = divmod(runs, self.batch_size)
+        return [self.batch_size] * full + ([rest] if rest else [])
+
+    def estimate(self, runs):
+        """
+        Simulates runs trajectories.
+
+        Returns:
+        - SMCResult
+        """
+        start = time.perf_counter()
+        result = SMCResult()
+        for counts in self.batches(self.sizes(runs)):
+            result.add(counts)
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def sprt(self, p0, p1, alpha, beta, max_samples=None, first_batch=SPRT_FIRST_BATCH):
+        """
+        Wald's sequential test of H0: p <= p0 against H1: p >= p1 (p0 < p1), p being the probability of
+        reaching the target. The log likelihood ratio of every sample of a batch is accumulated at once,
+        and the first sample crossing a boundary decides, as in the serial test. The batches still running
+        are then dropped.
+
+        Parameters:
+        - p0, p1 (float): Bounds of the indifference region.
+        - alpha (float): Probability of accepting H1 when H0 is true.
+        - beta (float): Probability of accepting H0 when H1 is true.
+        - max_samples (int): Samples after which the test gives up (decision None), no limit by default.
+        - first_batch (int): Size of the first batch, the next ones doubling up to batch_size.
+
+        Returns:
+        - SPRTResult
+
+        Raises:
+        - ValueError: Unless 0 <= p0 < p1 <= 1 and alpha, beta are in (0, 1) with alpha + beta < 1.
+        """
+        _check_sprt(p0, p1, alpha, beta)
+        start = time.perf_counter()
+        upper = np.log((1 - beta) / alpha) # Accept H1
+        lower = np.log(beta / (1 - alpha)) # Accept H0
+        success, failure = _log_ratios(p0, p1)
+
+        def sizes():
+            n, total = min(first_batch, self.batch_size), 0
+            while max_samples is None or total < max_samples:
+                n = n if max_samples is None else min(n, max_samples - total)
+                yield n
+                total += n
+                n = min(2 * n, self.batch_size)
+
+        log_ratio, samples, simulated, batches, decision = 0.0, 0, 0, 0, None
+        outcomes = self.batches(sizes(), outcomes=True)
+        try:
+            for hit in outcomes:
+                batches += 1
+                simulated += len(hit)
+                with np.errstate(invalid='ignore'): # inf - inf after an infinite ratio, which already decided
+                    ratios = log_ratio + np.cumsum(np.where(hit, success, failure))
+                crossed = np.flatnonzero((ratios >= upper) | (ratios <= lower))
+                if len(crossed):
+                    i = crossed[0]
+                    decision = 'H1' if ratios[i] >= upper else 'H0'
+                    samples += i + 1
+                    log_ratio = float(ratios[i])
+                    break
+                samples += len(hit)
+                log_ratio = float(ratios[-1])
+        finally:
+            outcomes.close()
+        return SPRTResult(decision, int(samples), simulated, batches, log_ratio, time.perf_counter() - start)
+
+    def adaptive(self, epsilon, delta=0.05, bound='wilson', max_runs=None, first_batch=SPRT_FIRST_BATCH, on_checkpoint=None):
+        """
+        Estimates the probability of reaching the target, stopping as soon as the confidence interval is
+        within epsilon of the estimate. Only the running counts are kept, so the memory doesn't depend on
+        the number of runs; the batches double from first_batch up to batch_size.
+
+        The interval is checked after every batch. As the number of runs then depends on the outcomes, the
+        error probability is split over the checkpoints (delta / 2^k at the k-th one) so that the final
+        interval keeps its level. The Hoeffding bound doesn't depend on the outcomes: it stops after the
+        prob_n_lancers number of runs (rounded up to a batch), with delta. Clopper-Pearson and Wilson
+        shrink faster when the probability is close to 0 or 1.
+
+        Parameters:
+        - epsilon (float): Largest distance between the estimate and the ends of the interval.
+        - delta (float): Error probability of the interval.
+        - bound (str): 'hoeffding', 'clopper-pearson' or 'wilson'.
+        - max_runs (int): Runs after which the estimation stops even if the interval is too wide.
+        - first_batch (int): Size of the first batch.
+        - on_checkpoint: Function called with (runs, estimate, low, high) after every batch.
+
+        Returns:
+        - AdaptiveResult
+        """
+        if bound not in BOUNDS:
+            raise ValueError(f"unknown bound {bound!r}, expected one of {list(BOUNDS)}")
+        start = time.perf_counter()
+        interval = BOUNDS[bound]
+        result = AdaptiveResult(bound, delta, epsilon)
+
+        def sizes(): # Counts the runs submitted, the batches started ahead included
+            n, total = min(first_batch, self.batch_size), 0
+            while max_runs is None or total < max_runs:
+                n = n if max_runs is None else min(n, max_runs - total)
+                yield n
+                total += n
+                n = min(2 * n, self.batch_size)
+
+        counts = self.batches(sizes())
+        try:
+            for k, batch in enumerate(counts, 1):
+                result.add(batch)
+                level = delta if bound == 'hoeffding' else delta / 2 ** k
+                result.low, result.high = interval(result.hits, result.runs, level)
+                checkpoint = (result.runs, result.estimate, result.low, result.high)
+                result.checkpoints.append(checkpoint)
+                if on_checkpoint is not None:
+                    on_checkpoint(*checkpoint)
+                if max(result.estimate - result.low, result.high - result.estimate) <= epsilon:
+                    result.converged = True
+                    break
+        finally:
+            counts.close()
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def outcomes(self, runs):
+        """Boolean array of runs trajectories, True where the target is reached."""
+        if runs == 0:
+            return np.zeros(0, dtype=bool)
+        return np.concatenate(list(self.batches(self.sizes(runs), outcomes=True)))
+
+    def sweep(self, thresholds, alpha, beta, num_simulations=1000, p1=None, max_samples=None):
+        """
+        Repeats num_simulations times the SPRT of p0 = threshold against p1 for every threshold, like
+        estima_probabilites in raport_final.ipynb, but on one stream of outcomes per repetition shared by
+        all the thresholds. The log likelihood ratio after k samples with h hits is h*log(p1/p0) +
+        (k-h)*log((1-p1)/(1-p0)), so the running hit counts are computed once and every threshold only
+        looks for its first boundary crossing. The streams are extended, block by block, while a test
+        of the repetition is undecided: a sweep costs about as much as its slowest test.
+
+        Parameters:
+        - thresholds (list): The p0 of the tests.
+        - alpha, beta (float): Error probabilities of every test.
+        - num_simulations (int): Repetitions of every test.
+        - p1 (float): Alternative hypothesis, max(thresholds) + 0.05 by default as in the notebook (halfway to 1
+                      when that is not below 1).
+        - max_samples (int): Samples after which an undecided test counts as not accepting H1.
+
+        Returns:
+        - SweepResult
+
+        Raises:
+        - ValueError: If a test is invalid (see sprt), or its log likelihood ratio undefined.
+        """
+        start = time.perf_counter()
+        thresholds = list(thresholds)
+        p0 = np.array(thresholds, dtype=float)[:, None]
+        if p1 is None:
+            top = max(thresholds)
+            p1 = top + 0.05 if top + 0.05 < 1 else (top + 1) / 2 # Below 1, so that a miss doesn't end every test
+        for threshold in thresholds:
+            _check_sprt(threshold, p1, alpha, beta)
+        success, failure = _log_ratios(p0, p1)
+        upper = np.log((1 - beta) / alpha)
+        lower = np.log(beta / (1 - alpha))
+
+        shape = (len(thresholds), num_simulations)
+        decision = np.zeros(shape, dtype=np.int8) # 1: H1, -1: H0, 0: undecided
+        samples = np.zeros(shape, dtype=np.int64)
+        hits = np.zeros(num_simulations, dtype=np.int64) # Running hit count and length of every stream
+        length = 0
+        runs = total_hits = 0
+        block = SWEEP_FIRST_BLOCK
+        while True:
+            open_tests = decision == 0
+            if max_samples is not None:
+                block = min(block, max_samples - length)
+            if not open_tests.any() or block <= 0:
+                break
+            streams = np.flatnonzero(open_tests.any(axis=0)) # Only the streams with an undecided test grow
+            outcome = self.outcomes(len(streams) * block).reshape(len(streams), block)
+            runs += outcome.size
+            total_hits += int(outcome.sum())
+            h = hits[streams, None] + np.cumsum(outcome, axis=1) # Hits after every sample of the block
+            k = length + np.arange(1, block + 1)
+            for t in range(len(thresholds)):
+                rows = open_tests[t, streams]
+                hit, miss = h[rows], k - h[rows]
+                with np.errstate(invalid='ignore'): # 0 * inf: no sample of that kind, no term
+                    ratio = np.where(hit > 0, success[t] * hit, 0.0) + np.where(miss > 0, failure[t] * miss, 0.0)
+                crossed = (ratio >= upper) | (ratio <= lower) | np.isnan(ratio)
+                done = crossed.any(axis=1)
+                first = crossed.argmax(axis=1)[done]
+                if np.isnan(ratio[done, first]).any(): # inf - inf can only come after a crossing
+                    raise ValueError(f"undefined log likelihood ratio in the SPRT of p0={thresholds[t]} against p1={p1}")
+                where = streams[rows][done]
+                decision[t, where] = np.where(ratio[done, first] >= upper, 1, -1)
+                samples[t, where] = length + first + 1
+            hits[streams] = h[:, -1]
+            length += block
+            block = min(2 * block, SWEEP_MAX_BLOCK)
+        samples[decision == 0] = length
+
+        accepted = (decision == 1).mean(axis=1)
+        return SweepResult(thresholds, p1, [float(a) for a in accepted], [float(m) for m in samples.mean(axis=1)],
+                           runs, total_hits, time.perf_counter() - start)
+
+
+def estimate_reachability(model, target, num_simulations=1000, num_transitions=20, seed=None, workers=None, batch_size=BATCH_SIZE):
+    """
+    Parallel version of simulation.estimate_reachability, reproducible for a given seed.
+
+    Returns:
+    - SMCResult
+    """
+    with Runner(model, target, num_transitions, seed=seed, workers=workers, batch_size=batch_size) as runner:
+        return runner.estimate(num_simulations)
+
+
+def sprt(model, target, p0, p1, alpha, beta, num_transitions=20, seed=None, workers=None, max_samples=None, batch_size=BATCH_SIZE):
+    """
+    Batched and parallel version of the SPRT function of raport_final.ipynb (see Runner.sprt).
+
+    Returns:
+    - SPRTResult, whose message is the string the notebook returns.
+    """
+    _check_sprt(p0, p1, alpha, beta) # Before the workers start
+    with Runner(model, target, num_transitions, seed=seed, workers=workers, batch_size=batch_size) as runner:
+        return runner.sprt(p0, p1, alpha, beta, max_samples)
+
+
+def sweep(model, target, seuils, alpha, beta, num_transitions=20, num_simulations=1000, seed=None, workers=None):
+    """
+    estima_probabilites of raport_final.ipynb, with every threshold tested on shared samples (see Runner.sweep).
+
+    Returns:
+    - SweepResult, whose probabilities() is the dictionary the notebook returns.
+    """
+    with Runner(model, target, num_transitions, seed=seed, workers=workers) as runner:
+        return runner.sweep(seuils, alpha, beta, num_simulations)
+
+
+def adaptive_estimate(model, target, epsilon, delta=0.05, bound='wilson', num_transitions=20, seed=None, workers=None,
+                      max_runs=None, on_checkpoint=None):
+    """
+    Streaming replacement of prob_n_lancers (remi.ipynb): see Runner.adaptive.
+
+    Returns:
+    - AdaptiveResult
+    """
+    with Runner(model, target, num_transitions, seed=seed, workers=workers) as runner:
+        return runner.adaptive(epsilon, delta, bound, max_runs, on_checkpoint=on_checkpoint)
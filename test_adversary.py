@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+import adversary
+import simulation
+
+'''
+Adversaries of adversary.py: the choices they make in the batch simulator, their memory, and the Markov
+chains they induce.
+'''
+
+MODEL = """
+States S0, S1, G, F, D;
+Actions a, b;
+S0[a] -> 1:S1 + 1:G;
+S0[b] -> 1:G + 1:F;
+S1[a] -> 3:G + 1:F;
+S1[b] -> 1:S0 + 1:D;
+G -> 1:G;
+F -> 1:F;
+"""
+
+LOOP = """
+States S0, G;
+Actions a, b;
+S0[a] -> 1:S0;
+S0[b] -> 1:G;
+G -> 1:G;
+"""
+
+
+@pytest.fixture
+def model(compile_mdp):
+    return compile_mdp(MODEL)
+
+
+def _bounded_reachability(chain, target, steps):
+    """Probability of reaching the target within steps transitions, on the induced chain."""
+    matrix = chain.matrix().tolil()
+    goal = chain.target_mask(target)
+    for s in np.flatnonzero(goal):
+        matrix.rows[s], matrix.data[s] = [s], [1.0]
+    x = goal.astype(float)
+    for _ in range(steps):
+        x = matrix.tocsr() @ x
+    return x[chain.first_state]
+
+
+def _within(estimate, p, n):
+    return abs(estimate - p) <= 5 * np.sqrt(max(p * (1 - p), 1e-4) / n)
+
+
+def test_deterministic(model):
+    S0, S1, G, F, D = range(5)
+    choice = [model.find_choice(S0, 'a'), model.find_choice(S1, 'b'), model.find_choice(G, 'NA'),
+              model.find_choice(F, 'NA'), -1]
+    scheduler = adversary.MemorylessDeterministic(choice)
+    assert scheduler.actions(model) == {'S0': 'a', 'S1': 'b', 'G': 'NA', 'F': 'NA'}
+    chain = scheduler.induced_chain(model)
+    assert chain.n_states == 5 and chain.first_state == S0
+    np.testing.assert_allclose(chain.matrix().toarray()[:2], [[0, .5, .5, 0, 0], [.5, 0, 0, 0, .5]])
+    assert chain.state_ptr[D] == chain.state_ptr[D + 1] # No choice, no successor
+    exact = _bounded_reachability(chain, G, 10)
+    result = simulation.simulate_batch(model, 40000, 10, G, rng=1, scheduler=scheduler)
+    assert _within(result.estimate, exact, result.n)
+    assert np.all(result.hit | np.isin(result.final_state, [D, S0, S1])) # D stops the walks, without successor
+
+
+def test_randomized(model):
+    G = model.state_index['G']
+    scheduler = adversary.MemorylessRandomized.uniform(model)
+    chain = scheduler.induced_chain(model)
+    dense = chain.matrix().toarray()
+    np.testing.assert_allclose(dense.sum(axis=1), [1, 1, 1, 1, 0])
+    np.testing.assert_allclose(dense[0], [0, .25, .5, .25, 0]) # G of both choices merged
+    np.testing.assert_allclose(dense[1], [.25, 0, .375, .125, .25])
+    exact = _bounded_reachability(chain, G, 12)
+    result = simulation.simulate_batch(model, 40000, 12, G, rng=2, scheduler=scheduler)
+    assert _within(result.estimate, exact, result.n)
+
+    probs = scheduler.choice_probs.copy()
+    probs[[model.find_choice(0, 'a'), model.find_choice(0, 'b')]] = 0.9, 0.1
+    biased = adversary.MemorylessRandomized(probs)
+    choice = biased.choose(model, np.zeros(40000, dtype=np.int64), None, np.random.default_rng(3))
+    assert _within(np.mean(choice == model.find_choice(0, 'a')), 0.9, len(choice))
+    assert np.all(biased.choose(model, np.array([4]), None, np.random.default_rng(3)) == -1)
+
+
+def test_memory(compile_mdp):
+    model = compile_mdp(LOOP)
+    S0, G = range(2)
+    stay, leave = model.find_choice(S0, 'a'), model.find_choice(S0, 'b')
+    g = model.find_choice(G, 'NA')
+    # Mode 0 stays once, then mode 1 leaves: no memoryless adversary reaches G in exactly two steps
+    scheduler = adversary.FiniteMemory([[stay, g], [leave, g]], [[1, 1], [1, 1]])
+    result = simulation.simulate_batch(model, 1000, 10, G, rng=4, scheduler=scheduler)
+    assert result.hit.all() and np.all(result.hitting_time == 2)
+    chain = scheduler.induced_chain(model)
+    assert chain.n_states == 4 and chain.first_state == S0
+    assert chain.model_state.tolist() == [S0, G, S0, G]
+    np.testing.assert_allclose(chain.matrix().toarray()[[0, 2]], [[0, 0, 1, 0], [0, 0, 0, 1]])
+    assert _bounded_reachability(chain, G, 1) == 0 and _bounded_reachability(chain, G, 2) == 1
+
+    cycle = adversary.FiniteMemory.from_memoryless([adversary.MemorylessDeterministic([stay, g])] * 2
+                                                   + [adversary.MemorylessDeterministic([leave, g])])
+    result = simulation.simulate_batch(model, 100, 10, G, rng=5, scheduler=cycle)
+    assert np.all(result.hitting_time == 3)
+
+
+def test_preferences_and_random_choices(model):
+    scheduler = adversary.MemorylessDeterministic.from_preferences(model, {'S0': ['b', 'a'], 'S1': ['c', 'b'], 'X': ['a']})
+    assert scheduler.actions(model) == {'S0': 'b', 'S1': 'b', 'G': 'NA', 'F': 'NA'}
+    rows = adversary.random_choices(model, 2000, rng=6)
+    assert rows.shape == (2000, 5) and np.all(rows[:, 4] == -1)
+    for s in range(4):
+        assert set(rows[:, s]) == set(model.choices(s))
+    assert adversary.as_adversary(scheduler) is scheduler
+    assert adversary.as_adversary(rows[0]).choice.tolist() == rows[0].tolist()
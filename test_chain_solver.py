@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+import mdp
+from chain_solver import METHODS, solve_reachability
+
+'''
+The methods of chain_solver.py agree with each other, with a dense solve of the whole chain and with the
+known values of the example chains.
+'''
+
+
+def _dense_reference(model, target):
+    """Probabilities of reaching the target from a dense numpy solve, the states that can't reach it at 0."""
+    n = model.n_states
+    P = np.zeros((n, n))
+    np.add.at(P, (model.choice_state[model.transition_choice], model.targets), model.probs)
+    reach = np.zeros(n, dtype=bool)
+    reach[target] = True
+    while True:
+        new = reach | (P[:, reach] > 0).any(axis=1)
+        if np.array_equal(new, reach):
+            break
+        reach = new
+    solve = np.flatnonzero(reach & (np.arange(n) != target))
+    x = np.zeros(n)
+    x[target] = 1.0
+    x[solve] = np.linalg.solve(np.eye(len(solve)) - P[np.ix_(solve, solve)], P[solve, target])
+    return x
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_chains(random_model, seed):
+    model = random_model(5 + 7 * seed, branching=2 + seed % 2, seed=seed, markov_chain=True, sinks=2 + seed % 2)
+    target = model.n_states - 1
+    reference = _dense_reference(model, target)
+    for method in METHODS:
+        solution = solve_reachability(model, target, method)
+        assert solution.method == method and solution.converged
+        np.testing.assert_allclose(solution.values, reference, atol=1e-8, err_msg=method)
+    assert solve_reachability(model, target).method in METHODS
+
+
+@pytest.mark.parametrize("path, start, target, value", [
+    ("mdp_examples/lancer_de_pieces.mdp", "I", "F4", 1 / 6), # Knuth's die from fair coins
+    ("mdp_examples/craps.mdp", "I", "G", 244 / 495),
+])
+def test_examples(path, start, target, value):
+    _, model, _, _ = mdp.load(path, "native", cache=False, need_printer=False, verbose=False)
+    for method in METHODS:
+        values = solve_reachability(model, model.state_index[target], method).values
+        assert values[model.state_index[start]] == pytest.approx(value, abs=1e-9), method
+
+
+def test_rejects_an_mdp(compile_mdp):
+    model = compile_mdp("States S0, S1;\nActions a, b;\nS0[a] -> 1:S1;\nS0[b] -> 1:S0;\nS1 -> 1:S1;\n")
+    with pytest.raises(ValueError):
+        solve_reachability(model, 1)
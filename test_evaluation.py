@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+import adversary
+import evaluation
+import mdp_generator
+
+'''
+Exact values of batches of adversaries (evaluation.py), against values worked out by hand and against the
+induced chains solved one at a time.
+'''
+
+MODEL = """
+States S0, S1, G, F;
+Rewards S0 : 2, S1 : 1, G : 0, F : 0;
+Actions a, b;
+S0[a] -> 1:S1 + 1:G;
+S0[b] -> 1:G + 1:F;
+S1[a] -> 3:G + 1:F;
+S1[b] -> 1:S0 + 1:G;
+G -> 1:G;
+F -> 1:F;
+"""
+
+
+@pytest.fixture
+def model(compile_mdp):
+    return compile_mdp(MODEL)
+
+
+def _choices(model, actions):
+    """(k, states) array of the adversaries given as (action of S0, action of S1)."""
+    return np.array([[model.find_choice(0, a0), model.find_choice(1, a1), model.find_choice(2, 'NA'),
+                      model.find_choice(3, 'NA')] for a0, a1 in actions])
+
+
+def test_by_hand(model):
+    G = model.state_index['G']
+    choices = _choices(model, [('a', 'a'), ('a', 'b'), ('b', 'a'), ('b', 'b')])
+    np.testing.assert_allclose(evaluation.evaluate(model, choices, G, workers=1), [7 / 8, 1, 1 / 2, 1 / 2])
+    # Only (a, b) reaches G surely: x0 = 2 + x1/2, x1 = 1 + x0/2
+    np.testing.assert_allclose(evaluation.evaluate(model, choices, G, 'reward', workers=1), [np.inf, 10 / 3, np.inf, np.inf])
+    objects = [adversary.MemorylessDeterministic(c) for c in choices]
+    np.testing.assert_allclose(evaluation.evaluate(model, objects, G, workers=1), [7 / 8, 1, 1 / 2, 1 / 2])
+    order, values = evaluation.rank(model, choices, G, workers=1)
+    assert order.tolist() == [1, 0, 2, 3] and values[0] == pytest.approx(1)
+    order, _ = evaluation.rank(model, choices, G, 'reward', workers=1, maximize=False)
+    assert order[0] == 1
+
+
+def test_chains(model):
+    G = model.state_index['G']
+    stay, leave = _choices(model, [('a', 'b'), ('b', 'b')])
+    # Uniform: x0 = 1/2 + x1/4, x1 = 5/8 + x0/4
+    memory = adversary.FiniteMemory.from_memoryless([adversary.MemorylessDeterministic(stay),
+                                                     adversary.MemorylessDeterministic(leave)])
+    values = evaluation.evaluate(model, [adversary.MemorylessRandomized.uniform(model), memory], G, workers=1)
+    # With memory, S0 takes a at steps 0, 2, ... and b at steps 1, 3, ... (S0 is only entered at even steps)
+    np.testing.assert_allclose(values, [0.7, 1])
+
+
+def test_chunks_and_workers():
+    model = mdp_generator.random_mdp(40, n_actions=3, branching=2, seed=3, rewards=True).to_compiled()
+    target = [0, 1]
+    choices = adversary.random_choices(model, 60, rng=1)
+    expected = []
+    for row in choices:
+        chain = adversary.MemorylessDeterministic(row).induced_chain(model)
+        expected.append(evaluation.solve_chain(chain.matrix(), chain.target_mask(target))[chain.first_state])
+    for objective in evaluation.OBJECTIVES:
+        whole = evaluation.evaluate(model, choices, target, objective, workers=1)
+        chunked = evaluation.evaluate(model, choices, target, objective, workers=2, chunk_states=7 * model.n_states)
+        np.testing.assert_array_equal(whole, chunked)
+    np.testing.assert_allclose(evaluation.evaluate(model, choices, target, workers=1), expected)
+    with pytest.raises(ValueError):
+        evaluation.evaluate(model, choices, target, 'average')
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+import adversary
+import importance
+import mdp_generator
+import simulation
+from mdp_model import AliasTable
+
+'''
+Importance sampling (importance.py, simulate_batch with a proposal): the weighted estimates are unbiased
+whatever the proposal, and the tilted one makes rare events cheap.
+'''
+
+
+def _exact(model, target, steps, scheduler=None):
+    return importance.approximate_values(model, target, steps, scheduler)[model.first_state]
+
+
+def _uniform_proposal(model):
+    """Every successor of a choice equally likely, far from the model probabilities."""
+    degree = np.diff(model.choice_ptr)
+    return 1.0 / np.repeat(degree, degree)
+
+
+def test_rare_event():
+    game = mdp_generator.chain(18, forward=1, backward=3, fail=1) # Drifts away from T
+    model = game.to_compiled()
+    p = _exact(model, game.goal, 200)
+    assert p < 1e-6
+    assert simulation.simulate_batch(model, 20000, 200, game.goal, rng=0).hit.sum() == 0
+    result = importance.estimate(model, game.goal, 20000, 200, rng=1)
+    assert result.hits > 10000 and result.relative_error < 0.05
+    assert abs(result.estimate - p) < 5 * result.std_error
+    low, high = result.interval()
+    assert high - low == pytest.approx(2 * importance.Z_95 * result.std_error)
+
+
+@pytest.mark.parametrize("as_table", [False, True])
+def test_unbiased_with_any_proposal(as_table):
+    game = mdp_generator.chain(8, forward=1, backward=2, fail=1)
+    model = game.to_compiled()
+    proposal = _uniform_proposal(model)
+    if as_table:
+        proposal = AliasTable(model.choice_ptr, model.targets, proposal)
+    result = simulation.simulate_batch(model, 100000, 40, game.goal, rng=2, proposal=proposal)
+    weighted = result.hit * result.likelihood
+    assert abs(result.estimate - _exact(model, game.goal, 40)) < 5 * weighted.std() / np.sqrt(result.n)
+    assert np.all(result.likelihood > 0)
+
+
+def test_likelihood_of_a_path(compile_mdp):
+    model = compile_mdp("States S0, S1, T;\nActions a;\nS0 -> 1:S1 + 3:S0;\nS1 -> 1:T + 1:S0;\nT -> 1:T;\n")
+    result = simulation.simulate_batch(model, 5000, 30, 2, rng=3, proposal=_uniform_proposal(model))
+    # Under the uniform proposal a step from S0 has ratio 1/2 to S1 and 3/2 to S0; from S1 both are 1
+    assert np.any(result.hit & (result.length == 2)) and np.any(result.hit & (result.length == 3))
+    np.testing.assert_allclose(result.likelihood[result.hit & (result.length == 2)], 0.5) # S0 S1 T
+    np.testing.assert_allclose(result.likelihood[result.hit & (result.length == 3)], 0.75) # S0 S0 S1 T
+
+
+def test_mdp_with_a_scheduler():
+    model = mdp_generator.random_mdp(30, n_actions=2, branching=3, seed=4).to_compiled()
+    scheduler = adversary.random_choices(model, 1, rng=5)[0]
+    target = [1, 2]
+    p = _exact(model, target, 15, scheduler)
+    result = importance.estimate(model, target, 50000, 15, rng=6, scheduler=scheduler)
+    plain = importance.estimate(model, target, 50000, 15, proposal=None, rng=6, scheduler=scheduler)
+    assert abs(result.estimate - p) < 5 * result.std_error
+    assert abs(plain.estimate - p) < 5 * plain.std_error and plain.hits == round(plain.estimate * plain.n)
+    assert result.std_error <= plain.std_error
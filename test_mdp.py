@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from mdp import run
+
+'''
+Transition tables (transactions, transactions_prob) the listener of mdp.py builds from a .mdp file.
+'''
+
+TABLES = """
+States S0, S1, S2;
+Actions a, b;
+S0[a] -> 1:S1 + 3:S2;
+S0[b] -> 2:S0 + 2:S1 + 5:S1;
+S1 -> 1:S2 + 1:X;
+S2 -> 1:S2;
+S0[a] -> 1:S0;
+"""
+
+
+@pytest.fixture
+def printer(tmp_path):
+    path = tmp_path / "tables.mdp"
+    path.write_text(TABLES)
+    return run(str(path), return_printer=True)
+
+
+def test_one_row_per_choice(printer):
+    table = printer.transactions
+    assert list(table.columns) == ['Origin', 'Action', 'S0', 'S1', 'S2', 'X'] # Undeclared X comes last
+    assert list(zip(table['Origin'], table['Action'])) == [('S0', 'a'), ('S0', 'b'), ('S1', 'NA'), ('S2', 'NA')]
+    weights = table.iloc[:, 2:].to_numpy(dtype=float)
+    # Missing targets are NaN, and a repeated target keeps its last weight
+    np.testing.assert_array_equal(weights, [[np.nan, 1, 3, np.nan], [2, 5, np.nan, np.nan],
+                                            [np.nan, np.nan, 1, 1], [np.nan, np.nan, 1, np.nan]])
+
+
+def test_probabilities(printer):
+    table = printer.transactions_prob
+    assert list(table.columns) == ['Origin', 'Action', 'S0', 'S1', 'S2', 'X']
+    np.testing.assert_allclose(table.iloc[:, 2:].to_numpy(dtype=float),
+                               [[0, 1 / 4, 3 / 4, 0], [2 / 7, 5 / 7, 0, 0], [0, 0, 1 / 2, 1 / 2], [0, 0, 1, 0]])
+
+
+def test_diagnostics(printer):
+    assert printer.declared_states == ['S0', 'S1', 'S2', 'X']
+    assert printer.first_state == 'S0'
+    assert len(printer.errors) == 0
+    # The repeated S0[a] and the undeclared X, then the four missing rewards
+    assert len(printer.warnings) == 6
+    assert "S0 with action a has already been defined" in printer.warnings[1]
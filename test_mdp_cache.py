@@ -0,0 +1,109 @@
+import os
+import numpy as np
+import pytest
+import mdp
+import mdp_cache
+
+'''
+The on-disk cache of parsed files (mdp_cache.py): hits, invalidation when the content or the parser version
+changes, least recently used eviction and MDP_CACHE=0.
+'''
+
+EXAMPLE = "prof_examples/simu-mdp.mdp"
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "model.mdp"
+    with open(EXAMPLE) as f:
+        path.write_text(f.read())
+    return str(path)
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Paths the parser is called on."""
+    calls = []
+    parse = mdp.parse
+
+    def counting(path, *args, **kwargs):
+        calls.append(path)
+        return parse(path, *args, **kwargs)
+
+    monkeypatch.setattr(mdp, 'parse', counting)
+    return calls
+
+
+def _entries(cache_dir):
+    return sorted(e for e in os.listdir(cache_dir) if not e.startswith('.')) if os.path.isdir(cache_dir) else []
+
+
+def test_hit(path, parses, cache_dir):
+    printer, model = mdp.run(path, return_printer=True, return_model=True, cache=True)
+    cached_printer, cached = mdp.run(path, return_printer=True, return_model=True, cache=True)
+    assert parses == [path]
+    assert len(_entries(cache_dir)) == 1
+    assert cached.state_names == model.state_names and cached.first_state == model.first_state
+    for name in mdp_cache.MODEL_ARRAYS:
+        assert np.array_equal(getattr(cached, name), getattr(model, name)), name
+    assert cached_printer.transactions_prob.equals(printer.transactions_prob)
+    assert cached_printer.warnings == printer.warnings and cached_printer.errors == printer.errors
+
+
+def test_content_change(path, parses, cache_dir):
+    mdp.run(path, return_model=True, cache=True)
+    with open(path, 'a') as f:
+        f.write("\n")
+    mdp.run(path, return_model=True, cache=True)
+    assert parses == [path, path]
+    assert len(_entries(cache_dir)) == 2
+
+
+def test_parser_version_change(path, parses, monkeypatch):
+    mdp.run(path, return_model=True, cache=True)
+    monkeypatch.setattr(mdp, 'PARSER_VERSION', mdp.PARSER_VERSION + "-test")
+    mdp.run(path, return_model=True, cache=True)
+    assert parses == [path, path]
+    mdp.run(path, return_model=True, cache=True)
+    assert parses == [path, path]
+
+
+def test_disabled(path, parses, cache_dir, monkeypatch):
+    monkeypatch.setenv('MDP_CACHE', '0')
+    mdp.run(path, return_model=True, cache=True)
+    mdp.run(path, return_model=True, cache=True)
+    assert parses == [path, path]
+    assert not os.path.exists(cache_dir)
+    monkeypatch.delenv('MDP_CACHE')
+    mdp.run(path, return_model=True, cache=False)
+    mdp.run(path, return_model=True) # The library only uses the cache when asked to
+    assert not os.path.exists(cache_dir)
+
+
+def test_least_recently_used_eviction(tmp_path, cache_dir):
+    keys = []
+    for k in range(3):
+        path = tmp_path / f"model{k}.mdp"
+        path.write_text(f"States S0, S{k + 1};\nActions a;\nS0[a] -> 1:S{k + 1};\nS{k + 1} -> 1:S0;\n")
+        mdp.run(str(path), return_model=True, cache=True)
+        keys.append(mdp_cache.file_key(str(path), mdp.PARSER_VERSION))
+    for age, key in zip((300, 200, 100), keys): # Oldest first
+        names = os.path.join(cache_dir, key, 'names.json')
+        os.utime(names, (os.stat(names).st_atime, os.stat(names).st_mtime - age))
+    assert mdp_cache.lookup(keys[0]) is not None # Used again: now the most recent
+    size = max(mdp_cache._size(os.path.join(cache_dir, key)) for key in keys)
+    mdp_cache.evict(2 * size)
+    assert _entries(cache_dir) == sorted([keys[0], keys[2]])
+    mdp_cache.evict(0)
+    assert _entries(cache_dir) == []
+
+
+def test_syntax_errors_not_cached(tmp_path, parses, cache_dir):
+    # ANTLR recovers from the syntax error of line 5, the native reader falls back to it
+    path = tmp_path / "recovered.mdp"
+    with open("mdp_examples/smaysurenever.mdp") as f:
+        path.write_text(f.read())
+    for backend in ("antlr", "native", "antlr"):
+        printer = mdp.run(str(path), return_printer=True, backend=backend, cache=True)
+        assert printer.syntax_errors and printer.syntax_errors[0].startswith("line 5:")
+    assert len(parses) == 3 and _entries(cache_dir) == []
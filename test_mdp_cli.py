@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+import mdp_cli
+
+'''
+Subcommands and exit status of the command line entry point (mdp_cli.py), and the modules it leaves unloaded.
+'''
+
+
+def test_check(capsys):
+    assert mdp_cli.main(['check', 'prof_examples/simu-mdp.mdp']) == 0
+    assert "prof_examples/simu-mdp.mdp: ok (16 states" in capsys.readouterr().out
+
+
+def test_check_errors(capsys):
+    # fichier4-prob.mdp has errors, smaysurenever.mdp a syntax error ANTLR recovers from
+    assert mdp_cli.main(['check', '--json', 'prof_examples/fichier4-prob.mdp', 'mdp_examples/smaysurenever.mdp']) == 1
+    errors, syntax = json.loads(capsys.readouterr().out)
+    assert errors['status'] == 'error' and any(d['severity'] == 'error' for d in errors['diagnostics'])
+    assert syntax['status'] == 'error' and syntax['syntax_errors'][0].startswith('line 5:')
+    assert mdp_cli.main(['check', '--json', '--backend', 'native', 'mdp_examples/smaysurenever.mdp']) == 1
+    native, = json.loads(capsys.readouterr().out) # Through the ANTLR fallback of the native reader
+    assert native['syntax_errors'] == syntax['syntax_errors']
+
+
+def test_check_strict(capsys):
+    # mdp_examples/simple_mdp.mdp only has warnings (no rewards)
+    assert mdp_cli.main(['check', '-q', 'mdp_examples/simple_mdp.mdp']) == 0
+    assert mdp_cli.main(['check', '-q', '--strict', 'mdp_examples/simple_mdp.mdp']) == 1
+    assert capsys.readouterr().out == ""
+
+
+def test_missing_file(capsys):
+    assert mdp_cli.main(['check', 'no/such/file.mdp']) == 1
+    assert "no/such/file.mdp: error:" in capsys.readouterr().out
+
+
+def test_cache(cache_dir):
+    assert mdp_cli.main(['check', '-q', '--no-cache', 'prof_examples/simu-mdp.mdp']) == 0
+    assert not os.path.exists(cache_dir)
+    assert mdp_cli.main(['check', '-q', 'prof_examples/simu-mdp.mdp']) == 0 # On by default, unlike mdp.load
+    assert os.listdir(cache_dir)
+
+
+def test_solve(capsys):
+    assert mdp_cli.main(['solve', 'mdp_examples/craps.mdp', '--target', 'G']) == 0
+    state, value = capsys.readouterr().out.split()
+    assert state == 'I' and float(value) == pytest.approx(244 / 495, abs=1e-6)
+
+
+def test_unknown_target(capsys):
+    with pytest.raises(SystemExit) as exit:
+        mdp_cli.main(['solve', 'mdp_examples/craps.mdp', '--target', 'nowhere'])
+    assert exit.value.code == 2 and "error: unknown state nowhere" in capsys.readouterr().err
+
+
+def test_seeded_estimate(capsys):
+    args = ['estimate', 'mdp_examples/craps.mdp', '--target', 'G', '--runs', '2000', '--steps', '50', '--seed', '3']
+    assert mdp_cli.main(args) == 0 and mdp_cli.main(args) == 0
+    first, second = capsys.readouterr().out.splitlines()
+    assert first == second and first.startswith("Target state G was found in")
+
+
+def test_sprt_bad_parameters(capsys):
+    assert mdp_cli.main(['sprt', 'mdp_examples/craps.mdp', '--target', 'G', '--p0', '0.6', '--p1', '0.5', '--workers', '1']) == 2
+    assert "error: the SPRT needs 0 <= p0 < p1 <= 1" in capsys.readouterr().err
+
+
+def test_lazy_imports():
+    code = ("import sys, mdp_cli; mdp_cli.main(['check', '-q', 'prof_examples/simu-mdp.mdp']); "
+            "print(sorted(m for m in ('pandas', 'scipy', 'tkinter', 'matplotlib', 'antlr4') if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,106 @@
+import glob
+import numpy as np
+import pytest
+import simulation
+from mdp import run
+from mdp_model import NO_ACTION, AliasTable
+
+'''
+CompiledMDP (mdp_model.py) against the transactions_prob table it is compiled from, and the alias tables
+sampling its successors.
+'''
+
+EXAMPLES = sorted(glob.glob("prof_examples/*.mdp") + glob.glob("mdp_examples/*.mdp"))
+
+
+@pytest.mark.parametrize("path", EXAMPLES)
+def test_same_probabilities_as_the_table(path):
+    printer, model = run(path, return_printer=True, return_model=True)
+    table = printer.transactions_prob
+    assert model.state_names == printer.declared_states
+    assert model.state_names[model.first_state] == printer.first_state
+    assert model.n_choices == len(table)
+    choice_state = model.choice_state
+    assert np.all(np.diff(choice_state) >= 0) # Choices grouped by state
+    for c in range(model.n_choices):
+        row = table.iloc[model.choice_row[c]]
+        assert row['Origin'] == model.state_names[choice_state[c]]
+        assert row['Action'] == model.action_name(c)
+        dense = np.zeros(model.n_states)
+        targets, probs = model.successors(c)
+        dense[targets] = probs
+        np.testing.assert_allclose(dense, row[model.state_names].to_numpy(dtype=float))
+        assert np.all(probs > 0)
+
+
+def test_lookups(tmp_path):
+    path = tmp_path / "lookups.mdp"
+    path.write_text("States S0, S1, S2;\nActions a, b;\nS0[b] -> 1:S1 + 0:S2;\nS0[a] -> 1:S2;\nS1 -> 1:S1;\n"
+                    "S2 -> 1:S0;\n")
+    model = run(str(path), return_model=True)
+    assert list(model.choices(0)) == [0, 1] and model.action_name(0) == 'b' # File order inside a state
+    assert model.find_choice(0, 'a') == 1 and model.find_choice(0, 'NA') is None
+    assert model.find_choice(1, 'NA') == 2 and model.choice_action[2] == NO_ACTION
+    assert model.successors(0)[0].tolist() == [1] # The zero weight is dropped
+    assert not model.is_markov_chain()
+
+
+def _random_rows(seed, n_rows=50, max_degree=12):
+    rng = np.random.default_rng(seed)
+    degree = rng.integers(1, max_degree + 1, n_rows)
+    row_ptr = np.concatenate([[0], np.cumsum(degree)])
+    weights = rng.integers(1, 20, row_ptr[-1]).astype(float)
+    weights[rng.random(row_ptr[-1]) < 0.3] *= 50 # Some large entries, so that rows have aliases
+    return row_ptr, weights
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_alias_tables_are_exact(seed):
+    row_ptr, weights = _random_rows(seed)
+    table = AliasTable(row_ptr, np.arange(len(weights)), weights)
+    # Entry e of a row of degree d is drawn with probability (cutoff of slot e + sum of 1 - cutoff over the
+    # slots whose alias is e) / d
+    degree = np.diff(row_ptr)[np.repeat(np.arange(len(row_ptr) - 1), np.diff(row_ptr))]
+    drawn = (table.cutoff + np.bincount(table.alias, weights=1 - table.cutoff, minlength=len(weights))) / degree
+    totals = np.add.reduceat(weights, row_ptr[:-1])
+    expected = weights / np.repeat(totals, np.diff(row_ptr))
+    np.testing.assert_allclose(drawn, expected, atol=1e-12)
+    np.testing.assert_allclose(table.probs, expected)
+
+
+def test_alias_sampling_frequencies():
+    from scipy.stats import chisquare
+    row_ptr, weights = _random_rows(7, n_rows=20)
+    table = AliasTable(row_ptr, np.arange(len(weights)), weights)
+    rng = np.random.default_rng(8)
+    n = 20000
+    for row in range(len(row_ptr) - 1):
+        entries = table.sample(np.full(n, row), rng)
+        ones = np.array([table.sample_one(row, rng) for _ in range(n // 10)])
+        for drawn in (entries, ones):
+            counts = np.bincount(drawn - row_ptr[row], minlength=table.size(row))
+            assert len(counts) == table.size(row) # Never outside the row
+            if table.size(row) > 1:
+                assert chisquare(counts, len(drawn) * table.probs[row_ptr[row]:row_ptr[row + 1]]).pvalue > 1e-4
+
+
+def test_alias_table_of_a_dataframe():
+    import pandas as pd
+    df = pd.DataFrame({'S0': [0.25, np.nan], 'S1': [np.nan, 1.0], 'S2': [0.75, np.nan]})
+    table = AliasTable.from_dataframe(df)
+    assert table.row_ptr.tolist() == [0, 2, 3] and table.targets.tolist() == [0, 2, 1]
+    np.testing.assert_allclose(table.probs, [0.25, 0.75, 1.0])
+
+
+def test_alias_rows_without_entries(compile_mdp):
+    table = AliasTable(np.array([0, 2, 2, 3]), np.arange(3), np.array([1.0, 3.0, 1.0]))
+    rng = np.random.default_rng(9)
+    drawn = table.sample(np.array([0, 1, 2, 1] * 100), rng).reshape(100, 4)
+    assert np.all(drawn[:, 1] == -1) and np.all(drawn[:, 3] == -1)
+    assert set(drawn[:, 0]) == {0, 1} and np.all(drawn[:, 2] == 2)
+    assert table.sample(np.array([1, 1]), rng).tolist() == [-1, -1]
+    assert table.sample_one(1, rng) == -1 and table.sample_one(2, rng) == 2
+    # B -> 0:C compiles to a choice without successors: the walk stops there
+    model = compile_mdp("States A, B, C;\nActions a;\nA -> 1:B;\nB -> 0:C;\nC -> 1:C;\n")
+    states, choices = simulation.walk(model, 10, rng=1)
+    assert [model.state_names[s] for s in states] == ['A', 'B'] and len(choices) == 1
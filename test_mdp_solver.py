@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+import mdp
+from evaluation import solve_chain
+from mdp_solver import METHODS, solve_reachability
+from precomputation import partition
+
+'''
+The methods of mdp_solver.py agree with the linear program of the textbook for the maximum and the minimum,
+their schedulers achieve the values they give, and the bounds of interval iteration enclose the exact values
+within epsilon.
+'''
+
+EXAMPLES = [("prof_examples/fichier3-mdp.mdp", "S1"), ("prof_examples/simu-mdp.mdp", "W"),
+            ("mdp_examples/exemple_cours_c2p40_mdp.mdp", "F"), ("mdp_examples/chemin_plus_court_arriver_en_f.mdp", "S3")]
+
+
+def _lp_reachability(model, target, minimize=False):
+    """
+    Reference maximal (or minimal) reachability probabilities from the linear program of the textbook
+    (scipy linprog): min sum x with x(s) >= sum p(c -> t) x(t) for every choice c of s, for the maximum, and
+    max sum x with <= for the minimum, over the S_may states.
+    """
+    from scipy.optimize import linprog
+    sure, may, _ = partition(model, target, minimize)
+    index = np.full(model.n_states, -1)
+    index[may] = np.arange(np.count_nonzero(may))
+    rows = [c for c in range(model.n_choices) if may[model.choice_state[c]]]
+    A = np.zeros((len(rows), np.count_nonzero(may)))
+    b = np.zeros(len(rows))
+    for i, c in enumerate(rows):
+        A[i, index[model.choice_state[c]]] -= 1
+        for e in range(model.choice_ptr[c], model.choice_ptr[c + 1]):
+            t = model.targets[e]
+            if may[t]:
+                A[i, index[t]] += model.probs[e]
+            else:
+                b[i] += model.probs[e] * sure[t]
+    # sum p x + b <= x(s) for the maximum, x(s) <= sum p x + b for the minimum
+    sign = -1 if minimize else 1
+    values = sure.astype(np.float64)
+    if len(rows):
+        result = linprog(sign * np.ones(A.shape[1]), A_ub=sign * A, b_ub=-sign * b, bounds=(0, 1))
+        assert result.success, result.message
+        values[may] = result.x
+    return values
+
+
+def _models():
+    for seed in range(8):
+        yield pytest.param(('random', 6 + 5 * seed, seed), id=f"random-{seed}")
+    for path, target in EXAMPLES:
+        yield pytest.param(('file', path, target), id=path)
+
+
+@pytest.fixture(params=list(_models()))
+def problem(request, random_model):
+    kind, a, b = request.param
+    if kind == 'random':
+        model = random_model(a, n_actions=2 + b % 2, branching=3, seed=b, sinks=2 + b % 2)
+        return model, model.n_states - 1
+    _, model, _, _ = mdp.load(a, "native", cache=False, need_printer=False, verbose=False)
+    return model, model.state_index[b]
+
+
+@pytest.mark.parametrize("minimize", [False, True])
+def test_methods_agree_with_the_lp(problem, minimize):
+    model, target = problem
+    reference = _lp_reachability(model, target, minimize)
+    for method in METHODS:
+        solution = solve_reachability(model, target, minimize, method)
+        assert solution.converged, method
+        np.testing.assert_allclose(solution.values, reference, atol=1e-6, err_msg=method)
+
+
+@pytest.mark.parametrize("minimize", [False, True])
+def test_schedulers_achieve_the_values(problem, minimize):
+    model, target = problem
+    reference = _lp_reachability(model, target, minimize)
+    for method in METHODS:
+        chain = solve_reachability(model, target, minimize, method).adversary().induced_chain(model)
+        values = solve_chain(chain.matrix(), chain.target_mask(target))
+        np.testing.assert_allclose(values, reference, atol=1e-6, err_msg=method)
+
+
+def test_end_component(end_component):
+    model = end_component
+    target = model.state_index['G']
+    for minimize, exact in ((False, [0.75, 0.75, 0.75, 1, 0]), (True, [0, 0, 0.75, 1, 0])):
+        for method in METHODS:
+            solution = solve_reachability(model, target, minimize, method)
+            np.testing.assert_allclose(solution.values, exact, atol=1e-6, err_msg=method)
+    # Pmax leaves the end component towards S2 (S1[b]), Pmin stays in it (a in S0 and S1)
+    assert solve_reachability(model, target, method='policy-iteration').actions(model)['S1'] == 'b'
+    assert solve_reachability(model, target, True, 'policy-iteration').actions(model)['S0'] == 'a'
+
+
+@pytest.mark.parametrize("epsilon", [1e-3, 1e-6, 1e-10])
+def test_interval_bounds_with_an_end_component(end_component, epsilon):
+    # S0 and S1 are an end component inside S_max_may: without the deflation of the upper bound by the best
+    # choice leaving it, the upper bound would stay at 1
+    model = end_component
+    target = model.state_index['G']
+    for minimize, exact in ((False, [0.75, 0.75, 0.75, 1, 0]), (True, [0, 0, 0.75, 1, 0])):
+        solution = solve_reachability(model, target, minimize, 'interval-iteration', epsilon)
+        assert solution.converged and solution.gap <= epsilon
+        assert np.all(solution.lower <= exact) and np.all(np.array(exact) <= solution.upper)
+
+
+@pytest.mark.parametrize("epsilon", [1e-4, 1e-8])
+@pytest.mark.parametrize("minimize", [False, True])
+def test_interval_bounds(problem, minimize, epsilon):
+    model, target = problem
+    exact = _lp_reachability(model, target, minimize)
+    solution = solve_reachability(model, target, minimize, 'interval-iteration', epsilon)
+    assert solution.converged and solution.gap <= epsilon
+    # The linear program is exact up to its own tolerance
+    assert np.all(solution.lower <= exact + 1e-9) and np.all(exact - 1e-9 <= solution.upper)
+
+
+def test_unknown_method(end_component):
+    with pytest.raises(ValueError):
+        solve_reachability(end_component, 3, method='simplex')
@@ -0,0 +1,76 @@
+import glob
+import random
+import numpy as np
+import pytest
+from mdp import run
+from native_parser import MdpSyntaxError, iter_statements, parse_statements
+
+'''
+The native and stream readers (native_parser.py) give the same model, tables and diagnostics as the ANTLR
+parser on the example files.
+'''
+
+EXAMPLES = sorted(glob.glob("prof_examples/*.mdp") + glob.glob("mdp_examples/*.mdp"))
+ARRAYS = ('state_ptr', 'choice_action', 'choice_ptr', 'targets', 'probs', 'rewards')
+
+
+def _load(path, backend):
+    random.seed(0) # Same first state for the files without declared states, which draw one
+    return run(path, return_printer=True, return_model=True, backend=backend, cache=False)
+
+
+def _same(a, b):
+    (printer_a, model_a), (printer_b, model_b) = a, b
+    assert model_a.state_names == model_b.state_names
+    assert model_a.action_names == model_b.action_names
+    assert model_a.first_state == model_b.first_state
+    for name in ARRAYS:
+        assert np.array_equal(getattr(model_a, name), getattr(model_b, name)), name
+    assert printer_a.transactions_prob.equals(printer_b.transactions_prob)
+    assert printer_a.warnings == printer_b.warnings
+    assert printer_a.errors == printer_b.errors
+
+
+@pytest.mark.parametrize("path", EXAMPLES)
+def test_native_matches_antlr(path):
+    _same(_load(path, "native"), _load(path, "antlr"))
+
+
+@pytest.mark.parametrize("path", EXAMPLES)
+def test_stream_matches_antlr(path):
+    with open(path) as f:
+        text = f.read()
+    try:
+        parse_statements(text)
+    except MdpSyntaxError: # Only ANTLR recovers from syntax errors, the stream raises them
+        with pytest.raises(MdpSyntaxError):
+            _load(path, "stream")
+        return
+    _same(_load(path, "stream"), _load(path, "antlr"))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64])
+def test_statements_across_chunks(chunk_size):
+    with open("prof_examples/simu-mdp.mdp") as f:
+        text = f.read()
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    assert list(iter_statements(chunks)) == parse_statements(text)
+
+
+@pytest.mark.parametrize("text, line, column", [
+    ("Actions a;\n", 1, 0),
+    ("States S0, S1;\nActions a;\nS0[a] -> 1:S1, 1:S0;\n", 3, 0),
+    ("States S0, Actions;\nActions a;\n", 1, 0),
+])
+def test_syntax_errors(text, line, column):
+    with pytest.raises(MdpSyntaxError) as error:
+        parse_statements(text)
+    assert (error.value.line, error.value.column) == (line, column)
+
+
+def test_antlr_printer_is_plain():
+    import pickle
+    from mdp import gramPrintListener
+    printer, _ = _load("prof_examples/simu-mdp.mdp", "antlr")
+    assert type(printer) is gramPrintListener # The walk doesn't need the ANTLR listener base class
+    assert pickle.loads(pickle.dumps(printer)).transactions_prob.equals(printer.transactions_prob)
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+import mdp_generator
+from precomputation import end_components, partition, prob0, prob1
+
+'''
+Prob0 / Prob1 sets and end components (precomputation.py) on the hand-built MDP with an end component
+(conftest.py), and the Prob0 / Prob1 sets of random models against a plain Python version of their definitions.
+'''
+
+
+def _names(model, mask):
+    return {model.state_names[s] for s in np.flatnonzero(mask)}
+
+
+def test_max_sets(end_component):
+    model = end_component
+    target = model.state_index['G']
+    assert _names(model, prob0(model, target)) == {'F'}
+    assert _names(model, prob1(model, target)) == {'G'}
+    _, may, _ = partition(model, target)
+    assert _names(model, may) == {'S0', 'S1', 'S2'}
+
+
+def test_min_sets(end_component):
+    model = end_component
+    target = model.state_index['G']
+    assert _names(model, prob0(model, target, minimize=True)) == {'S0', 'S1', 'F'}
+    assert _names(model, prob1(model, target, minimize=True)) == {'G'}
+    sure, may, never = partition(model, target, minimize=True)
+    assert _names(model, may) == {'S2'}
+    assert not (sure & may).any() and not (may & never).any() and (sure | may | never).all()
+
+
+def test_end_components(end_component):
+    model = end_component
+    component, inside = end_components(model)
+    groups = {frozenset(_names(model, component == k)) for k in range(component.max() + 1)}
+    # The only choice of S2 may go to G: S2 is in no end component, and S1 keeps only a
+    assert groups == {frozenset({'S0', 'S1'}), frozenset({'G'}), frozenset({'F'})}
+    assert component[model.state_index['S2']] == -1
+    assert not inside[model.find_choice(model.state_index['S0'], 'b')]
+    assert not inside[model.find_choice(model.state_index['S1'], 'b')]
+    assert inside[model.find_choice(model.state_index['S0'], 'a')]
+
+
+def _successors(model, c):
+    entries = slice(model.choice_ptr[c], model.choice_ptr[c + 1])
+    return set(model.targets[entries][model.probs[entries] > 0].tolist())
+
+
+def _fixpoint(model, start, step):
+    """Smallest set containing start and closed by step(found, state), with plain Python sets."""
+    found = set(start)
+    while True:
+        new = {s for s in range(model.n_states) if s not in found and step(found, s)}
+        if not new:
+            return found
+        found |= new
+
+
+def _oracle(model, target, minimize):
+    """Prob0 and Prob1 sets from their textbook definitions (Baier & Katoen, ch. 10.6)."""
+    states = set(range(model.n_states))
+    choices = lambda s: range(model.state_ptr[s], model.state_ptr[s + 1])
+    if minimize:
+        forall = _fixpoint(model, {target}, lambda found, s: all(_successors(model, c) & found for c in choices(s)))
+        zero = states - forall
+        one = states - _fixpoint(model, zero, lambda found, s: s != target
+                                 and any(_successors(model, c) & found for c in choices(s)))
+        return zero, one
+    zero = states - _fixpoint(model, {target}, lambda found, s: any(_successors(model, c) & found for c in choices(s)))
+    sure = states
+    while True:
+        kept = _fixpoint(model, {target}, lambda found, s: s in sure and any(
+            _successors(model, c) <= sure and _successors(model, c) & found for c in choices(s)))
+        if kept == sure:
+            return zero, sure
+        sure = kept
+
+
+def _random_models():
+    for seed in range(12):
+        rng = np.random.default_rng(seed)
+        model = mdp_generator.random_mdp(int(rng.integers(3, 25)), n_actions=2, branching=1 + seed % 2, seed=seed)
+        yield pytest.param(model.to_compiled(), seed % model.n_states, id=f"random-{seed}")
+    for seed in range(8):
+        grid = mdp_generator.grid_world(3 + seed % 3, 3, n_traps=2 + seed % 3, seed=seed, slip_weight=seed % 2)
+        yield pytest.param(grid.to_compiled(), grid.goal, id=f"grid-{seed}")
+
+
+@pytest.mark.parametrize("model, target", list(_random_models()))
+def test_random_models(model, target):
+    for minimize in (False, True):
+        zero, one = _oracle(model, target, minimize)
+        assert set(np.flatnonzero(prob0(model, target, minimize)).tolist()) == zero
+        assert set(np.flatnonzero(prob1(model, target, minimize)).tolist()) == one
@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+import mdp
+import simulation
+
+'''
+Trajectories of simulation.simulate_batch: frequencies against exact probabilities, the random adversary,
+schedulers and the stopping rules.
+'''
+
+# The random adversary fixes the choice of S0 for a whole trajectory: it goes to S1 forever or to S2 forever
+TWO_LOOPS = """
+States S0, S1, S2;
+Actions a, b;
+S0[a] -> 1:S1;
+S0[b] -> 1:S2;
+S1 -> 1:S0;
+S2 -> 1:S0;
+"""
+
+# Flips a fair coin until heads (H), T has no transition
+COIN = """
+States F, H, T;
+Actions flip, stop;
+F[flip] -> 1:F + 1:H;
+F[stop] -> 1:T;
+H -> 1:H;
+"""
+
+
+def _within(estimate, p, n):
+    return abs(estimate - p) <= 5 * np.sqrt(p * (1 - p) / n) + 1e-12
+
+
+def test_craps():
+    _, model, _, _ = mdp.load("mdp_examples/craps.mdp", "native", cache=False, need_printer=False, verbose=False)
+    n = 100000
+    result = simulation.simulate_batch(model, n, 500, model.state_index['G'], rng=1)
+    assert _within(result.estimate, 244 / 495, n)
+    lost = ~result.hit & (result.final_state == model.state_index['P'])
+    assert np.all(result.hit | lost) # Nobody is still playing after 500 rolls
+    assert np.all(result.hitting_time[result.hit] == result.length[result.hit])
+
+
+def test_die_faces():
+    _, model, _, _ = mdp.load("mdp_examples/lancer_de_pieces.mdp", "native", cache=False, need_printer=False, verbose=False)
+    n = 60000
+    faces = [model.state_index[f"F{k}"] for k in range(1, 7)]
+    result = simulation.simulate_batch(model, n, 200, faces, rng=2)
+    assert result.hit.all()
+    counts = np.bincount(result.final_state, minlength=model.n_states)[faces]
+    assert all(_within(c / n, 1 / 6, n) for c in counts)
+
+
+def test_random_adversary_keeps_its_choices(compile_mdp):
+    model = compile_mdp(TWO_LOOPS)
+    n = 20000
+    result = simulation.simulate_batch(model, n, 30, model.state_index['S1'], rng=3)
+    assert _within(result.estimate, 0.5, n) # Walks choosing b never see S1
+    assert np.all(result.hitting_time[result.hit] == 1)
+    assert np.all(result.length[~result.hit] == 30)
+
+
+def test_scheduler_and_stuck_states(compile_mdp):
+    model = compile_mdp(COIN)
+    F, H, T = (model.state_index[s] for s in 'FHT')
+    flip, stop = model.find_choice(F, 'flip'), model.find_choice(F, 'stop')
+    n, k = 40000, 5
+    result = simulation.simulate_batch(model, n, k, H, rng=4, scheduler=[flip, model.find_choice(H, 'NA'), -1])
+    assert _within(result.estimate, 1 - 0.5 ** k, n)
+    times = np.bincount(result.hitting_time[result.hit], minlength=k + 1)
+    assert all(_within(times[t] / n, 0.5 ** t, n) for t in range(1, k + 1))
+    assert np.all(result.final_state[~result.hit] == F) and np.all(result.length[~result.hit] == k)
+
+    result = simulation.simulate_batch(model, 100, k, H, rng=4, scheduler=[stop, -1, -1])
+    assert not result.hit.any() and np.all(result.final_state == T) and np.all(result.length == 1)
+
+
+def test_choice_without_successors(compile_mdp):
+    # S0[b] only has a zero weight: the trajectories taking it stop in S0, whoever picks the choice
+    model = compile_mdp("States S0, S1, G;\nActions a, b;\nS0[a] -> 1:G + 1:S1;\nS0[b] -> 0:S1;\nS1 -> 1:S1;\nG -> 1:G;\n")
+    S0, S1, G = range(3)
+    dead = model.find_choice(S0, 'b')
+    result = simulation.simulate_batch(model, 20000, 10, G, rng=7)
+    stuck = result.final_state == S0
+    assert np.all(result.length[stuck] == 0) and np.all(result.hit | stuck | (result.final_state == S1))
+    assert _within(stuck.mean(), 0.5, result.n) and _within(result.hit.mean(), 0.25, result.n)
+    result = simulation.simulate_batch(model, 100, 10, G, rng=7, scheduler=[dead, model.find_choice(S1, 'NA'), -1])
+    assert not result.hit.any() and np.all(result.final_state == S0) and result.steps == 0
+
+
+def test_first_state_is_the_target(compile_mdp):
+    model = compile_mdp(COIN)
+    result = simulation.simulate_batch(model, 10, 5, [model.first_state], rng=5)
+    assert result.hit.all() and np.all(result.hitting_time == 0) and result.steps == 0
+
+
+def test_seeded_and_chunked(compile_mdp):
+    model = compile_mdp(TWO_LOOPS)
+    a = simulation.simulate_batch(model, 1000, 10, 1, rng=6)
+    b = simulation.simulate_batch(model, 1000, 10, 1, rng=6)
+    assert np.array_equal(a.hit, b.hit) and np.array_equal(a.final_state, b.final_state)
+    chunked = simulation.simulate_batch(model, 1000, 10, 1, rng=6, chunk_size=64)
+    assert chunked.n == 1000 and _within(chunked.estimate, 0.5, 1000)
+    estimate, hits = simulation.estimate_reachability(model, 1, 1000, 10, rng=6)
+    assert estimate == a.estimate and hits == int(a.hit.sum())
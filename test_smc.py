@@ -0,0 +1,231 @@
+import itertools
+import numpy as np
+import pytest
+import mdp_generator
+import simulation
+import smc
+
+'''
+Statistical model checking on several processes (smc.py): the counts only depend on the seed and the number
+of runs, whatever the number of workers.
+'''
+
+BATCH = 1000
+
+
+@pytest.fixture(scope="module")
+def craps():
+    game = mdp_generator.craps()
+    return game.to_compiled(), game.goal
+
+
+def _counts(result):
+    return result.runs, result.hits, result.steps, result.batches
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_same_counts_whatever_the_workers(craps, workers):
+    model, goal = craps
+    with smc.Runner(model, goal, 200, seed=5, workers=1, batch_size=BATCH) as runner:
+        expected = _counts(runner.estimate(10 * BATCH + 17))
+    with smc.Runner(model, goal, 200, seed=5, workers=workers, batch_size=BATCH) as runner:
+        assert _counts(runner.estimate(10 * BATCH + 17)) == expected
+    assert expected[0] == 10 * BATCH + 17 and expected[3] == 11
+    n = expected[0]
+    assert abs(expected[1] / n - 244 / 495) < 5 * np.sqrt(0.25 / n)
+
+
+def test_batch_seeds_are_spawned_children():
+    runner = smc.Runner(mdp_generator.chain(3).to_compiled(), 2, seed=11, workers=1)
+    children = np.random.SeedSequence(11).spawn(3)
+    for index, child in enumerate(children):
+        assert runner.batch_seed(index).generate_state(4).tolist() == child.generate_state(4).tolist()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_unused_batches_are_simulated_again(craps, workers):
+    model, goal = craps
+    with smc.Runner(model, goal, 200, seed=7, workers=workers, batch_size=BATCH) as runner:
+        first = next(runner.batches(itertools.repeat(BATCH))) # The batches queued after it are dropped
+        assert runner.next_batch == 1
+        rest = runner.estimate(3 * BATCH)
+    with smc.Runner(model, goal, 200, seed=7, workers=1, batch_size=BATCH) as runner:
+        whole = runner.estimate(4 * BATCH)
+    assert first[1] + rest.hits == whole.hits and first[2] + rest.steps == whole.steps
+
+
+def test_estimate_reachability(craps):
+    model, goal = craps
+    first = smc.estimate_reachability(model, goal, 5000, 200, seed=3, workers=1, batch_size=BATCH)
+    second = smc.estimate_reachability(model, goal, 5000, 200, seed=3, workers=2, batch_size=BATCH)
+    assert _counts(first) == _counts(second)
+
+
+@pytest.mark.parametrize("p0, p1, decision", [(0.4, 0.45, 'H1'), (0.55, 0.6, 'H0')])
+def test_sprt_decision(craps, p0, p1, decision):
+    model, goal = craps # Reaches G with probability 244/495 = 0.493
+    results = []
+    for workers in (1, 2):
+        with smc.Runner(model, goal, 200, seed=9, workers=workers, batch_size=4 * BATCH) as runner:
+            results.append(runner.sprt(p0, p1, 0.01, 0.01, first_batch=BATCH))
+    first, second = results
+    assert first.decision == decision and 'Accept ' + decision in first.message
+    assert (first.samples, first.simulated, first.batches, first.log_ratio) == \
+           (second.samples, second.simulated, second.batches, second.log_ratio)
+    assert first.samples <= first.simulated
+
+
+def test_sprt_stops_at_the_first_crossing(craps):
+    model, goal = craps
+    p0, p1, alpha, beta = 0.3, 0.35, 0.05, 0.05
+    with smc.Runner(model, goal, 200, seed=4, workers=2, batch_size=4 * BATCH) as runner:
+        result = runner.sprt(p0, p1, alpha, beta, first_batch=BATCH)
+        assert runner.next_batch == result.batches # The dropped batches are not counted as used
+    # Serial test on the outcomes of the same batches
+    with smc.Runner(model, goal, 200, seed=4, workers=1, batch_size=4 * BATCH) as runner:
+        sizes = [BATCH, 2 * BATCH, 4 * BATCH, 4 * BATCH][:result.batches]
+        hit = np.concatenate(list(runner.batches(sizes, outcomes=True)))
+    ratios = np.cumsum(np.where(hit, np.log(p1 / p0), np.log((1 - p1) / (1 - p0))))
+    crossed = (ratios >= np.log((1 - beta) / alpha)) | (ratios <= np.log(beta / (1 - alpha)))
+    assert result.samples == np.argmax(crossed) + 1 and result.simulated == len(hit)
+    assert result.decision == 'H1' and result.log_ratio == pytest.approx(ratios[result.samples - 1])
+    assert result.batches < 4 # Stops early, long before the test could run out of batches
+
+
+def test_sprt_undecided(craps):
+    model, goal = craps
+    result = smc.sprt(model, goal, 0.49, 0.5, 0.001, 0.001, 200, seed=2, workers=1, max_samples=3000)
+    assert result.decision is None and result.samples == result.simulated == 3000
+    assert result.message == "Undecided: more samples are needed."
+@pytest.mark.parametrize("p0, p1", [(0, 0.5), (0.5, 1), (0, 1)])
+def test_sprt_at_the_ends(compile_mdp, p0, p1):
+    smc._check_sprt(p0, p1, 0.05, 0.05)
+    model = compile_mdp("States A, G, N;\nActions a;\nA -> 1:G;\nG -> 1:G;\nN -> 1:N;\n")
+    # A hit is impossible under p0 = 0, a miss under p1 = 1: the first such sample decides
+    for target, decision, alone in [('G', 'H1', p0 == 0), ('N', 'H0', p1 == 1)]:
+        result = smc.sprt(model, model.state_index[target], p0, p1, 0.05, 0.05, 10, seed=1, workers=1)
+        assert result.decision == decision and np.isfinite(result.log_ratio) != alone
+        assert result.samples == 1 if alone else 1 < result.samples <= result.simulated
+
+
+def _serial_sprt(stream, p0, p1, alpha, beta):
+    """(decision, samples) of Wald's test read one sample at a time, as in the notebook."""
+    upper, lower = np.log((1 - beta) / alpha), np.log(beta / (1 - alpha))
+    ratio = 0.0
+    for k, hit in enumerate(stream, 1):
+        ratio += np.log(p1 / p0) if hit else np.log((1 - p1) / (1 - p0))
+        if ratio >= upper or ratio <= lower:
+            return (1 if ratio >= upper else -1), k
+    return 0, len(stream)
+
+
+def test_sweep_matches_serial_tests(craps, monkeypatch):
+    model, goal = craps
+    thresholds, p1, alpha, beta, n = [0.2, 0.4, 0.45, 0.5], 0.55, 0.05, 0.05, 40
+    with smc.Runner(model, goal, 200, seed=6, workers=1, batch_size=BATCH) as runner:
+        drawn, outcomes = [], runner.outcomes
+
+        def record(runs):
+            drawn.append(outcomes(runs))
+            return drawn[-1]
+        monkeypatch.setattr(runner, 'outcomes', record)
+        result = runner.sweep(thresholds, alpha, beta, n, p1=p1, max_samples=2000)
+    # Rebuild the stream of every repetition: a block goes to the streams with an undecided test
+    streams, block = [[] for _ in range(n)], smc.SWEEP_FIRST_BLOCK
+    for outcome in drawn:
+        size = min(block, 2000 - len(max(streams, key=len)))
+        growing = [s for s in range(n) if any(_serial_sprt(streams[s], t, p1, alpha, beta)[0] == 0
+                                              for t in thresholds)]
+        for s, row in zip(growing, outcome.reshape(len(growing), size)):
+            streams[s].extend(row)
+        block = min(2 * block, smc.SWEEP_MAX_BLOCK)
+    for t, accepted, samples in zip(thresholds, result.accepted, result.samples):
+        tests = [_serial_sprt(stream, t, p1, alpha, beta) for stream in streams]
+        assert accepted == np.mean([d == 1 for d, _ in tests])
+        assert samples == pytest.approx(np.mean([k for _, k in tests]))
+    assert result.accepted[0] > 0.9 and result.accepted[-1] < 0.1 # p = 0.493
+    assert result.runs == sum(len(s) for s in streams)
+
+
+def test_sweep_with_p1_at_one(craps, compile_mdp):
+    sure = compile_mdp("States A, G;\nActions a;\nA -> 1:G;\nG -> 1:G;\n")
+    with smc.Runner(sure, sure.state_index['G'], 10, seed=2, workers=1, batch_size=BATCH) as runner:
+        default = runner.sweep([0.5, 0.95], 0.05, 0.05, 20) # Every stream only hits, and no max_samples
+        explicit = runner.sweep([0, 0.5, 0.95], 0.05, 0.05, 20, p1=1)
+    assert 0.95 < default.p1 < 1 and default.accepted == [1.0, 1.0]
+    assert explicit.accepted == [1.0, 1.0, 1.0] and explicit.samples[0] == 1
+    model, goal = craps # A miss rejects p1 = 1 at once
+    with smc.Runner(model, goal, 200, seed=3, workers=1, batch_size=BATCH) as runner:
+        result = runner.sweep([0, 0.2, 0.5], 0.05, 0.05, 200, p1=1)
+    assert result.accepted[0] == pytest.approx(244 / 495, abs=0.1) # The first sample decides
+    assert result.samples[0] == 1 and result.accepted[2] < result.accepted[1] < 0.5
+
+
+@pytest.mark.parametrize("bound, level", [('hoeffding', 0.95), ('clopper-pearson', 0.95), ('wilson', 0.93)])
+def test_interval_coverage(bound, level):
+    interval = smc.BOUNDS[bound]
+    rng = np.random.default_rng(12)
+    for p, runs in [(0.02, 300), (0.3, 100), (0.5, 1000)]:
+        covered = [low <= p <= high for low, high in (interval(h, runs, 0.05) for h in rng.binomial(runs, p, 1000))]
+        assert np.mean(covered) >= level
+
+
+def test_interval_ends():
+    for interval in smc.BOUNDS.values():
+        low, high = interval(0, 50, 0.05)
+        assert low == 0 and 0 < high < 1
+        low, high = interval(50, 50, 0.05)
+        assert 0 < low < 1 and high == 1
+    assert smc.clopper_pearson_interval(0, 50, 0.05)[1] == pytest.approx(1 - 0.025 ** (1 / 50))
+    np.testing.assert_allclose(smc.wilson_interval(5, 10, 0.05), (0.2366, 0.7634), atol=1e-4)
+    np.testing.assert_allclose(smc.hoeffding_interval(5, 10, 0.05), (0.5 - np.sqrt(np.log(40) / 20), 0.5 + np.sqrt(np.log(40) / 20)))
+    # Far narrower than Hoeffding close to 0
+    width = {name: np.diff(interval(3, 10000, 0.05))[0] for name, interval in smc.BOUNDS.items()}
+    assert width['wilson'] < width['hoeffding'] / 10 and width['clopper-pearson'] < width['hoeffding'] / 10
+
+
+@pytest.fixture(scope="module")
+def rare():
+    game = mdp_generator.chain(4, forward=1, backward=20, stay=0, fail=20) # T reached with probability ~0.2%
+    model = game.to_compiled()
+    return model, game.goal
+
+
+def test_adaptive(rare):
+    model, goal = rare
+    runs = {}
+    for bound in smc.BOUNDS:
+        checkpoints = []
+        with smc.Runner(model, goal, 100, seed=13, workers=1, batch_size=4 * BATCH) as runner:
+            result = runner.adaptive(0.005, 0.05, bound, first_batch=BATCH, on_checkpoint=lambda *c: checkpoints.append(c))
+        assert result.converged and checkpoints == result.checkpoints
+        assert result.high - result.estimate <= 0.005 and result.estimate - result.low <= 0.005
+        assert [c[0] for c in checkpoints[:3]] == [BATCH, 3 * BATCH, 7 * BATCH][:len(checkpoints)] # Doubling batches
+        runs[bound] = result.runs
+    assert runs['hoeffding'] >= simulation.chernoff_hoeffding_runs(0.005, 0.05) > runs['hoeffding'] - 4 * BATCH
+    assert runs['wilson'] < runs['hoeffding'] / 4 and runs['clopper-pearson'] < runs['hoeffding'] / 4
+
+
+def test_adaptive_stops(rare):
+    model, goal = rare
+    first = smc.adaptive_estimate(model, goal, 1e-4, num_transitions=100, seed=14, workers=1, max_runs=5000)
+    second = smc.adaptive_estimate(model, goal, 1e-4, num_transitions=100, seed=14, workers=2, max_runs=5000)
+    assert not first.converged and first.runs == 5000
+    assert _counts(first) == _counts(second) and first.checkpoints == second.checkpoints
+    with pytest.raises(ValueError):
+        smc.adaptive_estimate(model, goal, 0.01, bound='normal', workers=1)
+
+
+@pytest.mark.parametrize("p0, p1, alpha, beta", [
+    (0.5, 0.5, 0.05, 0.05), (0.6, 0.5, 0.05, 0.05), (-0.1, 0.5, 0.05, 0.05), (0.5, 1.1, 0.05, 0.05),
+    (0.4, 0.5, 0, 0.05), (0.4, 0.5, 0.05, 1), (0.4, 0.5, 0.6, 0.4),
+])
+def test_sprt_rejects_invalid_parameters(craps, p0, p1, alpha, beta):
+    model, goal = craps
+    with pytest.raises(ValueError):
+        smc._check_sprt(p0, p1, alpha, beta)
+    with pytest.raises(ValueError):
+        smc.sprt(model, goal, p0, p1, alpha, beta, workers=1)
+    with smc.Runner(model, goal, 200, seed=1, workers=1, batch_size=BATCH) as runner:
+        with pytest.raises(ValueError):
+            runner.sweep([p0], alpha, beta, 10, p1=p1)
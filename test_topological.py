@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+import chain_solver
+import mdp_solver
+import topological
+
+'''
+The strongly connected components and levels of topological.py, and its solutions against the flat solvers
+(mdp_solver.py, chain_solver.py), with and without a pool of workers.
+'''
+
+# Components {A, B}, {C}, {D}, {E}: E leads nowhere else, D only to E, C to D, A and B to C and D
+LEVELS = """
+States A, B, C, D, E;
+Actions a;
+A -> 1:B + 1:C;
+B -> 1:A + 1:D;
+C -> 1:D;
+D -> 1:E + 1:D;
+E -> 1:E;
+"""
+
+
+def _gadgets(k):
+    """k copies of the end component of conftest.END_COMPONENT (A, B) with different exits towards G and F."""
+    states = [f"{s}_{i}" for i in range(k) for s in ("A", "B", "C")]
+    lines = [f"States {', '.join(states)}, G, F;", "Actions a, b;"]
+    for i in range(k):
+        lines += [f"A_{i}[a] -> 1:B_{i};", f"A_{i}[b] -> 1:G + {i + 1}:F;", f"B_{i}[a] -> 1:A_{i};",
+                  f"B_{i}[b] -> 1:C_{i};", f"C_{i} -> {k - i}:G + {i + 1}:F;"]
+    return "\n".join(lines + ["G -> 1:G;", "F -> 1:F;"]) + "\n"
+
+
+def _groups(model, component, level):
+    return {(frozenset(model.state_names[s] for s in np.flatnonzero(component == c)), int(level[c]))
+            for c in range(len(level))}
+
+
+def test_components_and_levels(compile_mdp):
+    model = compile_mdp(LEVELS)
+    component, level = topological.components(model)
+    assert _groups(model, component, level) == {(frozenset('AB'), 3), (frozenset('C'), 2), (frozenset('D'), 1),
+                                                (frozenset('E'), 0)}
+    states = np.array([name != 'E' for name in model.state_names])
+    component, level = topological.components(model, states)
+    assert component[model.state_index['E']] == -1
+    assert _groups(model, component, level) == {(frozenset('AB'), 2), (frozenset('C'), 1), (frozenset('D'), 0)}
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("minimize", [False, True])
+def test_mdp_methods_match_the_flat_solver(random_model, seed, minimize):
+    model = random_model(10 + 8 * seed, branching=3, seed=seed, sinks=2 + seed % 2)
+    target = model.n_states - 1
+    for method in topological.MDP_METHODS:
+        solution = topological.solve_reachability(model, target, minimize, method)
+        assert solution.converged, method
+        # Value iteration stops on the same rule level by level, so it ends as close to the values as the flat one
+        flat = mdp_solver.solve_reachability(model, target, minimize, method).values
+        np.testing.assert_allclose(solution.values, flat, atol=1e-9, err_msg=method)
+    reference = mdp_solver.solve_reachability(model, target, minimize, 'policy-iteration').values
+    bounds = topological.solve_reachability(model, target, minimize, 'interval-iteration')
+    assert bounds.gap <= mdp_solver.EPSILON
+    assert np.all(bounds.lower <= reference + 1e-9) and np.all(reference - 1e-9 <= bounds.upper)
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_chain_methods_match_the_chain_solver(random_model, seed):
+    model = random_model(10 + 8 * seed, branching=2 + seed % 2, seed=seed, markov_chain=True, sinks=2 + seed % 2)
+    target = model.n_states - 1
+    reference = chain_solver.solve_reachability(model, target, 'direct').values
+    for method in ('auto',) + chain_solver.METHODS + topological.MDP_METHODS:
+        values = topological.solve_reachability(model, target, method=method).values
+        np.testing.assert_allclose(values, reference, atol=1e-6, err_msg=method)
+
+
+def test_end_component(end_component):
+    model = end_component
+    target = model.state_index['G']
+    for minimize, exact in ((False, [0.75, 0.75, 0.75, 1, 0]), (True, [0, 0, 0.75, 1, 0])):
+        for method in topological.MDP_METHODS:
+            values = topological.solve_reachability(model, target, minimize, method).values
+            np.testing.assert_allclose(values, exact, atol=1e-6, err_msg=method)
+
+
+def test_rejects_chain_methods_on_an_mdp(compile_mdp):
+    model = compile_mdp(_gadgets(1))
+    with pytest.raises(ValueError):
+        topological.solve_reachability(model, model.state_index['G'], method='direct')
+
+
+@pytest.mark.parametrize("minimize", [False, True])
+def test_workers(compile_mdp, monkeypatch, minimize):
+    model = compile_mdp(_gadgets(20))
+    target = model.state_index['G']
+    reference = mdp_solver.solve_reachability(model, target, minimize, 'policy-iteration').values
+    monkeypatch.setattr(topological, 'PARALLEL_STATES', 4) # Both levels (20 components each) are split
+    for method in topological.MDP_METHODS:
+        solution = topological.solve_reachability(model, target, minimize, method, workers=2)
+        np.testing.assert_allclose(solution.values, reference, atol=1e-6, err_msg=method)
+        assert np.array_equal(solution.values, topological.solve_reachability(model, target, minimize, method).values)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+import mdp
+import simulation
+import trajectory
+from mdp_model import NO_ACTION
+
+'''
+Columnar recording of random walks (trajectory.py), in memory and in .npy files.
+'''
+
+
+@pytest.fixture(scope="module")
+def model():
+    _, model, _, _ = mdp.load("mdp_examples/craps.mdp", "native", cache=False, need_printer=False, verbose=False)
+    return model
+
+
+def _record(model, recorder, walks, steps):
+    for seed in range(walks):
+        simulation.walk(model, steps, rng=seed, recorder=recorder)
+
+
+def test_same_walks_as_the_lists(model):
+    recorder = trajectory.TrajectoryRecorder(model.state_names, model.action_names, capacity=4)
+    _record(model, recorder, 20, 30)
+    walks = recorder.trajectories()
+    assert len(walks) == 20
+    for seed in range(20):
+        states, choices = simulation.walk(model, 30, rng=seed)
+        start, end = walks.bounds(seed)
+        assert walks.states[start:end].tolist() == states
+        assert walks.actions[start:end].tolist() == [NO_ACTION] + model.choice_action[choices].tolist()
+        expected = [1.0] + [dict(zip(*model.successors(c)))[s] for c, s in zip(choices, states[1:])]
+        np.testing.assert_allclose(walks.probs[start:end], expected)
+        assert walks.steps()[seed] == len(choices)
+        assert walks.probability(seed) == pytest.approx(np.prod(expected))
+        assert walks.names(seed) == [model.state_names[s] for s in states]
+
+
+def test_folder_across_flushes(model, tmp_path):
+    memory = trajectory.TrajectoryRecorder(model.state_names, model.action_names)
+    disk = trajectory.TrajectoryRecorder(model.state_names, model.action_names, capacity=8, folder=str(tmp_path))
+    _record(model, memory, 50, 40)
+    _record(model, disk, 50, 40)
+    assert len(disk) == len(memory) > 8
+    with pytest.raises(ValueError):
+        disk.trajectories()
+    with pytest.raises(ValueError):
+        disk.clear()
+    loaded = disk.close()
+    expected = memory.close()
+    assert isinstance(loaded.states, np.memmap)
+    for name in trajectory.COLUMNS:
+        assert np.array_equal(getattr(loaded, name), getattr(expected, name)), name
+    assert np.array_equal(loaded.starts, expected.starts)
+    reread = trajectory.load(str(tmp_path), mmap_mode=None)
+    assert reread.states.dtype == np.int32 and reread.render(-1) == expected.render(-1)
+
+
+def test_names_and_render():
+    recorder = trajectory.TrajectoryRecorder(['S0', 'S1', 'S2'], ['a', 'b'])
+    recorder.start_named('S0')
+    recorder.step_named('b', 'S1', 0.5)
+    recorder.step_named('NA', 'S2', 1.0)
+    recorder.step_named(None, 'S0', 0.25)
+    recorder.start_named('S2')
+    walks = recorder.trajectories()
+    assert walks.render(0) == "S0 -[b]-> S1 -> S2 -> S0"
+    assert walks.render(0, limit=1) == "S0 -[b]-> S1"
+    assert walks.render(1) == "S2" and walks.steps().tolist() == [3, 0]
+    assert walks.probability(0) == 0.125
+    recorder.clear()
+    assert len(recorder) == 0 and len(recorder.trajectories()) == 0
+
+
+def test_walk_app_module_is_headless():
+    import subprocess, sys
+    code = "import sys, functions_df; functions_df.RandomWalkApp; print('tkinter' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False" # The app imports tkinter when it opens its window
@@ -0,0 +1,226 @@
+import multiprocessing
+import os
+import time
+import numpy as np
+from adversary import gather_rows
+from mdp_solver import EPSILON, MAX_ITERATIONS, IntervalSolution, MDPSolution, scheduler
+from precomputation import end_components, partition, target_mask
+
+'''
+Reachability probabilities solved one strongly connected component at a time instead of as one system over
+all the S_may states (chain_solver.py, mdp_solver.py).
+
+The S_may states are split into strongly connected components (scipy.sparse.csgraph, every choice being an
+edge), and every component gets a level in the graph of the components: 0 if it only leads to S_sure and
+S_never states, otherwise 1 + the largest level of the components it leads to. The levels are solved from 0
+up, the values of the lower levels being constants by then, so every level is a small system. The components
+of a level don't depend on each other: they are solved together, and the levels with at least
+PARALLEL_STATES states are split among a pool of processes. Methods:
+- any method of chain_solver (Markov chains) -> the linear system of the level (solve_linear)
+- value-iteration -> backups of the level until no value moves by more than epsilon
+- interval-iteration -> lower and upper bounds of the level, as in mdp_solver. The maximal end components
+                        (precomputation.end_components), which are inside the components, deflate the upper
+                        bound for the maximum. A level stops at a gap of epsilon * (level + 1) / levels, so
+                        the final gap is at most epsilon although every level adds the gap of the lower ones.
+
+Staged models (Teste_grande_v1.mdp, simu-mdp.mdp) have mostly single state components, solved in one backup.
+
+    solution = solve_reachability(model, target, method='interval-iteration')
+    component, level = components(model)
+'''
+
+MDP_METHODS = ('value-iteration', 'interval-iteration')
+PARALLEL_STATES = 1 << 14 # Smallest level whose components are split among the workers
+
+
+def components(model, states=None):
+    """
+    Strongly connected components of the given states (all by default) and their levels (see the module).
+
+    Returns:
+    - tuple: (component, level), the component of every state (-1 outside the states, numbered from 0) and
+             the level of every component.
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import connected_components
+    n = model.n_states
+    states = np.ones(n, dtype=bool) if states is None else np.asarray(states, dtype=bool)
+    source = model.choice_state[model.transition_choice]
+    edge = states[source] & states[model.targets] & (model.probs > 0)
+    graph = csr_matrix((np.ones(np.count_nonzero(edge), dtype=np.int8), (source[edge], model.targets[edge])),
+                       shape=(n, n))
+    _, labels = connected_components(graph, directed=True, connection='strong')
+    component = np.full(n, -1, dtype=np.int64)
+    _, component[states] = np.unique(labels[states], return_inverse=True)
+    k = int(component.max(initial=-1)) + 1
+    # Edges between components, then levels by removing the components without successors, level by level
+    pairs = np.unique(np.stack([component[source[edge]], component[model.targets[edge]]]), axis=1)
+    pairs = pairs[:, pairs[0] != pairs[1]]
+    successors = np.bincount(pairs[0], minlength=k)
+    order = np.argsort(pairs[1], kind='stable')
+    ptr = np.zeros(k + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pairs[1], minlength=k), out=ptr[1:])
+    predecessors = pairs[0][order]
+    level = np.zeros(k, dtype=np.int64)
+    frontier = np.flatnonzero(successors == 0)
+    depth = 0
+    while len(frontier):
+        level[frontier] = depth
+        _, entries = gather_rows(ptr, frontier)
+        before = predecessors[entries]
+        successors -= np.bincount(before, minlength=k)
+        frontier = np.unique(before[successors[before] == 0])
+        depth += 1
+    return component, level
+
+
+def _problem(model, states, index, mec, mec_inside, bounds):
+    """
+    Arrays of the system of some states, the other states having their final values (one array of values,
+    or the lower and upper bounds): the choices of every state, the entries between the states and the
+    value every choice gets from the other states.
+    """
+    index[states] = np.arange(len(states))
+    choice_ptr, choices = gather_rows(model.state_ptr, states)
+    entry_ptr, entries = gather_rows(model.choice_ptr, choices)
+    entry_choice = np.repeat(np.arange(len(choices)), np.diff(entry_ptr))
+    local = index[model.targets[entries]]
+    inside = local >= 0
+    outside = ~inside
+    weights = model.probs[entries[outside]]
+    constants = [np.bincount(entry_choice[outside], weights=weights * x[model.targets[entries[outside]]],
+                             minlength=len(choices)) for x in bounds]
+    index[states] = -1
+    problem = {'choice_ptr': choice_ptr, 'choice': entry_choice[inside], 'target': local[inside],
+               'prob': model.probs[entries[inside]], 'constants': constants}
+    if mec is not None:
+        labels = mec[states]
+        in_mec = labels >= 0
+        component = np.full(len(states), -1, dtype=np.int64)
+        _, component[in_mec] = np.unique(labels[in_mec], return_inverse=True)
+        choice_state = np.repeat(np.arange(len(states)), np.diff(choice_ptr))
+        leaving = np.flatnonzero(in_mec[choice_state] & ~mec_inside[choices])
+        problem['mec'] = (component, leaving, component[choice_state[leaving]])
+    return problem
+
+
+def _solve_problem(task):
+    """Values (or lower and upper bounds) of the states of a _problem, with the number of iterations."""
+    problem, method, minimize, epsilon, max_iterations = task
+    choice_ptr, constants = problem['choice_ptr'], problem['constants']
+    n, n_choices = len(choice_ptr) - 1, choice_ptr[-1]
+    reduce = np.minimum if minimize else np.maximum
+    if not len(problem['choice']):
+        # No transitions between the states (single state components without a loop): one backup
+        return tuple(reduce.reduceat(c, choice_ptr[:-1]) for c in constants), 1, True
+    if method not in MDP_METHODS:
+        from scipy.sparse import csr_matrix, identity
+        from chain_solver import solve_linear
+        # One choice per state: the rows of the choices are the rows of the states
+        A = csr_matrix((problem['prob'], (problem['choice'], problem['target'])), shape=(n, n))
+        x, _, iterations, converged = solve_linear((identity(n, format='csr') - A).tocsr(), constants[0], method,
+                                                   max_iterations=max_iterations)
+        return (np.clip(x, 0.0, 1.0),), iterations, converged
+
+    def backup(x, constant):
+        q = constant + np.bincount(problem['choice'], weights=problem['prob'] * x[problem['target']],
+                                   minlength=n_choices)
+        return reduce.reduceat(q, choice_ptr[:-1]), q # Every S_may state has a choice
+
+    if method == 'value-iteration':
+        x = np.zeros(n)
+        for k in range(1, max_iterations + 1):
+            new, _ = backup(x, constants[0])
+            delta = np.max(np.abs(new - x), initial=0.0)
+            x = new
+            if delta <= epsilon:
+                return (x,), k, True
+        return (x,), max_iterations, False
+    lower, upper = np.zeros(n), np.ones(n)
+    component, leaving, exits = problem.get('mec', (None, None, None))
+    for k in range(1, max_iterations + 1):
+        lower, _ = backup(lower, constants[0])
+        values, q = backup(upper, constants[1])
+        upper = np.minimum(values, upper)
+        if component is not None and len(exits):
+            best_exit = np.zeros(int(component.max()) + 1)
+            np.maximum.at(best_exit, exits, q[leaving])
+            in_mec = component >= 0
+            upper[in_mec] = np.minimum(upper[in_mec], best_exit[component[in_mec]])
+        if np.max(upper - lower, initial=0.0) <= epsilon:
+            return (lower, upper), k, True
+    return (lower, upper), max_iterations, False
+
+
+def _chunks(states, labels, parts):
+    """Splits states, sorted by component label, into about parts groups of whole components."""
+    if parts <= 1 or len(states) < PARALLEL_STATES:
+        return [states]
+    cuts = np.searchsorted(labels, labels[np.linspace(0, len(states), parts + 1)[1:-1].astype(np.int64)])
+    return [chunk for chunk in np.split(states, np.unique(cuts)) if len(chunk)]
+
+
+def solve_reachability(model, target, minimize=False, method='auto', epsilon=EPSILON, max_iterations=MAX_ITERATIONS,
+                       workers=1):
+    """
+    Maximal (or minimal) probability of eventually reaching the target from every state, level by level.
+
+    Parameters:
+    - model (CompiledMDP): The model.
+    - target: State index, sequence of state indices or boolean mask.
+    - minimize (bool): Minimal probabilities instead of maximal ones.
+    - method (str): One of MDP_METHODS, or one of chain_solver.METHODS for a Markov chain; 'auto' for
+                    chain_solver's choice on a Markov chain and value-iteration otherwise.
+    - epsilon (float): Stopping threshold of the iterations (see the module for interval-iteration).
+    - max_iterations (int): Iterations of a level after which it gives up.
+    - workers (int): Processes solving the large levels, None for all the CPUs.
+
+    Returns:
+    - MDPSolution (IntervalSolution for interval-iteration), iterations summed over the levels
+    """
+    from chain_solver import METHODS as CHAIN_METHODS
+    chain = model.is_markov_chain()
+    if method == 'auto':
+        method = 'auto' if chain else 'value-iteration'
+    elif method not in MDP_METHODS and not (chain and method in CHAIN_METHODS):
+        allowed = MDP_METHODS + (CHAIN_METHODS if chain else ())
+        raise ValueError(f"unknown method {method!r}, expected 'auto' or one of {allowed}")
+    start = time.perf_counter()
+    is_target = target_mask(model, target)
+    sure, may, _ = partition(model, is_target, minimize)
+    component, level = components(model, may)
+    mec, mec_inside = end_components(model, may) if method == 'interval-iteration' and not minimize else (None, None)
+    bounds = [sure.astype(np.float64)] + ([sure.astype(np.float64)] if method == 'interval-iteration' else [])
+    states = np.flatnonzero(may)
+    states = states[np.lexsort((component[states], level[component[states]]))]
+    depth = int(level.max(initial=-1)) + 1
+    ends = np.cumsum(np.bincount(level[component[states]], minlength=depth))
+    index = np.full(model.n_states, -1, dtype=np.int64)
+    workers = max(1, os.cpu_count() if workers is None else workers)
+    pool = None
+    if workers > 1 and len(states) >= PARALLEL_STATES:
+        context = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        pool = multiprocessing.get_context(context).Pool(workers)
+    iterations, converged = 0, True
+    try:
+        for d, (begin, end) in enumerate(zip(np.concatenate([[0], ends[:-1]]), ends)):
+            chunks = _chunks(states[begin:end], component[states[begin:end]], workers if pool else 1)
+            tolerance = epsilon * (d + 1) / depth if method == 'interval-iteration' else epsilon
+            tasks = [(_problem(model, chunk, index, mec, mec_inside, bounds), method, minimize, tolerance,
+                      max_iterations) for chunk in chunks]
+            results = pool.map(_solve_problem, tasks) if len(tasks) > 1 else [_solve_problem(tasks[0])]
+            for chunk, (values, k, ok) in zip(chunks, results):
+                for x, v in zip(bounds, values):
+                    x[chunk] = v
+                iterations += k
+                converged &= ok
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if method == 'interval-iteration':
+        lower, upper = bounds
+        choice = scheduler(model, (lower + upper) / 2, is_target, minimize)
+        return IntervalSolution(lower, upper, choice, iterations, converged, time.perf_counter() - start)
+    choice = scheduler(model, bounds[0], is_target, minimize)
+    return MDPSolution(bounds[0], choice, method, iterations, converged, time.perf_counter() - start)
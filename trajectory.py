@@ -0,0 +1,235 @@
+import json
+import os
+import numpy as np
+from mdp_model import NO_ACTION
+
+'''
+Columnar recording of random walks, for runs of millions of steps.
+
+Every row of a recording is one visited state: the state index, the index of the action taken to reach it
+(NO_ACTION for the first state of a trajectory and for the transitions without action) and the probability
+of that step (1 for the first state). starts holds the row where every trajectory begins.
+
+The rows go to preallocated typed arrays. Without a folder the arrays grow by doubling; with a folder,
+a full buffer is appended to the .npy files of the folder, which load() maps back in memory. Names are
+only looked up when a path is rendered.
+
+    recorder = TrajectoryRecorder(model.state_names, model.action_names, folder='walks')
+    simulation.walk(model, 10**6, rng, recorder=recorder)
+    recorder.close()
+    walks = load('walks')
+    print(walks.render(0, limit=20))
+'''
+
+CAPACITY = 1 << 16 # Rows held in memory before growing or flushing
+COLUMNS = {'states': np.int32, 'actions': np.int32, 'probs': np.float64}
+_HEADER_SIZE = 128 # Fixed .npy header, rewritten with the final shape when the file is closed
+
+
+class _NpyWriter:
+    """A 1-D .npy file written in pieces."""
+
+    def __init__(self, path, dtype):
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.file = open(path, 'wb')
+        self.file.write(self._header())
+
+    def _header(self):
+        header = repr({'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False, 'shape': (self.count,)})
+        header = header.ljust(_HEADER_SIZE - 10 - 1) + '\n'
+        return b'\x93NUMPY\x01\x00' + (len(header)).to_bytes(2, 'little') + header.encode('latin1')
+
+    def write(self, array):
+        np.ascontiguousarray(array, dtype=self.dtype).tofile(self.file)
+        self.count += len(array)
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(self._header())
+        self.file.close()
+
+
+class Trajectories:
+    """
+    Recorded trajectories, as columns (numpy arrays or memory maps).
+
+    Parameters:
+    - states, actions, probs: One entry per row.
+    - starts: First row of every trajectory.
+    - state_names, action_names (list): Names of the indices.
+    """
+
+    def __init__(self, states, actions, probs, starts, state_names, action_names):
+        self.states = states
+        self.actions = actions
+        self.probs = probs
+        self.starts = starts
+        self.state_names = state_names
+        self.action_names = action_names
+
+    def __len__(self):
+        return len(self.starts)
+
+    def bounds(self, i):
+        """(first row, end row) of trajectory i (negative i counts from the last one)."""
+        i %= len(self.starts)
+        end = self.starts[i + 1] if i + 1 < len(self.starts) else len(self.states)
+        return int(self.starts[i]), int(end)
+
+    def steps(self):
+        """Number of transitions of every trajectory."""
+        return np.diff(np.append(self.starts, len(self.states))) - 1
+
+    def probability(self, i):
+        """Probability of trajectory i."""
+        start, end = self.bounds(i)
+        return float(np.prod(self.probs[start:end]))
+
+    def names(self, i):
+        """States of trajectory i, as names."""
+        start, end = self.bounds(i)
+        return [self.state_names[s] for s in self.states[start:end]]
+
+    def render(self, i, limit=None):
+        """'S0 -[a]-> S1 -> S2 ...' for trajectory i, cut after limit steps."""
+        start, end = self.bounds(i)
+        if limit is not None:
+            end = min(end, start + limit + 1)
+        path = [self.state_names[self.states[start]]]
+        for action, state in zip(self.actions[start + 1:end], self.states[start + 1:end]):
+            arrow = '->' if action == NO_ACTION else f"-[{self.action_names[action]}]->"
+            path.append(f"{arrow} {self.state_names[state]}")
+        return ' '.join(path)
+
+
+class TrajectoryRecorder:
+    """
+    Records trajectories step by step (or a whole walk at once with extend).
+
+    Parameters:
+    - state_names, action_names (list): Names of the state and action indices.
+    - capacity (int): Rows kept in memory.
+    - folder (str): Folder of the .npy files, the rows then being written there when the buffer is full.
+    """
+
+    def __init__(self, state_names, action_names, capacity=CAPACITY, folder=None):
+        self.state_names = list(state_names)
+        self.action_names = list(action_names)
+        self.folder = folder
+        self._buffers = {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._used = 0 # Rows of the buffers in use
+        self._flushed = 0 # Rows already written to the files
+        self._starts = []
+        self._index = None
+        self._writers = None
+        if folder is not None:
+            os.makedirs(folder, exist_ok=True)
+            self._writers = {name: _NpyWriter(os.path.join(folder, f"{name}.npy"), dtype) for name, dtype in COLUMNS.items()}
+
+    def __len__(self):
+        """Number of rows recorded."""
+        return self._flushed + self._used
+
+    def _room(self, n):
+        capacity = len(self._buffers['states'])
+        if self._used + n <= capacity:
+            return
+        if self._writers is not None:
+            self.flush()
+            if n <= capacity:
+                return
+        size = max(2 * capacity, self._used + n)
+        for name, buffer in self._buffers.items():
+            grown = np.empty(size, dtype=buffer.dtype)
+            grown[:self._used] = buffer[:self._used]
+            self._buffers[name] = grown
+
+    def _append(self, states, actions, probs):
+        n = len(states)
+        self._room(n)
+        end = self._used + n
+        self._buffers['states'][self._used:end] = states
+        self._buffers['actions'][self._used:end] = actions
+        self._buffers['probs'][self._used:end] = probs
+        self._used = end
+
+    def start(self, state):
+        """Starts a new trajectory in state (index)."""
+        self._starts.append(len(self))
+        self._append((state,), (NO_ACTION,), (1.0,))
+
+    def step(self, action, state, probability):
+        """Records a transition to state (index) with action (index or NO_ACTION) and its probability."""
+        if self._used == len(self._buffers['states']):
+            self._room(1)
+        i = self._used
+        self._buffers['states'][i] = state
+        self._buffers['actions'][i] = action
+        self._buffers['probs'][i] = probability
+        self._used = i + 1
+
+    def _indices(self, action, state):
+        if self._index is None:
+            self._index = ({name: i for i, name in enumerate(self.state_names)},
+                           {name: i for i, name in enumerate(self.action_names)})
+        states, actions = self._index
+        return actions.get(action, NO_ACTION), states[state] # "NA" and None are NO_ACTION
+
+    def start_named(self, state):
+        """start() with a state name."""
+        self.start(self._indices(None, state)[1])
+
+    def step_named(self, action, state, probability):
+        """step() with names, the action being "NA" or None for a transition without action."""
+        self.step(*self._indices(action, state), probability)
+
+    def extend(self, actions, states, probs):
+        """Records several transitions of the current trajectory."""
+        self._append(states, actions, probs)
+
+    def flush(self):
+        """Writes the buffered rows to the files (does nothing without a folder)."""
+        if self._writers is None or self._used == 0:
+            return
+        for name, writer in self._writers.items():
+            writer.write(self._buffers[name][:self._used])
+        self._flushed += self._used
+        self._used = 0
+
+    def clear(self):
+        """Forgets the recorded rows (only the ones in memory with a folder)."""
+        if self._writers is not None:
+            raise ValueError("a recording written to a folder can't be cleared")
+        self._used = 0
+        self._starts = []
+
+    def close(self):
+        """Writes everything to the folder, with the trajectory starts and the names. Returns the Trajectories."""
+        if self._writers is None:
+            return self.trajectories()
+        self.flush()
+        for writer in self._writers.values():
+            writer.close()
+        np.save(os.path.join(self.folder, 'starts.npy'), np.array(self._starts, dtype=np.int64))
+        with open(os.path.join(self.folder, 'names.json'), 'w', encoding='utf-8') as f:
+            json.dump({'state_names': self.state_names, 'action_names': self.action_names}, f)
+        self._writers = None
+        return load(self.folder)
+
+    def trajectories(self):
+        """The recording so far, when it is kept in memory (no folder)."""
+        if self._writers is not None or self._flushed:
+            raise ValueError("the recording is in a folder: close() it and load() it")
+        columns = {name: buffer[:self._used] for name, buffer in self._buffers.items()}
+        return Trajectories(starts=np.array(self._starts, dtype=np.int64), state_names=self.state_names,
+                            action_names=self.action_names, **columns)
+
+
+def load(folder, mmap_mode='r'):
+    """Trajectories recorded in a folder, the columns being memory mapped (mmap_mode=None reads them)."""
+    with open(os.path.join(folder, 'names.json'), encoding='utf-8') as f:
+        names = json.load(f)
+    columns = {name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode=mmap_mode) for name in COLUMNS}
+    starts = np.load(os.path.join(folder, 'starts.npy'))
+    return Trajectories(starts=starts, **columns, **names)